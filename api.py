@@ -1,22 +1,68 @@
 # api.py - FastAPI Backend para Sistema ETP
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
 import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime
 from dotenv import load_dotenv
 from integrador import EtpLlmGenerator, AssistenteEtpInteligente, RagChain
-from processador_documentos import criar_indice_vetorial, obter_retriever
+from starlette.background import BackgroundTask
+from armazem_conversas import criar_armazem_conversas
+from processador_documentos import (
+    criar_indice_vetorial, obter_retriever, adicionar_documento, remover_documento,
+    listar_documentos, salvar_indice
+)
 
 # Carregar variáveis do .env
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Inicializa os serviços sem bloquear a abertura do servidor.
+
+    Os clientes de IA são criados na hora (é rápido); o índice do RAG é
+    carregado (ou construído) em segundo plano, em uma thread, enquanto o
+    servidor já responde. O progresso aparece em /api/ready. As conversas
+    inativas são removidas na abertura e, depois, periodicamente.
+    """
+    global armazem_conversas
+    armazem_conversas = criar_armazem_conversas()
+    limpeza = asyncio.create_task(_limpar_conversas_periodicamente())
+
+    inicializar_servicos()
+    if estado_rag["status"] == "pendente":
+        app.state.tarefa_rag = asyncio.create_task(asyncio.to_thread(inicializar_rag))
+    yield
+    limpeza.cancel()
+
+
+async def _limpar_conversas_periodicamente():
+    """Remove as conversas inativas a cada INTERVALO_LIMPEZA_CONVERSAS segundos."""
+    while True:
+        try:
+            removidas = await asyncio.to_thread(armazem_conversas.remover_inativas)
+            if removidas:
+                print(f"🧹 {removidas} conversa(s) inativa(s) removida(s)")
+        except Exception as e:
+            print(f"⚠️ Erro ao remover conversas inativas: {str(e)}")
+        await asyncio.sleep(INTERVALO_LIMPEZA_CONVERSAS)
+
+
 # Inicializar FastAPI
 app = FastAPI(
     title="Sistema ETP - API",
     description="API para geração e análise de Estudos Técnicos Preliminares",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS para React
@@ -64,18 +110,55 @@ class MelhoriaTexto(BaseModel):
     texto: str
     tipo_melhoria: str = "geral"  # "gramatica", "tecnico", "geral"
 
+class ResumoConversa(BaseModel):
+    texto: str = ""
+    # Quantas mensagens do início do histórico o texto já resume
+    mensagens_resumidas: int = Field(0, ge=0)
+
 class PerguntaRAG(BaseModel):
     pergunta: str
+    # Conversa guardada no servidor: a primeira pergunta pede nova_sessao e
+    # as seguintes enviam o id_sessao devolvido por ela. Sem nenhum dos dois,
+    # nada é guardado.
+    id_sessao: Optional[str] = None
+    nova_sessao: bool = False
+    # Modo sem sessão: o cliente reenvia o histórico a cada pergunta, e o
+    # resumo das mensagens antigas devolvido pela resposta anterior (sem ele,
+    # a conversa é tratada como ainda não resumida)
     historico: List[Dict[str, str]] = []
+    resumo: Optional[ResumoConversa] = None
+
+class DocumentoRAG(BaseModel):
+    caminho_pdf: str
 
 # Variáveis globais para instâncias
 etp_generator = None
 assistente_etp = None
 rag_chain = None
+indice_vetorial = None
+armazem_conversas = None
+
+# Situação da inicialização do RAG: "inativo" (sem chave de API), "pendente",
+# "carregando", "pronto" ou "erro"
+estado_rag = {"status": "inativo", "erro": None, "inicio": None, "duracao_segundos": None}
+# Serializa tudo o que altera o RAG: inicialização e inclusão/remoção de documentos
+_lock_rag = threading.Lock()
+
+# Intervalo entre as remoções de conversas inativas
+INTERVALO_LIMPEZA_CONVERSAS = float(os.getenv("ETP_HORAS_LIMPEZA_CONVERSAS", "6")) * 3600
+
+# Único diretório de onde o RAG aceita PDFs
+DIRETORIO_DOCUMENTOS = os.getenv("ETP_DIRETORIO_DOCUMENTOS", "data/input")
+# Base de conhecimento usada quando nenhum PDF é informado
+CAMINHOS_PDF_PADRAO = [
+    "data/input/lei_14133.pdf",
+    "data/input/Manual_Compras_Licitacoes.pdf"
+]
 
 # Inicializar serviços automaticamente se as chaves estiverem no .env
 def inicializar_servicos():
-    global etp_generator, assistente_etp, rag_chain
+    """Inicializa os clientes de IA e agenda a inicialização do RAG se houver chave de API."""
+    global etp_generator, assistente_etp
     
     openai_key = os.getenv("OPENAI_API_KEY")
     anthropic_key = os.getenv("ANTHROPIC_API_KEY")
@@ -96,24 +179,73 @@ def inicializar_servicos():
         except Exception as e:
             print(f"❌ Erro ao inicializar Anthropic: {e}")
     
-    # Inicializar RAG se possível
+    # O RAG é inicializado em segundo plano (ver lifespan)
     if (openai_key or anthropic_key) and not rag_chain:
+        estado_rag["status"] = "pendente"
+
+def inicializar_rag(caminhos_pdf: Optional[List[str]] = None, provider: Optional[str] = None,
+                    recriar: bool = False) -> bool:
+    """
+    Carrega (ou constrói) o índice vetorial e cria a cadeia RAG. Executada fora do event loop.
+
+    Todas as inicializações passam por aqui, sob _lock_rag, para que a do
+    lifespan e as pedidas por /api/configurar-rag e /config não sobrescrevam
+    o estado umas das outras. Sem `recriar`, não faz nada se o RAG já estiver
+    pronto; com ele, a cadeia anterior continua atendendo até ser trocada.
+
+    Returns:
+        bool: Se o RAG ficou pronto; em caso de falha, o erro fica em estado_rag.
+    """
+    global rag_chain, indice_vetorial
+    
+    with _lock_rag:
+        if rag_chain and not recriar:
+            return True
+        estado_rag.update(status="carregando", erro=None, inicio=datetime.now().isoformat())
+        inicio = time.perf_counter()
         try:
-            caminhos_pdf = [
-                "data/input/lei_14133.pdf",
-                "data/input/Manual_Compras_Licitacoes.pdf"
-            ]
-            indice_vetorial = criar_indice_vetorial(caminhos_pdf)
-            if indice_vetorial:
-                retriever = obter_retriever(indice_vetorial)
-                provider = "openai" if openai_key else "anthropic"
-                rag_chain = RagChain(retriever=retriever, provider=provider)
-                print("✅ RAG inicializado")
+            indice = criar_indice_vetorial(caminhos_pdf or CAMINHOS_PDF_PADRAO)
+            if not indice:
+                raise RuntimeError("índice vetorial não pôde ser criado")
+            retriever = obter_retriever(indice)
+            provider = provider or ("openai" if os.getenv("OPENAI_API_KEY") else "anthropic")
+            chain = RagChain(retriever=retriever, provider=provider)
+            indice_vetorial, rag_chain = indice, chain
+            estado_rag["status"] = "pronto"
+            print("✅ RAG inicializado")
+            return True
         except Exception as e:
+            # Uma cadeia anterior continua atendendo
+            estado_rag.update(status="pronto" if rag_chain else "erro", erro=str(e))
             print(f"❌ Erro ao inicializar RAG: {e}")
+            return False
+        finally:
+            estado_rag["duracao_segundos"] = round(time.perf_counter() - inicio, 2)
+
+def agendar_inicializacao_rag(provider: Optional[str] = None):
+    """Inicializa o RAG em segundo plano, sem bloquear o event loop; o progresso aparece em /api/ready."""
+    if rag_chain or estado_rag["status"] in ("pendente", "carregando"):
+        return
+    estado_rag["status"] = "pendente"
+    app.state.tarefa_rag = asyncio.create_task(asyncio.to_thread(inicializar_rag, None, provider))
 
-# Inicializar na startup
-inicializar_servicos()
+def _exigir_rag(recurso: str = "rag"):
+    """
+    Falha a requisição se o RAG ainda não puder atendê-la.
+
+    Durante o aquecimento responde 503 com Retry-After, para que clientes e
+    balanceadores tentem de novo em vez de tratar como erro de configuração.
+    """
+    disponivel = rag_chain if recurso == "rag" else indice_vetorial
+    if disponivel:
+        return
+    if estado_rag["status"] in ("pendente", "carregando"):
+        raise HTTPException(
+            status_code=503,
+            detail="RAG em aquecimento: o índice da base de conhecimento ainda está sendo carregado",
+            headers={"Retry-After": "5"}
+        )
+    raise HTTPException(status_code=400, detail="RAG não configurado")
 
 # Endpoints de Configuração
 @app.post("/api/configurar-ia")
@@ -148,9 +280,25 @@ async def status():
         "anthropic_api": bool(os.getenv("ANTHROPIC_API_KEY")),
         "etp_generator": etp_generator is not None,
         "assistente_etp": assistente_etp is not None,
-        "rag_assistant": rag_chain is not None
+        "rag_assistant": rag_chain is not None,
+        "rag_status": estado_rag["status"]
     }
 
+@app.get("/api/ready")
+async def ready():
+    """
+    Readiness: indica se a inicialização terminou e o servidor pode receber tráfego.
+
+    Responde 503 enquanto o índice do RAG está sendo carregado. Depois disso
+    responde 200, mesmo que o RAG tenha falhado ou não esteja configurado
+    (os demais endpoints funcionam); o detalhe vem em "rag".
+    """
+    pronto = estado_rag["status"] not in ("pendente", "carregando")
+    return JSONResponse(
+        status_code=200 if pronto else 503,
+        content={"ready": pronto, "rag": dict(estado_rag)}
+    )
+
 # Endpoints do ETP
 @app.post("/api/gerar-etp")
 async def gerar_etp(dados: DadosETP):
@@ -163,7 +311,7 @@ async def gerar_etp(dados: DadosETP):
         dados_dict = dados.dict()
         
         # Gerar ETP
-        etp_gerado = etp_generator.generate_etp(dados_dict)
+        etp_gerado = await etp_generator.agenerate_etp(dados_dict)
         
         return {
             "status": "success",
@@ -181,7 +329,7 @@ async def analisar_campo(analise: AnaliseCampo):
         raise HTTPException(status_code=400, detail="Assistente não configurado")
     
     try:
-        resultado = assistente_etp.analisar_campo_com_contexto_trt2(
+        resultado = await assistente_etp.aanalisar_campo_com_contexto_trt2(
             analise.nome_campo,
             analise.conteudo_atual,
             analise.contexto_anterior
@@ -200,7 +348,7 @@ async def melhorar_texto(melhoria: MelhoriaTexto):
         raise HTTPException(status_code=400, detail="Assistente não configurado")
     
     try:
-        resultado = assistente_etp.melhorar_texto(
+        resultado = await assistente_etp.amelhorar_texto(
             melhoria.texto,
             melhoria.tipo_melhoria
         )
@@ -221,7 +369,7 @@ async def gerar_exemplo(dados: Dict[str, Any]):
         nome_campo = dados.get("nome_campo")
         contexto = dados.get("contexto_anterior", {})
         
-        exemplo = assistente_etp.gerar_exemplo_campo(nome_campo, contexto)
+        exemplo = await assistente_etp.agerar_exemplo_campo(nome_campo, contexto)
         
         return {
             "status": "success",
@@ -240,7 +388,7 @@ async def validar_consistencia(dados: DadosETP):
         dados_dict = dados.dict()
         
         # Validação de consistência geral
-        consistencia = assistente_etp.validar_consistencia_geral(dados_dict)
+        consistencia = await assistente_etp.avalidar_consistencia_geral(dados_dict)
         
         # Validação de alinhamento TRT-2
         alinhamento = assistente_etp.validar_alinhamento_prompt_tecnico(dados_dict)
@@ -256,61 +404,257 @@ async def validar_consistencia(dados: DadosETP):
 # Endpoints do RAG (Lei 14.133)
 @app.post("/api/configurar-rag")
 async def configurar_rag(dados: Dict[str, Any]):
-    """Configura o sistema RAG com documentos."""
-    global rag_chain
+    """
+    Configura o sistema RAG com documentos.
+
+    O índice é carregado (ou construído) fora do event loop, sob a mesma
+    trava da inicialização em segundo plano; enquanto isso, as demais
+    rotas e o RAG anterior, se houver, continuam respondendo.
+    """
+    # Usar arquivos padrão se não especificado
+    caminhos_pdf = dados.get("caminhos_pdf", CAMINHOS_PDF_PADRAO)
+    for caminho_pdf in caminhos_pdf:
+        _validar_caminho_documento(caminho_pdf, exigir_arquivo=False)
+    
+    provider = dados.get("provider", "openai")
     
     try:
-        # Usar arquivos padrão se não especificado
-        caminhos_pdf = dados.get("caminhos_pdf", [
-            "data/input/lei_14133.pdf", 
-            "data/input/Manual_Compras_Licitacoes.pdf"
-        ])
-        
-        provider = dados.get("provider", "openai")
-        
-        # Criar índice vetorial
-        indice_vetorial = criar_indice_vetorial(caminhos_pdf)
-        
-        if indice_vetorial:
-            retriever = obter_retriever(indice_vetorial)
-            rag_chain = RagChain(retriever=retriever, provider=provider)
-            
-            return {
-                "status": "success",
-                "message": "RAG configurado com sucesso",
-                "documentos": len(caminhos_pdf)
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Erro ao criar índice vetorial")
-            
+        pronto = await asyncio.to_thread(inicializar_rag, caminhos_pdf, provider, True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao configurar RAG: {str(e)}")
+    if not pronto:
+        raise HTTPException(status_code=500, detail=f"Erro ao configurar RAG: {estado_rag['erro']}")
+    
+    return {
+        "status": "success",
+        "message": "RAG configurado com sucesso",
+        "documentos": len(caminhos_pdf)
+    }
+
+@app.get("/api/rag/documentos")
+async def listar_documentos_rag():
+    """Lista os documentos presentes na base de conhecimento do RAG."""
+    _exigir_rag("indice")
+    
+    documentos = await asyncio.to_thread(listar_documentos, indice_vetorial)
+    return {
+        "status": "success",
+        "documentos": documentos,
+        "total": len(documentos)
+    }
+
+def _validar_caminho_documento(caminho_pdf: str, exigir_arquivo: bool = True):
+    """Recusa caminhos que não resolvam para um arquivo dentro de DIRETORIO_DOCUMENTOS."""
+    diretorio = os.path.realpath(DIRETORIO_DOCUMENTOS)
+    if os.path.commonpath([diretorio, os.path.realpath(caminho_pdf)]) != diretorio:
+        raise HTTPException(status_code=403, detail=f"Só são aceitos arquivos em {DIRETORIO_DOCUMENTOS}")
+    if exigir_arquivo and not os.path.isfile(caminho_pdf):
+        raise HTTPException(status_code=404, detail=f"Arquivo não encontrado: {caminho_pdf}")
+
+def _adicionar_documento(caminho_pdf: str) -> tuple:
+    """Indexa e persiste um PDF. Executada fora do event loop; retorna (id, documento)."""
+    with _lock_rag:
+        id_documento = adicionar_documento(indice_vetorial, caminho_pdf)
+        salvar_indice(indice_vetorial)
+        return id_documento, listar_documentos(indice_vetorial).get(id_documento)
+
+def _remover_documento(id_documento: str) -> int:
+    """Remove um documento e persiste o índice se algo foi removido. Executada fora do event loop."""
+    with _lock_rag:
+        chunks_removidos = remover_documento(indice_vetorial, id_documento)
+        if chunks_removidos:
+            salvar_indice(indice_vetorial)
+        return chunks_removidos
+
+@app.post("/api/rag/documentos")
+async def adicionar_documento_rag(documento: DocumentoRAG):
+    """
+    Adiciona um PDF à base de conhecimento sem reconstruir o índice.
+
+    O PDF precisa estar em DIRETORIO_DOCUMENTOS. A extração e os embeddings
+    rodam fora do event loop, e as buscas em andamento só esperam pelos
+    instantes em que o índice é de fato alterado.
+    """
+    _exigir_rag("indice")
+    _validar_caminho_documento(documento.caminho_pdf)
+    
+    try:
+        id_documento, dados_documento = await asyncio.to_thread(_adicionar_documento, documento.caminho_pdf)
+        return {
+            "status": "success",
+            "id_documento": id_documento,
+            "documento": dados_documento
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao adicionar documento: {str(e)}")
+
+@app.delete("/api/rag/documentos/{id_documento}")
+async def remover_documento_rag(id_documento: str):
+    """Remove um documento da base de conhecimento pelo seu id."""
+    _exigir_rag("indice")
+    
+    try:
+        chunks_removidos = await asyncio.to_thread(_remover_documento, id_documento)
+        if not chunks_removidos:
+            raise HTTPException(status_code=404, detail=f"Documento não encontrado: {id_documento}")
+        return {
+            "status": "success",
+            "id_documento": id_documento,
+            "chunks_removidos": chunks_removidos
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao remover documento: {str(e)}")
 
 @app.post("/api/perguntar-rag")
-async def perguntar_rag(pergunta_data: PerguntaRAG):
-    """Faz uma pergunta ao sistema RAG."""
-    if not rag_chain:
-        raise HTTPException(status_code=400, detail="RAG não configurado")
+async def perguntar_rag(pergunta_data: PerguntaRAG, tarefas: BackgroundTasks):
+    """
+    Faz uma pergunta ao sistema RAG.
+
+    Com sessão, a pergunta e a resposta são gravadas na conversa antes de
+    responder, e o resumo das mensagens que saíram da janela é atualizado
+    depois que a resposta é enviada. Sem sessão, a resposta usa o resumo
+    recebido e o resumo atualizado, devolvido ao cliente, é gerado em
+    paralelo com ela.
+    """
+    _exigir_rag()
     
     try:
-        if pergunta_data.historico:
-            resposta_texto = rag_chain.invoke_with_history(
-                pergunta_data.pergunta,
-                pergunta_data.historico
-            )
+        id_sessao, historico, resumo = await _preparar_conversa(pergunta_data)
+        
+        # As fontes vêm da mesma busca que alimentou o prompt
+        resposta = rag_chain.ainvoke_with_sources(
+            pergunta_data.pergunta,
+            historico,
+            resumo
+        )
+        if id_sessao:
+            resultado = await resposta
         else:
-            resposta_texto = rag_chain.invoke(pergunta_data.pergunta)
+            resultado, resumo = await asyncio.gather(resposta, _atualizar_resumo(pergunta_data))
+        
+        if id_sessao:
+            await _registrar_turno(id_sessao, pergunta_data.pergunta, resultado["resposta"])
+            tarefas.add_task(_resumir_conversa, id_sessao)
         
         # Estruturar resposta no formato esperado pelo frontend
         return {
             "status": "success",
-            "resposta": resposta_texto,
-            "fontes": [],  # Pode ser implementado futuramente
+            "resposta": resultado["resposta"],
+            "fontes": resultado["fontes"],
+            "id_sessao": id_sessao,
+            # No modo sem sessão, o cliente reenvia o resumo na próxima pergunta
+            "resumo": None if id_sessao else resumo,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na consulta RAG: {str(e)}")
 
+async def _preparar_conversa(pergunta_data: PerguntaRAG) -> tuple:
+    """
+    Retorna (id da sessão, histórico, resumo) para responder à pergunta.
+
+    Com sessão, o histórico é só a parte da conversa que o resumo ainda não
+    cobre, lida do armazenamento. Sem sessão, vale o que o cliente enviou;
+    o resumo só é atualizado depois (ver _atualizar_resumo).
+    """
+    if pergunta_data.id_sessao is None and not pergunta_data.nova_sessao:
+        return None, pergunta_data.historico, _resumo_recebido(pergunta_data)
+    
+    id_sessao = pergunta_data.id_sessao or uuid.uuid4().hex
+    conversa = await asyncio.to_thread(armazem_conversas.carregar, id_sessao)
+    # O histórico carregado já começa na primeira mensagem não resumida
+    return id_sessao, conversa["mensagens"], {"texto": conversa["resumo"]["texto"], "mensagens_resumidas": 0}
+
+def _resumo_recebido(pergunta_data: PerguntaRAG) -> Dict[str, Any]:
+    """Resumo enviado pelo cliente; sem ele, a conversa ainda não foi resumida."""
+    return (pergunta_data.resumo or ResumoConversa()).dict()
+
+async def _atualizar_resumo(pergunta_data: PerguntaRAG) -> Dict[str, Any]:
+    """Atualiza o resumo da conversa enviado pelo cliente com as mensagens que saíram da janela."""
+    return await rag_chain.aatualizar_resumo(pergunta_data.historico, _resumo_recebido(pergunta_data))
+
+async def _registrar_turno(id_sessao: str, pergunta: str, resposta: str):
+    """Grava a pergunta e a resposta no fim da conversa da sessão."""
+    await asyncio.to_thread(armazem_conversas.adicionar_mensagens, id_sessao, [
+        {"role": "user", "content": pergunta},
+        {"role": "assistant", "content": resposta}
+    ])
+
+async def _resumir_conversa(id_sessao: str):
+    """Incorpora ao resumo da sessão as mensagens que saíram da janela do histórico."""
+    conversa = await asyncio.to_thread(armazem_conversas.carregar, id_sessao)
+    anterior = conversa["resumo"]
+    resumo = await rag_chain.aatualizar_resumo(
+        conversa["mensagens"], {"texto": anterior["texto"], "mensagens_resumidas": 0}
+    )
+    if resumo["mensagens_resumidas"]:
+        # As posições do resumo são relativas às mensagens carregadas
+        await asyncio.to_thread(
+            armazem_conversas.salvar_resumo, id_sessao,
+            {"texto": resumo["texto"],
+             "mensagens_resumidas": anterior["mensagens_resumidas"] + resumo["mensagens_resumidas"]},
+            anterior["mensagens_resumidas"]
+        )
+
+def _evento_sse(nome: str, dados: Dict[str, Any]) -> str:
+    """Serializa um evento no formato Server-Sent Events."""
+    return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+@app.post("/api/perguntar-rag/stream")
+async def perguntar_rag_stream(pergunta_data: PerguntaRAG):
+    """
+    Faz uma pergunta ao sistema RAG e transmite a resposta por Server-Sent Events.
+
+    Eventos, em ordem: "fontes" (trechos recuperados, assim que a busca
+    termina), "token" (partes da resposta, à medida que o LLM as gera) e
+    "fim" (com o id da sessão ou, sem sessão, o resumo atualizado). Uma
+    falha no meio do stream é enviada como evento "erro", já que o status
+    HTTP já foi respondido.
+    """
+    _exigir_rag()
+    
+    try:
+        id_sessao, historico, resumo = await _preparar_conversa(pergunta_data)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na consulta RAG: {str(e)}")
+
+    async def eventos():
+        try:
+            partes = []
+            async for evento in rag_chain.astream_with_history(pergunta_data.pergunta, historico, resumo):
+                if evento["tipo"] == "token":
+                    partes.append(evento["texto"])
+                yield _evento_sse(evento["tipo"], {k: v for k, v in evento.items() if k != "tipo"})
+            if id_sessao:
+                await _registrar_turno(id_sessao, pergunta_data.pergunta, "".join(partes))
+            # Sem sessão, o resumo é atualizado só depois que a resposta foi transmitida
+            yield _evento_sse("fim", {"id_sessao": id_sessao,
+                                      "resumo": None if id_sessao else await _atualizar_resumo(pergunta_data),
+                                      "timestamp": datetime.now().isoformat()})
+        except Exception as e:
+            yield _evento_sse("erro", {"detail": f"Erro na consulta RAG: {str(e)}"})
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        # Sem cache nem buffer em proxies, para os tokens chegarem assim que gerados
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_resumir_conversa, id_sessao) if id_sessao else None
+    )
+
+@app.delete("/api/conversas/{id_sessao}")
+async def remover_conversa(id_sessao: str):
+    """Apaga a conversa guardada de uma sessão."""
+    try:
+        removida = await asyncio.to_thread(armazem_conversas.remover, id_sessao)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao remover conversa: {str(e)}")
+    if not removida:
+        raise HTTPException(status_code=404, detail=f"Conversa não encontrada: {id_sessao}")
+    return {"status": "success", "id_sessao": id_sessao}
+
 # Endpoints Utilitários
 @app.get("/api/campos-criticos")
 async def campos_criticos():
@@ -364,7 +708,7 @@ async def obter_config():
 @app.post("/config")
 async def salvar_config(config: Dict[str, Any]):
     """Salva as configurações."""
-    global etp_generator, assistente_etp, rag_chain
+    global etp_generator, assistente_etp
     
     try:
         # Configurar chaves de API
@@ -380,19 +724,9 @@ async def salvar_config(config: Dict[str, Any]):
             etp_generator = EtpLlmGenerator(provider=provider)
             assistente_etp = AssistenteEtpInteligente(provider=provider)
         
-        # Configurar RAG se habilitado
-        if config.get("rag_enabled", True) and not rag_chain:
-            try:
-                caminhos_pdf = [
-                    "data/input/lei_14133.pdf",
-                    "data/input/Manual_Compras_Licitacoes.pdf"
-                ]
-                indice_vetorial = criar_indice_vetorial(caminhos_pdf)
-                if indice_vetorial:
-                    retriever = obter_retriever(indice_vetorial)
-                    rag_chain = RagChain(retriever=retriever, provider=provider)
-            except Exception as e:
-                print(f"Erro ao configurar RAG: {e}")
+        # Configurar RAG se habilitado, em segundo plano (progresso em /api/ready)
+        if config.get("rag_enabled", True):
+            agendar_inicializacao_rag(provider)
         
         return {
             "status": "success",
@@ -443,7 +777,7 @@ async def testar_conexao(config: Dict[str, Any]):
 # Endpoint de Health Check
 @app.get("/")
 async def root():
-    """Health check endpoint."""
+    """Liveness: responde assim que o servidor sobe, sem depender do RAG (ver /api/ready)."""
     return {
         "message": "Sistema ETP API - Funcionando",
         "version": "2.0.0",
@@ -6,8 +6,10 @@ import base64
 from io import BytesIO
 import random
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 # from etp_llm_generator import EtpLlmGenerator, format_etp_as_html, save_etp_as_pdf
-from integrador import EtpLlmGenerator, format_etp_as_html, save_etp_as_pdf, RagChain, criar_assistente_etp, criar_botao_ajuda_campo, exibir_feedback_campo, criar_botao_ajuda_campo_trt2, exibir_feedback_campo_trt2, criar_validacao_completa_trt2
+from integrador import EtpLlmGenerator, format_etp_as_html, save_etp_as_pdf, RagChain, formatar_fonte, criar_assistente_etp, criar_botao_ajuda_campo, exibir_feedback_campo, criar_botao_ajuda_campo_trt2, exibir_feedback_campo_trt2, criar_validacao_completa_trt2
 from processador_documentos import criar_indice_vetorial, obter_retriever
 
 # Configuração da página
@@ -119,6 +121,44 @@ def formato_moeda(valor):
     return "R$ 0,00"
 
 
+@st.cache_resource(show_spinner=False)
+def obter_rag_chain(caminhos_pdf: list[str], provider: str, hash_chave_api: str) -> RagChain:
+    """
+    Cria a cadeia RAG uma única vez por base de conhecimento e provedor,
+    compartilhada entre reruns e sessões. O hash da chave de API só entra na
+    chave do cache, para recriar a cadeia quando a chave é alterada.
+    """
+    return RagChain(retriever=obter_retriever(criar_indice_vetorial(caminhos_pdf)), provider=provider)
+
+
+@st.cache_resource(show_spinner=False)
+def obter_executor_resumos() -> ThreadPoolExecutor:
+    """Threads que atualizam o resumo das conversas fora da execução do script."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="resumo")
+
+
+def resumo_da_conversa():
+    """Retorna o resumo da conversa, incorporando a atualização em segundo plano, se já terminou."""
+    tarefa = st.session_state.tarefa_resumo
+    if tarefa is not None and tarefa.done():
+        st.session_state.tarefa_resumo = None
+        st.session_state.resumo_conversa = tarefa.result()
+    return st.session_state.resumo_conversa
+
+
+def agendar_resumo(rag_chain: RagChain) -> None:
+    """
+    Resume em segundo plano as mensagens que saíram da janela do histórico.
+
+    Enquanto a atualização não termina, as perguntas seguintes usam o
+    resumo anterior (as mensagens ainda não resumidas vão na íntegra,
+    dentro do orçamento do histórico); só uma atualização roda por vez.
+    """
+    if st.session_state.tarefa_resumo is None:
+        st.session_state.tarefa_resumo = obter_executor_resumos().submit(
+            rag_chain.atualizar_resumo, list(st.session_state.messages), st.session_state.resumo_conversa)
+
+
 # Estado da sessão
 if 'step' not in st.session_state:
     st.session_state.step = 1
@@ -823,18 +863,24 @@ elif app_mode == "Assistente da Lei 14.133":
             indice_vetorial = criar_indice_vetorial(caminhos_pdf)
 
         if indice_vetorial:
-            retriever = obter_retriever(indice_vetorial)
-            rag_chain = RagChain(retriever=retriever,
-                                 provider=llm_provider.lower())
+            chave_api = os.environ.get("OPENAI_API_KEY" if llm_provider == "OpenAI" else "ANTHROPIC_API_KEY", "")
+            rag_chain = obter_rag_chain(caminhos_pdf, llm_provider.lower(),
+                                        hashlib.sha256(chave_api.encode()).hexdigest())
 
             # Inicializar o estado do chat
             if "messages" not in st.session_state:
                 st.session_state.messages = []
+            if "resumo_conversa" not in st.session_state:
+                st.session_state.resumo_conversa = None
+            if "tarefa_resumo" not in st.session_state:
+                st.session_state.tarefa_resumo = None
 
             # Exibir mensagens do histórico
             for message in st.session_state.messages:
                 with st.chat_message(message["role"]):
                     st.markdown(message["content"])
+                    if message.get("fontes"):
+                        st.caption("📚 Fontes: " + "; ".join(formatar_fonte(f) for f in message["fontes"]))
 
             # Indicador de contexto e botão para nova conversa
             col1, col2 = st.columns([3, 1])
@@ -844,6 +890,9 @@ elif app_mode == "Assistente da Lei 14.133":
             with col2:
                 if st.button("🔄 Nova Conversa"):
                     st.session_state.messages = []
+                    st.session_state.resumo_conversa = None
+                    # Uma atualização ainda em andamento é da conversa anterior
+                    st.session_state.tarefa_resumo = None
                     st.rerun()
 
             # Campo de entrada para a pergunta do usuário
@@ -854,16 +903,30 @@ elif app_mode == "Assistente da Lei 14.133":
                 with st.chat_message("user"):
                     st.markdown(prompt)
 
-                # Gerar e exibir a resposta da IA
+                # Gerar e exibir a resposta da IA à medida que é gerada
                 with st.chat_message("assistant"):
-                    with st.spinner("Analisando contexto e histórico..."):
-                        # Usar o novo método com histórico
-                        resposta = rag_chain.invoke_with_history(prompt, st.session_state.messages[:-1])
-                        st.markdown(resposta)
+                    area_resposta = st.empty()
+                    area_fontes = st.empty()
+                    area_resposta.markdown("_Analisando contexto e histórico..._")
+                    resposta, fontes = "", []
+                    for evento in rag_chain.stream_with_history(prompt, st.session_state.messages[:-1],
+                                                                resumo_da_conversa()):
+                        if evento["tipo"] == "fontes":
+                            fontes = evento["fontes"]
+                            if fontes:
+                                area_fontes.caption("📚 Fontes: " + "; ".join(formatar_fonte(f) for f in fontes))
+                        else:
+                            resposta += evento["texto"]
+                            area_resposta.markdown(resposta + "▌")
+                    area_resposta.markdown(resposta)
 
                 # Adicionar a resposta da IA ao histórico
                 st.session_state.messages.append(
-                    {"role": "assistant", "content": resposta})
+                    {"role": "assistant", "content": resposta, "fontes": fontes})
+
+                # Depois da resposta já exibida, resumir em segundo plano as mensagens
+                # que saíram da janela do histórico, sem segurar a próxima pergunta
+                agendar_resumo(rag_chain)
         else:
             st.warning(
                 "Não foi possível criar o assistente. Verifique o arquivo PDF ou as configurações.")
@@ -0,0 +1,209 @@
+# armazem_conversas.py
+import os
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import Any, Dict, List
+
+# Onde as conversas do assistente ficam guardadas: "sqlite" (padrão) ou "memoria"
+TIPO_ARMAZEM_CONVERSAS = os.getenv("ETP_ARMAZEM_CONVERSAS", "sqlite").lower()
+CAMINHO_CONVERSAS = os.getenv("ETP_CAMINHO_CONVERSAS", "data/conversas.sqlite3")
+# Conversas sem mensagens novas há mais tempo que isso são apagadas na inicialização da API
+DIAS_RETENCAO_CONVERSAS = float(os.getenv("ETP_DIAS_RETENCAO_CONVERSAS", "30"))
+
+
+def _conversa_vazia() -> Dict[str, Any]:
+    return {"resumo": {"texto": "", "mensagens_resumidas": 0}, "mensagens": []}
+
+
+class ArmazemConversas(ABC):
+    """
+    Conversas do assistente RAG guardadas no servidor, por id de sessão.
+
+    Uma conversa é a sequência das mensagens ({"role", "content"}) e o
+    resumo das mais antigas ({"texto", "mensagens_resumidas"}, ver
+    RagChain.atualizar_resumo). carregar() devolve apenas as mensagens que
+    o resumo ainda não cobre, de modo que o custo de cada pergunta não
+    cresce com o tamanho da conversa.
+    """
+
+    @abstractmethod
+    def carregar(self, id_sessao: str) -> Dict[str, Any]:
+        """
+        Retorna {"resumo": {...}, "mensagens": [...]} com as mensagens ainda não
+        resumidas, em ordem; uma sessão desconhecida é uma conversa vazia.
+        """
+
+    @abstractmethod
+    def adicionar_mensagens(self, id_sessao: str, mensagens: List[Dict[str, str]]) -> None:
+        """Acrescenta mensagens ao fim da conversa, criando-a se necessário."""
+
+    @abstractmethod
+    def salvar_resumo(self, id_sessao: str, resumo: Dict[str, Any], resumidas_anterior: int) -> bool:
+        """
+        Grava o resumo se a conversa ainda estiver resumida até
+        `resumidas_anterior` mensagens, para que duas atualizações concorrentes
+        não resumam as mesmas mensagens. Retorna se o resumo foi gravado.
+        """
+
+    @abstractmethod
+    def remover(self, id_sessao: str) -> bool:
+        """Apaga a conversa. Retorna se ela existia."""
+
+    @abstractmethod
+    def remover_inativas(self, dias: float = DIAS_RETENCAO_CONVERSAS) -> int:
+        """Apaga as conversas sem mensagens novas há mais de `dias` dias. Retorna quantas."""
+
+
+class ArmazemConversasMemoria(ArmazemConversas):
+    """Conversas em memória, perdidas ao reiniciar; para desenvolvimento e um único processo."""
+
+    def __init__(self):
+        self._conversas: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def carregar(self, id_sessao: str) -> Dict[str, Any]:
+        with self._lock:
+            conversa = self._conversas.get(id_sessao)
+            if conversa is None:
+                return _conversa_vazia()
+            resumo = dict(conversa["resumo"])
+            return {"resumo": resumo, "mensagens": conversa["mensagens"][resumo["mensagens_resumidas"]:]}
+
+    def adicionar_mensagens(self, id_sessao: str, mensagens: List[Dict[str, str]]) -> None:
+        with self._lock:
+            conversa = self._conversas.setdefault(id_sessao, _conversa_vazia())
+            conversa["mensagens"].extend({"role": m["role"], "content": m["content"]} for m in mensagens)
+            conversa["atualizada_em"] = time.time()
+
+    def salvar_resumo(self, id_sessao: str, resumo: Dict[str, Any], resumidas_anterior: int) -> bool:
+        with self._lock:
+            conversa = self._conversas.get(id_sessao)
+            if conversa is None or conversa["resumo"]["mensagens_resumidas"] != resumidas_anterior:
+                return False
+            conversa["resumo"] = {"texto": resumo["texto"], "mensagens_resumidas": resumo["mensagens_resumidas"]}
+            return True
+
+    def remover(self, id_sessao: str) -> bool:
+        with self._lock:
+            return self._conversas.pop(id_sessao, None) is not None
+
+    def remover_inativas(self, dias: float = DIAS_RETENCAO_CONVERSAS) -> int:
+        limite = time.time() - dias * 86400
+        with self._lock:
+            inativas = [i for i, c in self._conversas.items() if c.get("atualizada_em", 0) < limite]
+            for id_sessao in inativas:
+                del self._conversas[id_sessao]
+        return len(inativas)
+
+
+class ArmazemConversasSQLite(ArmazemConversas):
+    """
+    Conversas em SQLite, compartilhadas entre os workers da API e mantidas entre reinicializações.
+
+    Cada mensagem é uma linha indexada por (sessão, posição); a conversa
+    guarda o resumo, quantas mensagens ele cobre e o total de mensagens.
+    Assim, acrescentar um turno e carregar a parte não resumida são
+    operações de custo constante.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_CONVERSAS):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with closing(self._conectar()) as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS conversas ("
+                "id_sessao TEXT PRIMARY KEY, resumo TEXT NOT NULL DEFAULT '', "
+                "mensagens_resumidas INTEGER NOT NULL DEFAULT 0, total_mensagens INTEGER NOT NULL DEFAULT 0, "
+                "atualizada_em REAL NOT NULL)"
+            )
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS mensagens ("
+                "id_sessao TEXT NOT NULL, posicao INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+                "PRIMARY KEY (id_sessao, posicao)) WITHOUT ROWID"
+            )
+
+    def _conectar(self) -> sqlite3.Connection:
+        # Transações explícitas: BEGIN IMMEDIATE serializa escritas entre processos
+        return sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+
+    def carregar(self, id_sessao: str) -> Dict[str, Any]:
+        with closing(self._conectar()) as conexao:
+            conversa = conexao.execute(
+                "SELECT resumo, mensagens_resumidas FROM conversas WHERE id_sessao = ?", (id_sessao,)
+            ).fetchone()
+            if conversa is None:
+                return _conversa_vazia()
+            linhas = conexao.execute(
+                "SELECT role, content FROM mensagens WHERE id_sessao = ? AND posicao >= ? ORDER BY posicao",
+                (id_sessao, conversa[1])
+            ).fetchall()
+        return {
+            "resumo": {"texto": conversa[0], "mensagens_resumidas": conversa[1]},
+            "mensagens": [{"role": role, "content": content} for role, content in linhas],
+        }
+
+    def adicionar_mensagens(self, id_sessao: str, mensagens: List[Dict[str, str]]) -> None:
+        with self._lock, closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                linha = conexao.execute(
+                    "SELECT total_mensagens FROM conversas WHERE id_sessao = ?", (id_sessao,)
+                ).fetchone()
+                total = linha[0] if linha else 0
+                conexao.executemany(
+                    "INSERT INTO mensagens VALUES (?, ?, ?, ?)",
+                    [(id_sessao, total + i, m["role"], m["content"]) for i, m in enumerate(mensagens)]
+                )
+                conexao.execute(
+                    "INSERT INTO conversas (id_sessao, total_mensagens, atualizada_em) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id_sessao) DO UPDATE SET "
+                    "total_mensagens = excluded.total_mensagens, atualizada_em = excluded.atualizada_em",
+                    (id_sessao, total + len(mensagens), time.time())
+                )
+                conexao.execute("COMMIT")
+            except BaseException:
+                conexao.execute("ROLLBACK")
+                raise
+
+    def salvar_resumo(self, id_sessao: str, resumo: Dict[str, Any], resumidas_anterior: int) -> bool:
+        with self._lock, closing(self._conectar()) as conexao:
+            cursor = conexao.execute(
+                "UPDATE conversas SET resumo = ?, mensagens_resumidas = ? "
+                "WHERE id_sessao = ? AND mensagens_resumidas = ?",
+                (resumo["texto"], resumo["mensagens_resumidas"], id_sessao, resumidas_anterior)
+            )
+            return cursor.rowcount > 0
+
+    def remover(self, id_sessao: str) -> bool:
+        with self._lock, closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            conexao.execute("DELETE FROM mensagens WHERE id_sessao = ?", (id_sessao,))
+            removidas = conexao.execute("DELETE FROM conversas WHERE id_sessao = ?", (id_sessao,)).rowcount
+            conexao.execute("COMMIT")
+        return removidas > 0
+
+    def remover_inativas(self, dias: float = DIAS_RETENCAO_CONVERSAS) -> int:
+        limite = time.time() - dias * 86400
+        with self._lock, closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            conexao.execute(
+                "DELETE FROM mensagens WHERE id_sessao IN "
+                "(SELECT id_sessao FROM conversas WHERE atualizada_em < ?)", (limite,)
+            )
+            removidas = conexao.execute("DELETE FROM conversas WHERE atualizada_em < ?", (limite,)).rowcount
+            conexao.execute("COMMIT")
+        return removidas
+
+
+def criar_armazem_conversas() -> ArmazemConversas:
+    """Cria o armazenamento de conversas configurado em ETP_ARMAZEM_CONVERSAS."""
+    if TIPO_ARMAZEM_CONVERSAS == "memoria":
+        return ArmazemConversasMemoria()
+    if TIPO_ARMAZEM_CONVERSAS == "sqlite":
+        return ArmazemConversasSQLite()
+    raise ValueError(f"Armazenamento de conversas não suportado: {TIPO_ARMAZEM_CONVERSAS}.")
@@ -0,0 +1,353 @@
+# busca_hibrida.py
+import os
+import re
+import math
+import heapq
+import unicodedata
+from collections import Counter
+from typing import Iterable, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from indices_vetoriais import buscar_posicoes, trava_indice
+
+# Quantidade de candidatos buscados em cada ranking antes da fusão
+CANDIDATOS_POR_BUSCA = int(os.getenv("ETP_CANDIDATOS_BUSCA", "20"))
+
+# Constante de suavização da Reciprocal Rank Fusion (valor usual da literatura)
+RRF_K = 60
+
+# Parâmetros do BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Peso dos termos compostos de referência ("art:75", "art:75/inciso:ii") em
+# relação às palavras comuns
+PESO_TERMOS_REFERENCIA = 3.0
+
+# Incrementar sempre que tokenizar() mudar: índices lexicais persistidos com
+# outra versão são reconstruídos a partir do docstore
+VERSAO_TOKENIZADOR = 2
+
+# Distância máxima, em termos, entre um artigo e um inciso citados juntos
+# ("art. 75, inciso II", "inciso II do art. 75")
+JANELA_REFERENCIA = 3
+
+# Palavras sem valor discriminativo, já sem acentos
+PALAVRAS_VAZIAS = frozenset("""
+a o as os ao aos um uma uns umas de do da dos das no na nos nas em por pelo pela pelos pelas
+para com sem sob sobre e ou que se ser sao foi como mais menos nao sim ja seu sua seus suas
+este esta estes estas esse essa esses essas isso isto aquele aquela qual quais quando onde
+n no nr numero ha ter tem qualquer cada entre ate apos
+""".split())
+
+# Termos que só servem para introduzir uma referência normativa
+_TERMOS_REFERENCIA = frozenset({"art", "arts", "artigo", "artigos", "inciso", "incisos",
+                                "paragrafo", "alinea", "lei", "decreto", "caput"})
+
+_RE_TOKEN = re.compile(r"§|\d+(?:[.,/-]\d+)*|[a-z]+")
+# Numeral romano válido, para não confundir palavras como "civil" com incisos
+_RE_ROMANO = re.compile(r"(?=[ivxlcdm])m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})")
+# Início de linha de inciso no texto da lei: "II - para contratação..."
+_RE_INCISO_LINHA = re.compile(r"\s*([ivxlcdm]+)\s*[-–—]\s")
+
+
+def _normalizar(texto: str) -> str:
+    """Converte para minúsculas e remove acentos e indicadores ordinais."""
+    texto = unicodedata.normalize("NFD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return texto.replace("º", "").replace("°", "").replace("ª", "")
+
+
+def _inciso(artigo: Optional[str], inciso: str) -> list[str]:
+    """Termos de um inciso: o número isolado e, se conhecido, o número dentro do artigo."""
+    return [f"inciso:{inciso}"] + ([f"art:{artigo}/inciso:{inciso}"] if artigo else [])
+
+
+def tokenizar(texto: str) -> list[str]:
+    """
+    Divide um texto em termos para o índice lexical.
+
+    Além das palavras, mantém números de normas como um único termo
+    ("14.133", "9.507/2018") e gera termos compostos para referências a
+    dispositivos ("art:75", "par:1", "inciso:ii"), de modo que uma consulta
+    por "art. 75, inciso II" case com o dispositivo, e não com qualquer
+    ocorrência do número 75.
+
+    Um inciso recebe também um termo dentro do seu artigo
+    ("art:75/inciso:ii"), tanto no texto da lei, em que o inciso abre uma
+    linha ("II - para contratação...") dentro do artigo iniciado por
+    "Art. 75" em linha anterior do mesmo trecho, quanto em citações
+    ("art. 75, II", "inciso II do art. 75"). Incisos de um parágrafo do
+    artigo ("§ 1º ... I - ...") não recebem o termo do artigo, que designa
+    os incisos do caput.
+    """
+    termos = []
+    artigo_atual = None
+    for linha in _normalizar(texto).splitlines():
+        brutos = _RE_TOKEN.findall(linha)
+        if len(brutos) > 1 and brutos[0] in ("art", "artigo") and brutos[1][0].isdigit():
+            artigo_atual = brutos[1]
+        elif brutos[:1] == ["§"] or brutos[:2] == ["paragrafo", "unico"]:
+            artigo_atual = None
+        inciso_linha = _RE_INCISO_LINHA.match(linha)
+        if inciso_linha and _RE_ROMANO.fullmatch(inciso_linha.group(1)):
+            termos.extend(_inciso(artigo_atual, inciso_linha.group(1)))
+        termos.extend(_termos_linha(brutos))
+    return termos
+
+
+def _termos_linha(brutos: list[str]) -> list[str]:
+    """Termos de uma linha, com os termos compostos das referências citadas nela."""
+    termos = []
+    artigo, inciso = None, None  # último citado na linha: (número, posição)
+    for posicao, termo in enumerate(brutos):
+        if termo in PALAVRAS_VAZIAS:
+            continue
+        if termo != "§":
+            termos.append(termo)
+        anterior = brutos[posicao - 1] if posicao else ""
+        if anterior in ("art", "arts", "artigo") and termo[0].isdigit():
+            termos.append(f"art:{termo}")
+            artigo = (termo, posicao)
+            if inciso and posicao - inciso[1] <= JANELA_REFERENCIA:
+                termos.append(f"art:{termo}/inciso:{inciso[0]}")
+        elif anterior == "§" and termo[0].isdigit():
+            termos.append(f"par:{termo}")
+        elif _RE_ROMANO.fullmatch(termo) and (anterior == "inciso" or (artigo and posicao - artigo[1] == 1)):
+            perto = artigo is not None and posicao - artigo[1] <= JANELA_REFERENCIA
+            termos.extend(_inciso(artigo[0] if perto else None, termo))
+            inciso = (termo, posicao)
+    return termos
+
+
+def termos_referencia(termos: Iterable[str]) -> list[str]:
+    """Termos que identificam normas e dispositivos: compostos ("art:75") e números ("14.133")."""
+    return [t for t in termos if ":" in t or t[0].isdigit()]
+
+
+def consulta_referencial(consulta: str) -> bool:
+    """
+    Indica se a consulta é dominada por referências normativas.
+
+    Consultas como "art. 75, II da Lei 14.133" ou "Decreto 10.024/2019" são
+    respondidas melhor (e sem custo de embedding) pela busca lexical.
+    """
+    termos = tokenizar(consulta)
+    referencias = termos_referencia(termos)
+    palavras = [t for t in termos if t not in referencias and t not in _TERMOS_REFERENCIA
+                and not _RE_ROMANO.fullmatch(t)]
+    return bool(referencias) and len(referencias) >= len(palavras)
+
+
+class IndiceBM25:
+    """
+    Índice invertido com pontuação BM25 sobre os chunks do índice vetorial.
+
+    Os chunks são identificados pelos mesmos ids do docstore do FAISS. O
+    índice é construído junto com o índice vetorial, persistido ao lado dele
+    e atualizado incrementalmente quando documentos são adicionados ou
+    removidos. Termos compostos de referência pesam PESO_TERMOS_REFERENCIA
+    vezes mais que as palavras.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B,
+                 peso_referencias: float = PESO_TERMOS_REFERENCIA):
+        self.k1 = k1
+        self.b = b
+        self.peso_referencias = peso_referencias
+        self.versao = VERSAO_TOKENIZADOR
+        self.ids: list[str] = []
+        self.posicoes: dict[str, int] = {}
+        self.comprimentos: list[int] = []
+        self.postings: dict[str, dict[int, int]] = {}
+        self.soma_comprimentos = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def adicionar(self, ids: Iterable[str], textos: Iterable[str]) -> None:
+        """Indexa os textos sob os ids informados."""
+        for id_chunk, texto in zip(ids, textos):
+            posicao = len(self.ids)
+            termos = tokenizar(texto)
+            self.ids.append(id_chunk)
+            self.posicoes[id_chunk] = posicao
+            self.comprimentos.append(len(termos))
+            self.soma_comprimentos += len(termos)
+            for termo, frequencia in Counter(termos).items():
+                self.postings.setdefault(termo, {})[posicao] = frequencia
+
+    def remover(self, ids: Iterable[str]) -> None:
+        """Remove os chunks informados, compactando as posições dos restantes."""
+        remover = set(ids)
+        novas_posicoes, novos_ids, novos_comprimentos = {}, [], []
+        for posicao, id_chunk in enumerate(self.ids):
+            if id_chunk not in remover:
+                novas_posicoes[posicao] = len(novos_ids)
+                novos_ids.append(id_chunk)
+                novos_comprimentos.append(self.comprimentos[posicao])
+        if len(novos_ids) == len(self.ids):
+            return
+
+        postings = {}
+        for termo, ocorrencias in self.postings.items():
+            restantes = {novas_posicoes[p]: f for p, f in ocorrencias.items() if p in novas_posicoes}
+            if restantes:
+                postings[termo] = restantes
+        self.ids, self.comprimentos, self.postings = novos_ids, novos_comprimentos, postings
+        self.posicoes = {id_chunk: posicao for posicao, id_chunk in enumerate(novos_ids)}
+        self.soma_comprimentos = sum(novos_comprimentos)
+
+    def contem(self, id_chunk: str, termos: Iterable[str]) -> bool:
+        """Indica se o chunk contém todos os termos."""
+        posicao = self.posicoes.get(id_chunk)
+        return posicao is not None and all(posicao in self.postings.get(termo, ()) for termo in termos)
+
+    def buscar(self, consulta: str, k: int) -> list[tuple[str, float]]:
+        """
+        Retorna os k chunks com maior pontuação BM25 para a consulta.
+
+        Returns:
+            list: Pares (id do chunk, pontuação), em ordem decrescente.
+        """
+        total = len(self.ids)
+        if not total:
+            return []
+        media_comprimento = self.soma_comprimentos / total or 1.0
+
+        pontuacoes: dict[int, float] = {}
+        for termo in set(tokenizar(consulta)):
+            ocorrencias = self.postings.get(termo)
+            if not ocorrencias:
+                continue
+            idf = math.log(1 + (total - len(ocorrencias) + 0.5) / (len(ocorrencias) + 0.5))
+            if ":" in termo:
+                idf *= self.peso_referencias
+            for posicao, frequencia in ocorrencias.items():
+                normalizacao = self.k1 * (1 - self.b + self.b * self.comprimentos[posicao] / media_comprimento)
+                pontuacoes[posicao] = pontuacoes.get(posicao, 0.0) + \
+                    idf * frequencia * (self.k1 + 1) / (frequencia + normalizacao)
+
+        melhores = heapq.nlargest(k, pontuacoes.items(), key=lambda item: item[1])
+        return [(self.ids[posicao], pontuacao) for posicao, pontuacao in melhores]
+
+
+def construir_indice_lexical(indice_vetorial) -> IndiceBM25:
+    """Constrói o índice lexical a partir dos chunks já presentes em um índice vetorial."""
+    indice_lexical = IndiceBM25()
+    ids = [id_chunk for _, id_chunk in sorted(indice_vetorial.index_to_docstore_id.items())]
+    indice_lexical.adicionar(ids, (indice_vetorial.docstore.search(i).page_content for i in ids))
+    return indice_lexical
+
+
+def fundir_rankings(rankings: list[list[str]], k: int, rrf_k: int = RRF_K) -> list[tuple[str, float]]:
+    """
+    Combina rankings de ids por Reciprocal Rank Fusion.
+
+    Cada id recebe a soma de 1 / (rrf_k + posição) sobre os rankings em que
+    aparece; assim não é preciso calibrar pontuações de naturezas diferentes
+    (BM25 e distância vetorial).
+    """
+    pontuacoes: dict[str, float] = {}
+    for ranking in rankings:
+        for posicao, id_chunk in enumerate(ranking, start=1):
+            pontuacoes[id_chunk] = pontuacoes.get(id_chunk, 0.0) + 1.0 / (rrf_k + posicao)
+    return heapq.nlargest(k, pontuacoes.items(), key=lambda item: item[1])
+
+
+class RetrieverHibrido(BaseRetriever):
+    """
+    Retriever que combina a busca lexical (BM25) com a busca vetorial (FAISS).
+
+    Os dois rankings são fundidos por Reciprocal Rank Fusion. Consultas
+    dominadas por referências normativas (artigos, incisos, números de leis)
+    são respondidas apenas pela busca lexical, sem chamada de embedding,
+    quando algum dos resultados dela contém todas as referências da
+    consulta; do contrário, os rankings são fundidos normalmente. Sem
+    índice lexical, faz apenas a busca
+    vetorial. Em índices quantizados, os candidatos vetoriais são
+    reordenados pela distância exata. Trechos que aparecem em mais de um
+    lugar trazem as demais localizações no metadado "ocorrencias".
+
+    Cada documento traz no metadado "pontuacao" sua pontuação RRF. Nos
+    caminhos com um único ranking (atalho lexical ou só vetorial), ela é
+    calculada sobre esse ranking, para que a escala seja a mesma em todos.
+    """
+
+    indice_vetorial: object
+    indice_lexical: Optional[IndiceBM25] = None
+    k: int = 5
+    candidatos: int = CANDIDATOS_POR_BUSCA
+    atalho_lexical: bool = True
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _embedding_consulta(self, consulta: str) -> np.ndarray:
+        """Calcula o embedding da consulta, no formato da busca no FAISS."""
+        return np.array([self.indice_vetorial.embedding_function.embed_query(consulta)], dtype=np.float32)
+
+    def _buscar_vetorial(self, vetor: np.ndarray, k: int) -> list[str]:
+        """Retorna os ids dos k chunks mais próximos do embedding da consulta no índice vetorial."""
+        vetores_exatos = getattr(self.indice_vetorial, "vetores_exatos", None)
+        posicoes = buscar_posicoes(self.indice_vetorial.index, vetor, k,
+                                   vetores_exatos.matriz if vetores_exatos is not None else None)
+        mapeamento = self.indice_vetorial.index_to_docstore_id
+        return [mapeamento[p] for p in posicoes if p in mapeamento]
+
+    def _documentos(self, ranking: list[tuple[str, float]]) -> List[Document]:
+        """
+        Busca os chunks no docstore, acrescentando a pontuação e as outras
+        ocorrências de trechos duplicados aos metadados.
+        """
+        duplicatas = getattr(self.indice_vetorial, "indice_duplicatas", None)
+        documentos = []
+        for id_chunk, pontuacao in ranking:
+            documento = self.indice_vetorial.docstore.search(id_chunk)
+            metadados = {**documento.metadata, "pontuacao": pontuacao}
+            ocorrencias = duplicatas.localizacoes(id_chunk) if duplicatas is not None else None
+            if ocorrencias:
+                metadados["ocorrencias"] = ocorrencias
+            documentos.append(Document(page_content=documento.page_content, metadata=metadados))
+        return documentos
+
+    def _atalho_cobre_referencias(self, consulta: str, ids: list[str]) -> bool:
+        """Indica se a consulta é referencial e algum dos chunks contém todas as suas referências."""
+        if not ids or not consulta_referencial(consulta):
+            return False
+        referencias = set(termos_referencia(tokenizar(consulta)))
+        return any(self.indice_lexical.contem(id_chunk, referencias) for id_chunk in ids)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # Documentos adicionados ou removidos durante a busca renumerariam as
+        # posições; a trava só cobre as consultas aos índices, e o embedding
+        # (uma chamada de rede, com retentativas) é calculado antes dela, para
+        # não segurar as alterações na fila
+        trava = trava_indice(self.indice_vetorial)
+        if self.indice_lexical is not None and self.atalho_lexical and consulta_referencial(query):
+            with trava.leitura():
+                documentos = self._buscar_atalho(query)
+            if documentos is not None:
+                return documentos
+
+        vetor = self._embedding_consulta(query)
+        with trava.leitura():
+            return self._buscar(query, vetor)
+
+    def _buscar_atalho(self, query: str) -> Optional[List[Document]]:
+        """Responde só com a busca lexical, se algum dos resultados contém todas as referências da consulta."""
+        lexicos = [id_chunk for id_chunk, _ in self.indice_lexical.buscar(query, self.k)]
+        if not self._atalho_cobre_referencias(query, lexicos):
+            return None
+        return self._documentos(fundir_rankings([lexicos], self.k))
+
+    def _buscar(self, query: str, vetor: np.ndarray) -> List[Document]:
+        if self.indice_lexical is None:
+            return self._documentos(fundir_rankings([self._buscar_vetorial(vetor, self.k)], self.k))
+
+        lexicos = [id_chunk for id_chunk, _ in self.indice_lexical.buscar(query, self.candidatos)]
+        ranking = fundir_rankings([lexicos, self._buscar_vetorial(vetor, self.candidatos)], self.k)
+        return self._documentos(ranking)
@@ -0,0 +1,78 @@
+# cache_paginas.py
+import os
+import zlib
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Optional
+import pypdf
+
+# Cache do texto extraído de cada página; vazio desativa
+CAMINHO_CACHE_PAGINAS = os.getenv("ETP_CACHE_PAGINAS", "data/cache/paginas.sqlite3")
+
+# Textos extraídos por outra versão do extrator não são reaproveitados
+EXTRATOR = f"pypdf-{pypdf.__version__}"
+
+
+class CachePaginas:
+    """
+    Armazenamento local do texto extraído dos PDFs, indexado por (hash do arquivo, página).
+
+    Os textos são gravados comprimidos (zlib) em SQLite. Um documento só é
+    gravado depois de extraído por completo, em uma única transação, então
+    ler() devolve todas as páginas ou nenhuma. Assim, mudar a divisão em
+    chunks ou o índice reaproveita a extração, que é a etapa mais lenta.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_CACHE_PAGINAS, extrator: str = EXTRATOR):
+        self.caminho = caminho
+        self.extrator = extrator
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS documentos ("
+                "extrator TEXT NOT NULL, hash TEXT NOT NULL, total_paginas INTEGER NOT NULL, "
+                "PRIMARY KEY (extrator, hash)) WITHOUT ROWID"
+            )
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS paginas ("
+                "extrator TEXT NOT NULL, hash TEXT NOT NULL, pagina INTEGER NOT NULL, texto BLOB NOT NULL, "
+                "PRIMARY KEY (extrator, hash, pagina)) WITHOUT ROWID"
+            )
+
+    def _conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    def ler(self, hash_documento: str) -> Optional[list[str]]:
+        """Retorna o texto de todas as páginas do documento, ou None se ele não estiver no cache."""
+        with closing(self._conectar()) as conexao:
+            documento = conexao.execute(
+                "SELECT total_paginas FROM documentos WHERE extrator = ? AND hash = ?",
+                (self.extrator, hash_documento)
+            ).fetchone()
+            if documento is None:
+                return None
+            linhas = conexao.execute(
+                "SELECT texto FROM paginas WHERE extrator = ? AND hash = ? ORDER BY pagina",
+                (self.extrator, hash_documento)
+            ).fetchall()
+        if len(linhas) != documento[0]:
+            return None
+        return [zlib.decompress(texto).decode("utf-8") for texto, in linhas]
+
+    def salvar(self, hash_documento: str, textos: list[str]) -> None:
+        """Grava o texto de todas as páginas de um documento."""
+        linhas = [(self.extrator, hash_documento, numero, zlib.compress(texto.encode("utf-8")))
+                  for numero, texto in enumerate(textos)]
+        with self._lock, closing(self._conectar()) as conexao, conexao:
+            conexao.execute("DELETE FROM paginas WHERE extrator = ? AND hash = ?", (self.extrator, hash_documento))
+            conexao.executemany("INSERT INTO paginas VALUES (?, ?, ?, ?)", linhas)
+            conexao.execute("INSERT OR REPLACE INTO documentos VALUES (?, ?, ?)",
+                            (self.extrator, hash_documento, len(textos)))
+
+
+def criar_cache_paginas() -> Optional[CachePaginas]:
+    """Abre o cache de páginas configurado, ou retorna None se estiver desativado."""
+    return CachePaginas() if CAMINHO_CACHE_PAGINAS else None
@@ -0,0 +1,157 @@
+# cache_recuperacao.py
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from gerador_embeddings import normalizar_texto
+
+# Quantidade máxima de consultas em cache por índice (0 desativa o cache)
+CAPACIDADE_CACHE_CONSULTAS = int(os.getenv("ETP_CACHE_CONSULTAS", "256"))
+# Tempo de vida de cada entrada, em segundos
+TTL_CACHE_CONSULTAS = float(os.getenv("ETP_CACHE_CONSULTAS_TTL", "3600"))
+# Similaridade de cosseno mínima para reaproveitar o resultado de outra consulta (0 desativa)
+LIMIAR_SIMILARIDADE_CONSULTAS = float(os.getenv("ETP_CACHE_CONSULTAS_LIMIAR", "0"))
+
+
+def normalizar_consulta(consulta: str) -> str:
+    """Normaliza a consulta para comparação exata: minúsculas, espaços colapsados, sem pontuação final."""
+    return re.sub(r"[\s?!.;:]+$", "", normalizar_texto(consulta).lower())
+
+
+class CacheRecuperacao:
+    """
+    Cache LRU, com tempo de vida, dos chunks recuperados por consulta.
+
+    As entradas são indexadas pela consulta normalizada e, quando há limiar
+    de similaridade, também pelo embedding da consulta, de modo que
+    perguntas reformuladas com o mesmo sentido reaproveitam o resultado.
+    O cache é esvaziado sempre que a geração do índice muda (documentos
+    adicionados ou removidos).
+    """
+
+    def __init__(self, capacidade: int = CAPACIDADE_CACHE_CONSULTAS, ttl: float = TTL_CACHE_CONSULTAS,
+                 limiar_similaridade: float = LIMIAR_SIMILARIDADE_CONSULTAS):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.limiar_similaridade = limiar_similaridade
+        self.geracao = None
+        self._entradas: OrderedDict[str, tuple[float, Optional[np.ndarray], list[Document]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sincronizar(self, geracao: int) -> None:
+        """Esvazia o cache se o índice mudou desde a última consulta."""
+        with self._lock:
+            if geracao != self.geracao:
+                self._entradas.clear()
+                self.geracao = geracao
+
+    def buscar(self, chave: str) -> Optional[list[Document]]:
+        """Retorna os documentos em cache para a consulta normalizada, se houver e não tiverem expirado."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            if time.monotonic() - entrada[0] > self.ttl:
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return list(entrada[2])
+
+    def buscar_semelhante(self, vetor: np.ndarray) -> Optional[list[Document]]:
+        """Retorna os documentos da consulta em cache mais similar ao vetor, se acima do limiar."""
+        with self._lock:
+            agora = time.monotonic()
+            candidatos = [(chave, entrada) for chave, entrada in self._entradas.items()
+                          if entrada[1] is not None and agora - entrada[0] <= self.ttl]
+            if not candidatos:
+                return None
+            similaridades = np.stack([entrada[1] for _, entrada in candidatos]) @ vetor
+            melhor = int(np.argmax(similaridades))
+            if similaridades[melhor] < self.limiar_similaridade:
+                return None
+            chave, entrada = candidatos[melhor]
+            self._entradas.move_to_end(chave)
+            return list(entrada[2])
+
+    def salvar(self, chave: str, vetor: Optional[np.ndarray], documentos: list[Document],
+               geracao: Optional[int] = None) -> None:
+        """
+        Guarda o resultado de uma consulta, descartando a entrada usada há mais tempo se necessário.
+
+        Com a geração do índice em que a busca foi feita, o resultado é
+        descartado se o índice tiver mudado durante a busca.
+        """
+        with self._lock:
+            if geracao is not None and geracao != self.geracao:
+                return
+            self._entradas[chave] = (time.monotonic(), vetor, list(documentos))
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+
+
+def _normalizar_vetor(vetor: list[float]) -> np.ndarray:
+    vetor = np.asarray(vetor, dtype=np.float32)
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma else vetor
+
+
+class RetrieverComCache(BaseRetriever):
+    """
+    Retriever que consulta o CacheRecuperacao antes de delegar a outro retriever.
+
+    Acertos exatos não geram embedding nem busca. Com limiar de similaridade,
+    uma consulta nova gera apenas o embedding, que o provedor de embeddings
+    memoriza para a busca subsequente em caso de falta.
+    """
+
+    retriever: BaseRetriever
+    indice_vetorial: object
+    cache: CacheRecuperacao
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        geracao = getattr(self.indice_vetorial, "geracao", 0)
+        self.cache.sincronizar(geracao)
+        chave = normalizar_consulta(query)
+        documentos = self.cache.buscar(chave)
+        if documentos is not None:
+            return documentos
+
+        vetor = None
+        if self.cache.limiar_similaridade > 0:
+            vetor = _normalizar_vetor(self.indice_vetorial.embedding_function.embed_query(query))
+            documentos = self.cache.buscar_semelhante(vetor)
+            if documentos is not None:
+                return documentos
+
+        documentos = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        self.cache.salvar(chave, vetor, documentos, geracao)
+        return documentos
+
+
+def obter_cache_recuperacao(indice_vetorial) -> Optional[CacheRecuperacao]:
+    """
+    Retorna o cache de consultas associado a um índice, criando-o na primeira chamada.
+
+    O cache fica no próprio índice para ser compartilhado por todos os
+    retrievers criados a partir dele (por exemplo, a cada execução do
+    Streamlit). Retorna None se o cache estiver desativado.
+    """
+    if CAPACIDADE_CACHE_CONSULTAS <= 0:
+        return None
+    cache = getattr(indice_vetorial, "cache_recuperacao", None)
+    if cache is None:
+        cache = CacheRecuperacao()
+        indice_vetorial.cache_recuperacao = cache
+    return cache
@@ -0,0 +1,173 @@
+# construir_indice.py
+"""
+Constrói o índice vetorial da base de conhecimento fora do servidor.
+
+Executa o mesmo pipeline do processador_documentos (extração, divisão,
+embeddings, índice e persistência) sobre uma pasta de PDFs, mostra o tempo
+e a vazão de cada etapa e grava um relatório de construção ao lado do
+índice. O diretório de índices resultante pode ser distribuído junto com a
+aplicação, de modo que app.py e api.py apenas carreguem o índice pronto
+(ver ETP_CONSTRUIR_INDICE_SOB_DEMANDA).
+
+Uso:
+    python construir_indice.py [data/input] [--forcar] [--diretorio-indices DIR] [--relatorio ARQ]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime, timezone
+
+from streamlit.logger import set_log_level
+
+import processador_documentos as processador
+from processador_documentos import (
+    Cronometro, calcular_hash_arquivo, calcular_chave_indice, configuracao_indice,
+    criar_embeddings, carregar_indice, construir_indice, salvar_indice, relatorio_memoria,
+)
+
+# Etapas na ordem em que são exibidas, com a unidade contada em cada uma
+ETAPAS = [
+    ("hash", "arquivos"),
+    ("reaproveitamento", None),
+    ("extracao", "páginas"),
+    ("limpeza", "páginas"),
+    ("divisao", "chunks"),
+    ("deduplicacao", "chunks"),
+    ("embeddings", "chunks"),
+    ("indexacao", None),
+    ("persistencia", None),
+]
+
+
+def listar_pdfs(entradas: list[str]) -> list[str]:
+    """Expande pastas em seus PDFs (recursivamente) e mantém os arquivos informados diretamente."""
+    caminhos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            for raiz, _, arquivos in os.walk(entrada):
+                caminhos.extend(os.path.join(raiz, nome) for nome in arquivos if nome.lower().endswith(".pdf"))
+        elif os.path.isfile(entrada):
+            caminhos.append(entrada)
+        else:
+            print(f"⚠️ Entrada não encontrada: {entrada}. Pulando.")
+    return sorted(set(caminhos))
+
+
+def versoes() -> dict:
+    """Versões dos componentes que influenciam o índice gerado."""
+    resultado = {"python": platform.python_version()}
+    for modulo in ("faiss", "langchain", "numpy", "pypdf"):
+        try:
+            resultado[modulo] = getattr(__import__(modulo), "__version__", "desconhecida")
+        except ImportError:
+            resultado[modulo] = None
+    return resultado
+
+
+def imprimir_tempos(cronometro: Cronometro, total: float) -> dict:
+    """Imprime a tabela de tempos por etapa e retorna a vazão de cada etapa com contagem."""
+    vazao = {}
+    print(f"\n{'Etapa':<18}{'Tempo (s)':>12}{'Itens':>10}{'Vazão':>22}")
+    for etapa, unidade in ETAPAS:
+        tempo = cronometro.tempos.get(etapa, 0.0)
+        quantidade = cronometro.contagens.get(etapa, 0)
+        texto_vazao = ""
+        if unidade and quantidade and tempo > 0:
+            vazao[etapa] = round(quantidade / tempo, 2)
+            texto_vazao = f"{vazao[etapa]:.1f} {unidade}/s"
+        print(f"{etapa:<18}{tempo:>12.2f}{quantidade if unidade else '':>10}{texto_vazao:>22}")
+    print(f"{'total':<18}{total:>12.2f}")
+    return vazao
+
+
+def main(argumentos: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Constrói e persiste o índice vetorial da base de conhecimento.")
+    parser.add_argument("entradas", nargs="*", default=["data/input"],
+                        help="Pastas ou arquivos PDF a indexar (padrão: data/input).")
+    parser.add_argument("--forcar", action="store_true",
+                        help="Reconstrói do zero, sem reaproveitar índices já persistidos.")
+    parser.add_argument("--diretorio-indices",
+                        help="Diretório onde o índice é gravado (padrão: ETP_DIRETORIO_INDICES ou data/indices).")
+    parser.add_argument("--relatorio", help="Grava também uma cópia do relatório de construção neste arquivo.")
+    args = parser.parse_args(argumentos)
+
+    # Fora do `streamlit run`, as chamadas st.* do processador só gerariam avisos
+    set_log_level("error")
+    if args.diretorio_indices:
+        processador.DIRETORIO_INDICES = args.diretorio_indices
+
+    caminhos_pdf = listar_pdfs(args.entradas)
+    if not caminhos_pdf:
+        print("❌ Nenhum PDF encontrado.")
+        return 1
+
+    inicio = time.perf_counter()
+    cronometro = Cronometro(relatar=lambda mensagem: print(f"   {mensagem}", flush=True))
+    print(f"📄 {len(caminhos_pdf)} PDF(s) a indexar")
+
+    with cronometro.medir("hash"):
+        hashes_pdf = {caminho: calcular_hash_arquivo(caminho) for caminho in caminhos_pdf}
+    cronometro.contar("hash", len(hashes_pdf))
+    configuracao = configuracao_indice()
+    chave = calcular_chave_indice(list(hashes_pdf.values()), configuracao)
+
+    embeddings = criar_embeddings()
+    falhas = set()
+    indice_vetorial = None if args.forcar else carregar_indice(chave, embeddings, mmap=False)
+    construido = indice_vetorial is None
+    if not construido:
+        print(f"✅ Índice já existente para estes PDFs e parâmetros: {chave}")
+    else:
+        print("🔄 Construindo índice...")
+        indice_vetorial = construir_indice(hashes_pdf, embeddings, falhas, cronometro,
+                                           incremental=not args.forcar)
+        if indice_vetorial is None:
+            print("❌ Nenhum documento PDF pôde ser indexado.")
+            return 1
+        with cronometro.medir("persistencia"):
+            chave = salvar_indice(indice_vetorial)
+
+    total = time.perf_counter() - inicio
+    vazao = imprimir_tempos(cronometro, total)
+
+    diretorio = os.path.join(processador.DIRETORIO_INDICES, chave)
+    relatorio = {
+        "gerado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "chave": chave,
+        "diretorio": diretorio,
+        "entradas": [
+            {"caminho": caminho, "bytes": os.path.getsize(caminho), "hash": hashes_pdf[caminho]}
+            for caminho in caminhos_pdf
+        ],
+        "falhas": sorted(falhas),
+        "configuracao": configuracao,
+        "tipo_indice": type(indice_vetorial.index).__name__,
+        "total_chunks": len(indice_vetorial.index_to_docstore_id),
+        "memoria_por_mil_chunks": relatorio_memoria(indice_vetorial),
+        "tempos_segundos": {etapa: round(tempo, 3) for etapa, tempo in cronometro.tempos.items()},
+        "contagens": dict(cronometro.contagens),
+        "vazao_por_segundo": vazao,
+        "tempo_total_segundos": round(total, 3),
+        "versoes": versoes(),
+    }
+    # Um índice já existente mantém o relatório da construção que o gerou
+    destinos = [args.relatorio] if args.relatorio else []
+    if construido:
+        destinos.append(os.path.join(diretorio, "construcao.json"))
+    for destino in destinos:
+        with open(destino, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✅ {relatorio['total_chunks']} chunks ({relatorio['tipo_indice']}) em {diretorio}")
+    if cronometro.contagens.get("duplicatas"):
+        print(f"♻️ {cronometro.contagens['duplicatas']} chunks quase idênticos descartados antes dos embeddings")
+    if falhas:
+        print(f"⚠️ PDFs que falharam: {', '.join(sorted(falhas))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,135 @@
+# deduplicacao.py
+import os
+import zlib
+from typing import Iterable, Optional
+import numpy as np
+from busca_hibrida import tokenizar
+
+# Similaridade de Jaccard estimada a partir da qual dois chunks são considerados o
+# mesmo trecho (0 desativa a deduplicação)
+LIMIAR_DUPLICATAS = float(os.getenv("ETP_LIMIAR_DUPLICATAS", "0.7"))
+
+# Parâmetros do MinHash/LSH: 16 bandas de 4 linhas encontram como candidatos
+# ~99% dos pares com similaridade 0,7 e poucos pares abaixo de 0,4
+PERMUTACOES_MINHASH = 64
+BANDAS_LSH = 16
+TAMANHO_SHINGLE = 3
+_SEMENTE_MINHASH = 14133
+
+# Metadados que identificam onde um trecho aparece
+CAMPOS_LOCALIZACAO = ("source", "page", "pagina_final", "artigo")
+
+
+class IndiceDuplicatas:
+    """
+    Detecta chunks quase idênticos por MinHash com LSH.
+
+    Cada chunk representante guarda a assinatura MinHash dos seus shingles
+    (sequências de TAMANHO_SHINGLE termos). Um chunk novo cuja similaridade
+    estimada com algum representante atinja o limiar não recebe embedding
+    nem posição no índice: vira uma ocorrência do representante, que guarda
+    os metadados de todos os lugares em que o trecho aparece.
+
+    Quando o documento de um representante é removido, suas ocorrências em
+    outros documentos são devolvidas por remover() para que uma delas seja
+    promovida a representante.
+    """
+
+    def __init__(self, limiar: float = LIMIAR_DUPLICATAS, permutacoes: int = PERMUTACOES_MINHASH,
+                 bandas: int = BANDAS_LSH):
+        self.limiar = limiar
+        self.bandas = bandas
+        self.linhas_por_banda = permutacoes // bandas
+        estado = np.random.RandomState(_SEMENTE_MINHASH)
+        # Hash multiplicativo (a·x + b) >> 32, com a ímpar, sobre o CRC32 de cada shingle
+        self._a = estado.randint(0, 1 << 62, permutacoes, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = estado.randint(0, 1 << 62, permutacoes, dtype=np.uint64)
+        self.assinaturas: dict[str, np.ndarray] = {}
+        self.ocorrencias: dict[str, list[dict]] = {}
+        self._baldes: dict[tuple[int, bytes], list[str]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(locais) for locais in self.ocorrencias.values())
+
+    def assinatura(self, texto: str) -> Optional[np.ndarray]:
+        """Calcula a assinatura MinHash do texto, ou None se ele não tiver termos."""
+        termos = tokenizar(texto)
+        if not termos:
+            return None
+        shingles = {" ".join(termos[i:i + TAMANHO_SHINGLE])
+                    for i in range(max(1, len(termos) - TAMANHO_SHINGLE + 1))}
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+        return ((np.outer(hashes, self._a) + self._b) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+    def _chaves_bandas(self, assinatura: np.ndarray) -> list[tuple[int, bytes]]:
+        return [(banda, assinatura[banda * self.linhas_por_banda:(banda + 1) * self.linhas_por_banda].tobytes())
+                for banda in range(self.bandas)]
+
+    def procurar(self, assinatura: Optional[np.ndarray]) -> Optional[str]:
+        """Retorna o id do representante mais similar à assinatura, se atingir o limiar."""
+        if assinatura is None:
+            return None
+        candidatos = {id_chunk for chave in self._chaves_bandas(assinatura) for id_chunk in self._baldes.get(chave, ())}
+        melhor, melhor_similaridade = None, self.limiar
+        for id_chunk in candidatos:
+            similaridade = float(np.mean(self.assinaturas[id_chunk] == assinatura))
+            if similaridade >= melhor_similaridade:
+                melhor, melhor_similaridade = id_chunk, similaridade
+        return melhor
+
+    def registrar(self, id_chunk: str, assinatura: Optional[np.ndarray]) -> None:
+        """Registra um chunk indexado como representante do seu trecho."""
+        if assinatura is None:
+            return
+        self.assinaturas[id_chunk] = assinatura
+        for chave in self._chaves_bandas(assinatura):
+            self._baldes.setdefault(chave, []).append(id_chunk)
+
+    def adicionar_ocorrencia(self, id_representante: str, id_chunk: str, metadados: dict) -> None:
+        """Registra um chunk descartado como outra ocorrência do trecho do representante."""
+        self.ocorrencias.setdefault(id_representante, []).append({"id": id_chunk, **metadados})
+
+    def ids_ocorrencias(self) -> list[str]:
+        """Ids de todos os chunks descartados como duplicatas."""
+        return [local["id"] for locais in self.ocorrencias.values() for local in locais]
+
+    def localizacoes(self, id_chunk: str) -> list[dict]:
+        """Onde mais o trecho do representante aparece (fonte, página e artigo)."""
+        return [{campo: local[campo] for campo in CAMPOS_LOCALIZACAO if campo in local}
+                for local in self.ocorrencias.get(id_chunk, ())]
+
+    def remover(self, ids: Iterable[str]) -> dict[str, tuple[np.ndarray, list[dict]]]:
+        """
+        Remove representantes e ocorrências pelos ids.
+
+        Returns:
+            dict: Para cada representante removido que ainda tem ocorrências
+                restantes, (assinatura, ocorrências), para que uma delas o substitua.
+        """
+        remover = set(ids)
+        orfaos = {}
+        for id_representante in list(self.ocorrencias):
+            restantes = [local for local in self.ocorrencias[id_representante] if local["id"] not in remover]
+            if restantes:
+                self.ocorrencias[id_representante] = restantes
+            else:
+                del self.ocorrencias[id_representante]
+
+        for id_chunk in remover & self.assinaturas.keys():
+            assinatura = self.assinaturas.pop(id_chunk)
+            for chave in self._chaves_bandas(assinatura):
+                balde = self._baldes[chave]
+                balde.remove(id_chunk)
+                if not balde:
+                    del self._baldes[chave]
+            if id_chunk in self.ocorrencias:
+                orfaos[id_chunk] = (assinatura, self.ocorrencias.pop(id_chunk))
+        return orfaos
+
+
+def construir_indice_duplicatas(indice_vetorial) -> IndiceDuplicatas:
+    """Registra como representantes todos os chunks já presentes em um índice vetorial."""
+    duplicatas = IndiceDuplicatas()
+    for id_chunk in indice_vetorial.index_to_docstore_id.values():
+        duplicatas.registrar(id_chunk, duplicatas.assinatura(indice_vetorial.docstore.search(id_chunk).page_content))
+    return duplicatas
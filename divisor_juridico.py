@@ -0,0 +1,225 @@
+# divisor_juridico.py
+import re
+from itertools import groupby
+from typing import Iterable, Iterator, Optional
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+# Divisões estruturais da lei: sempre iniciam um novo chunk
+_RE_ESTRUTURA = re.compile(
+    r"^(LIVRO|PARTE|T[ÍI]TULO|CAP[ÍI]TULO|SE[ÇC][ÃA]O|Se[çc][ãa]o|SUBSE[ÇC][ÃA]O|Subse[çc][ãa]o)\s+[IVXLCDM]+\b"
+)
+# Início de artigo: "Art. 1º", "Art. 75.", "Art. 4º-A"
+_RE_ARTIGO = re.compile(r"^Art\.\s*(\d+(?:\.\d+)?)\s*[º°o]?(-[A-Z])?")
+# Dispositivos internos do artigo: parágrafos, incisos e alíneas
+_RE_DISPOSITIVO = re.compile(r"^(§\s*\d+|Par[áa]grafo [úu]nico|[IVXLCDM]+\s*[-–—]\s|[a-z]\)\s)")
+# Títulos de seção numerados de manuais: "2.2. COMPETÊNCIAS", "4.1.8) Levantamento de riscos", "3. PESQUISA DE PREÇOS"
+_RE_TITULO_MANUAL = re.compile(r"^(\d+(\.\d+)+[.)]?\s+\S|\d+[.)]\s+[A-ZÁÂÃÉÊÍÓÔÕÚÇ][A-ZÁÂÃÉÊÍÓÔÕÚÇ\s,-]{3,}$)")
+_TAMANHO_MAXIMO_TITULO = 100
+
+
+def _classificar_linha(linha: str) -> tuple[Optional[str], Optional[str]]:
+    """Retorna (tipo, rótulo) de uma linha que inicia um bloco, ou (None, None) para continuação."""
+    if _RE_ESTRUTURA.match(linha):
+        return "secao", linha
+    artigo = _RE_ARTIGO.match(linha)
+    if artigo:
+        return "artigo", artigo.group(1) + (artigo.group(2) or "")
+    if _RE_DISPOSITIVO.match(linha):
+        return "dispositivo", None
+    if (_RE_TITULO_MANUAL.match(linha) and len(linha) <= _TAMANHO_MAXIMO_TITULO
+            and not linha.endswith((";", ",", ":"))):
+        return "secao", linha
+    return None, None
+
+
+class DivisorJuridico:
+    """
+    Divide textos normativos e manuais em chunks alinhados à sua estrutura.
+
+    Reconhece a estrutura da Lei 14.133 (Título, Capítulo, Seção, Art., §,
+    inciso, alínea) e os títulos numerados de manuais. Cada artigo (ou
+    parágrafo de texto corrido) é uma unidade: unidades pequenas consecutivas
+    da mesma seção são agrupadas até o tamanho máximo, e uma unidade maior
+    que o limite é dividida nas fronteiras dos seus dispositivos, com o
+    número do artigo repetido no início de cada parte. Não há sobreposição
+    entre chunks.
+
+    Os chunks podem atravessar páginas; o metadado "page" indica a página
+    inicial e "pagina_final" a última. Quando aplicável, "artigo" indica o
+    artigo (ou intervalo de artigos) e "secao" a última divisão estrutural.
+    """
+
+    def __init__(self, tamanho_maximo: int = 1000):
+        self.tamanho_maximo = tamanho_maximo
+
+    def dividir(self, paginas: Iterable[Document]) -> Iterator[Document]:
+        """
+        Divide um fluxo de páginas em chunks, documento a documento.
+
+        Args:
+            paginas (Iterable[Document]): Páginas em ordem (arquivo, página), com metadado "source".
+
+        Yields:
+            Document: Os chunks, em ordem.
+        """
+        for fonte, paginas_documento in groupby(paginas, key=lambda pagina: pagina.metadata["source"]):
+            unidades = self._unidades(self._blocos(paginas_documento))
+            yield from self._empacotar(fonte, unidades)
+
+    def _blocos(self, paginas: Iterable[Document]) -> Iterator[dict]:
+        """Agrupa as linhas das páginas em blocos (título, artigo, dispositivo ou parágrafo)."""
+        atual, fim_paragrafo = None, False
+        for pagina in paginas:
+            numero = pagina.metadata.get("page", 0)
+            for linha in pagina.page_content.splitlines():
+                linha = linha.strip()
+                if not linha:
+                    fim_paragrafo = True
+                    continue
+
+                tipo, rotulo = _classificar_linha(linha)
+                if tipo is None and atual is not None and not fim_paragrafo and _aceita_continuacao(atual):
+                    atual["linhas"].append(linha)
+                    atual["pagina_final"] = numero
+                else:
+                    if atual is not None:
+                        yield atual
+                    atual = {"tipo": tipo or "paragrafo", "rotulo": rotulo, "linhas": [linha],
+                             "pagina": numero, "pagina_final": numero}
+                fim_paragrafo = False
+        if atual is not None:
+            yield atual
+
+    def _unidades(self, blocos: Iterable[dict]) -> Iterator[dict]:
+        """
+        Agrupa os blocos em unidades indivisíveis sempre que possível.
+
+        Um artigo reúne o caput e todos os seus dispositivos; fora de artigos,
+        um parágrafo reúne as alíneas que o seguem. Títulos formam unidades
+        próprias, que marcam o início de uma nova seção.
+        """
+        atual, secao = None, None
+        for bloco in blocos:
+            if bloco["tipo"] == "secao":
+                if atual is not None:
+                    yield atual
+                secao = bloco["rotulo"]
+                yield {"tipo": "secao", "blocos": [bloco], "artigo": None, "secao": secao}
+                atual = None
+            elif bloco["tipo"] == "artigo" or atual is None:
+                if atual is not None:
+                    yield atual
+                atual = {"tipo": bloco["tipo"], "blocos": [bloco], "artigo": bloco["rotulo"], "secao": secao}
+            elif bloco["tipo"] == "paragrafo" and atual["tipo"] != "artigo":
+                yield atual
+                atual = {"tipo": "paragrafo", "blocos": [bloco], "artigo": None, "secao": secao}
+            else:
+                atual["blocos"].append(bloco)
+        if atual is not None:
+            yield atual
+
+    def _empacotar(self, fonte: str, unidades: Iterable[dict]) -> Iterator[Document]:
+        """Agrupa unidades consecutivas da mesma seção em chunks de até tamanho_maximo caracteres."""
+        pendentes, tamanho = [], 0
+        for unidade in unidades:
+            tamanho_unidade = _tamanho_unidade(unidade)
+
+            if unidade["tipo"] == "secao":
+                if pendentes:
+                    yield self._criar_chunk(fonte, pendentes)
+                pendentes, tamanho = [unidade], tamanho_unidade
+                continue
+
+            if tamanho + tamanho_unidade <= self.tamanho_maximo:
+                pendentes.append(unidade)
+                tamanho += tamanho_unidade
+                continue
+
+            # Unidades maiores que o limite (ou que não cabem junto ao título da
+            # seção) são divididas nas fronteiras dos dispositivos, completando
+            # o chunk em andamento; as demais começam um chunk novo, inteiras.
+            so_titulos = all(p["tipo"] == "secao" for p in pendentes)
+            if tamanho_unidade > self.tamanho_maximo or (pendentes and so_titulos):
+                resto = yield from self._dividir_unidade(fonte, unidade, pendentes, tamanho)
+                pendentes, tamanho = [resto], _tamanho_unidade(resto)
+            else:
+                yield self._criar_chunk(fonte, pendentes)
+                pendentes, tamanho = [unidade], tamanho_unidade
+
+        if pendentes:
+            yield self._criar_chunk(fonte, pendentes)
+
+    def _dividir_unidade(self, fonte: str, unidade: dict, pendentes: list[dict], tamanho: int):
+        """
+        Divide uma unidade nas fronteiras dos seus blocos, a partir do chunk em andamento.
+
+        Gera os chunks completos e retorna a última parte, ainda incompleta,
+        como uma unidade. Cada parte que continua um artigo começa com o
+        número do artigo.
+        """
+        prefixo = f"Art. {unidade['artigo']} (continuação)" if unidade["artigo"] else ""
+        blocos = [parte for bloco in unidade["blocos"] for parte in self._fragmentar_bloco(bloco, prefixo)]
+
+        parte = []
+        for bloco in blocos:
+            tamanho_bloco = len(_texto_bloco(bloco)) + 1
+            if (parte or pendentes) and tamanho + tamanho_bloco > self.tamanho_maximo:
+                yield self._criar_chunk(fonte, pendentes + ([{**unidade, "blocos": parte}] if parte else []))
+                continuacao = bool(parte) and bool(prefixo)
+                pendentes, parte = [], [_bloco_texto(prefixo, bloco)] if continuacao else []
+                tamanho = len(prefixo) + 1 if continuacao else 0
+            parte.append(bloco)
+            tamanho += tamanho_bloco
+        return {**unidade, "blocos": [b for p in pendentes for b in p["blocos"]] + parte}
+
+    def _fragmentar_bloco(self, bloco: dict, prefixo: str) -> list[dict]:
+        """Divide um único bloco maior que o limite com o divisor recursivo (sem sobreposição)."""
+        limite = self.tamanho_maximo - len(prefixo) - 1
+        texto = _texto_bloco(bloco)
+        if len(texto) <= limite:
+            return [bloco]
+        divisor = RecursiveCharacterTextSplitter(chunk_size=limite, chunk_overlap=0)
+        return [{**bloco, "linhas": [pedaco]} for pedaco in divisor.split_text(texto)]
+
+    def _criar_chunk(self, fonte: str, unidades: list[dict]) -> Document:
+        """Monta o Document de um chunk a partir das unidades que o compõem."""
+        blocos = [b for u in unidades for b in u["blocos"]]
+        artigos = [u["artigo"] for u in unidades if u["artigo"]]
+        metadados = {
+            "source": fonte,
+            "page": blocos[0]["pagina"],
+            "pagina_final": blocos[-1]["pagina_final"],
+        }
+        if artigos:
+            metadados["artigo"] = artigos[0] if artigos[0] == artigos[-1] else f"{artigos[0]}-{artigos[-1]}"
+        if unidades[0]["secao"]:
+            metadados["secao"] = unidades[0]["secao"]
+        return Document(page_content="\n".join(_texto_bloco(b) for b in blocos), metadata=metadados)
+
+
+def _aceita_continuacao(bloco: dict) -> bool:
+    """
+    Indica se a próxima linha sem marcador continua o bloco.
+
+    Títulos da lei ocupam duas linhas ("CAPÍTULO I" e o nome do capítulo);
+    títulos de manuais, uma só. Nos demais blocos, a linha seguinte é
+    continuação até uma linha em branco.
+    """
+    if bloco["tipo"] != "secao":
+        return True
+    return len(bloco["linhas"]) == 1 and bool(_RE_ESTRUTURA.match(bloco["linhas"][0]))
+
+
+def _tamanho_unidade(unidade: dict) -> int:
+    return sum(len(_texto_bloco(b)) + 1 for b in unidade["blocos"])
+
+
+def _texto_bloco(bloco: dict) -> str:
+    return "\n".join(bloco["linhas"])
+
+
+def _bloco_texto(texto: str, referencia: dict) -> dict:
+    """Cria um bloco sintético (como o cabeçalho de continuação) nas páginas de outro bloco."""
+    return {"tipo": "paragrafo", "rotulo": None, "linhas": [texto],
+            "pagina": referencia["pagina"], "pagina_final": referencia["pagina"]}
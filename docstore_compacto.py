@@ -0,0 +1,179 @@
+# docstore_compacto.py
+import os
+import json
+from typing import Dict, Iterable, List, Optional, Union
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+# Metadados guardados em colunas; os demais vão para "extras" (esparso, em JSON)
+_COLUNAS_INTEIRAS = ("page", "pagina_final")
+_COLUNAS_TEXTO = ("artigo", "secao")
+_CAMPOS_FONTE = ("source", "id_documento", "hash_documento")
+_AUSENTE = -1
+
+
+def _ler_array(caminho: str, mmap: bool) -> np.ndarray:
+    return np.load(caminho, mmap_mode="r" if mmap else None)
+
+
+class DocstoreCompacto(Docstore, AddableMixin):
+    """
+    Docstore com os chunks em formato colunar, mapeado em memória a partir do disco.
+
+    Os textos ficam em um único blob UTF-8 com um array de offsets, e os
+    metadados em arrays de inteiros (fonte, página, artigo, seção) que
+    apontam para pequenas tabelas de strings. Carregar o docstore é mapear
+    os arquivos, sem desserializar um objeto por chunk; o Document é montado
+    apenas quando o chunk é consultado.
+
+    Chunks adicionados ou removidos depois do carregamento ficam em memória
+    até o próximo salvar(). A interface é a mesma do InMemoryDocstore.
+    """
+
+    def __init__(self):
+        self._ids = np.empty(0, dtype="S1")
+        self._ordem_ids = np.empty(0, dtype=np.int64)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._textos = np.empty(0, dtype=np.uint8)
+        self._colunas: dict[str, np.ndarray] = {}
+        self._tabelas: dict = {"fontes": [], "artigo": [], "secao": [], "extras": {}}
+        self._novos: Dict[str, Document] = {}
+        self._removidos: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._removidos) + len(self._novos)
+
+    def _linha(self, id_chunk: str) -> Optional[int]:
+        """Posição do chunk nos arrays persistidos, por busca binária nos ids ordenados."""
+        if not len(self._ids):
+            return None
+        chave = id_chunk.encode("utf-8")
+        i = int(np.searchsorted(self._ids, chave, sorter=self._ordem_ids))
+        if i < len(self._ids) and self._ids[self._ordem_ids[i]] == chave:
+            return int(self._ordem_ids[i])
+        return None
+
+    def _contem(self, id_chunk: str) -> bool:
+        if id_chunk in self._novos:
+            return True
+        return id_chunk not in self._removidos and self._linha(id_chunk) is not None
+
+    def _montar_documento(self, linha: int) -> Document:
+        inicio, fim = self._offsets[linha], self._offsets[linha + 1]
+        texto = self._textos[inicio:fim].tobytes().decode("utf-8")
+
+        fonte = self._tabelas["fontes"][self._colunas["fonte"][linha]]
+        metadados = {"source": fonte["source"]}
+        for coluna in _COLUNAS_INTEIRAS:
+            valor = int(self._colunas[coluna][linha])
+            if valor != _AUSENTE:
+                metadados[coluna] = valor
+        for coluna in _COLUNAS_TEXTO:
+            valor = int(self._colunas[coluna][linha])
+            if valor != _AUSENTE:
+                metadados[coluna] = self._tabelas[coluna][valor]
+        metadados.update({campo: fonte[campo] for campo in _CAMPOS_FONTE[1:] if campo in fonte})
+        metadados.update(self._tabelas["extras"].get(str(linha), {}))
+        return Document(page_content=texto, metadata=metadados)
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Busca um chunk pelo id; retorna a mensagem de erro do InMemoryDocstore se não existir."""
+        if search in self._novos:
+            return self._novos[search]
+        linha = None if search in self._removidos else self._linha(search)
+        if linha is None:
+            return f"ID {search} not found."
+        return self._montar_documento(linha)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        existentes = {id_chunk for id_chunk in texts if self._contem(id_chunk)}
+        if existentes:
+            raise ValueError(f"Tried to add ids that already exist: {existentes}")
+        # Um id removido e adicionado de novo continua oculto na parte gravada
+        self._novos.update(texts)
+
+    def delete(self, ids: List) -> None:
+        if not any(self._contem(id_chunk) for id_chunk in ids):
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        for id_chunk in ids:
+            if self._novos.pop(id_chunk, None) is None and self._linha(id_chunk) is not None:
+                self._removidos.add(id_chunk)
+
+    def salvar(self, diretorio: str, ids: Iterable[str]) -> None:
+        """
+        Grava os chunks informados, nessa ordem, no diretório.
+
+        Args:
+            diretorio (str): Diretório de destino (criado se não existir).
+            ids (Iterable[str]): Ids dos chunks, normalmente na ordem das posições do índice.
+        """
+        salvar_docstore(self, diretorio, ids)
+
+    @classmethod
+    def carregar(cls, diretorio: str, mmap: bool = True) -> "DocstoreCompacto":
+        """Abre um docstore gravado por salvar(); com mmap=True, nada é copiado para a memória do processo."""
+        docstore = cls()
+        docstore._ids = _ler_array(os.path.join(diretorio, "ids.npy"), mmap)
+        docstore._ordem_ids = _ler_array(os.path.join(diretorio, "ordem_ids.npy"), mmap)
+        docstore._offsets = _ler_array(os.path.join(diretorio, "offsets.npy"), mmap)
+        caminho_textos = os.path.join(diretorio, "textos.bin")
+        if os.path.getsize(caminho_textos):
+            docstore._textos = (np.memmap(caminho_textos, dtype=np.uint8, mode="r") if mmap
+                                else np.fromfile(caminho_textos, dtype=np.uint8))
+        for coluna in ("fonte",) + _COLUNAS_INTEIRAS + _COLUNAS_TEXTO:
+            docstore._colunas[coluna] = _ler_array(os.path.join(diretorio, f"{coluna}.npy"), mmap)
+        with open(os.path.join(diretorio, "tabelas.json"), encoding="utf-8") as f:
+            docstore._tabelas = json.load(f)
+        return docstore
+
+    def ids(self) -> list[str]:
+        """Ids de todos os chunks, na ordem em que foram gravados (seguidos dos adicionados depois)."""
+        gravados = [id_chunk.decode("utf-8") for id_chunk in self._ids]
+        return [i for i in gravados if i not in self._removidos] + list(self._novos)
+
+
+def salvar_docstore(docstore: Docstore, diretorio: str, ids: Iterable[str]) -> None:
+    """Grava qualquer docstore no formato do DocstoreCompacto, com os chunks na ordem de `ids`."""
+    os.makedirs(diretorio, exist_ok=True)
+    lista_ids, offsets = [], [0]
+    colunas = {coluna: [] for coluna in ("fonte",) + _COLUNAS_INTEIRAS + _COLUNAS_TEXTO}
+    tabelas = {"fontes": [], "artigo": [], "secao": [], "extras": {}}
+    indices_tabela = {"fontes": {}, "artigo": {}, "secao": {}}
+
+    def indice_em(tabela: str, valor, chave) -> int:
+        if chave not in indices_tabela[tabela]:
+            indices_tabela[tabela][chave] = len(tabelas[tabela])
+            tabelas[tabela].append(valor)
+        return indices_tabela[tabela][chave]
+
+    with open(os.path.join(diretorio, "textos.bin"), "wb") as arquivo_textos:
+        for linha, id_chunk in enumerate(ids):
+            documento = docstore.search(id_chunk)
+            metadados = dict(documento.metadata)
+            texto = documento.page_content.encode("utf-8")
+            arquivo_textos.write(texto)
+            offsets.append(offsets[-1] + len(texto))
+            lista_ids.append(id_chunk)
+
+            fonte = {campo: metadados.pop(campo) for campo in _CAMPOS_FONTE if campo in metadados}
+            colunas["fonte"].append(indice_em("fontes", fonte, json.dumps(fonte, sort_keys=True)))
+            for coluna in _COLUNAS_INTEIRAS:
+                valor = metadados.pop(coluna, None)
+                colunas[coluna].append(valor if isinstance(valor, int) else _AUSENTE)
+                if valor is not None and not isinstance(valor, int):
+                    metadados[coluna] = valor
+            for coluna in _COLUNAS_TEXTO:
+                valor = metadados.pop(coluna, None)
+                colunas[coluna].append(_AUSENTE if valor is None else indice_em(coluna, valor, valor))
+            if metadados:
+                tabelas["extras"][str(linha)] = metadados
+
+    ids_array = np.array([i.encode("utf-8") for i in lista_ids], dtype=f"S{max([1] + [len(i) for i in lista_ids])}")
+    np.save(os.path.join(diretorio, "ids.npy"), ids_array)
+    np.save(os.path.join(diretorio, "ordem_ids.npy"), np.argsort(ids_array, kind="stable").astype(np.int64))
+    np.save(os.path.join(diretorio, "offsets.npy"), np.array(offsets, dtype=np.int64))
+    for coluna, valores in colunas.items():
+        np.save(os.path.join(diretorio, f"{coluna}.npy"), np.array(valores, dtype=np.int32))
+    with open(os.path.join(diretorio, "tabelas.json"), "w", encoding="utf-8") as f:
+        json.dump(tabelas, f, ensure_ascii=False)
@@ -0,0 +1,128 @@
+# empacotador_contexto.py
+import os
+import math
+from functools import lru_cache
+from langchain_core.documents import Document
+
+# Orçamentos, em tokens, dos trechos recuperados e do histórico da conversa no prompt do RAG
+ORCAMENTO_TOKENS_CONTEXTO = int(os.getenv("ETP_ORCAMENTO_TOKENS_CONTEXTO", "2000"))
+ORCAMENTO_TOKENS_HISTORICO = int(os.getenv("ETP_ORCAMENTO_TOKENS_HISTORICO", "800"))
+# Tamanho máximo do resumo das mensagens antigas da conversa
+ORCAMENTO_TOKENS_RESUMO = int(os.getenv("ETP_ORCAMENTO_TOKENS_RESUMO", "300"))
+
+# Codificação do tiktoken usada na contagem; sem tiktoken (ou sem a
+# codificação em cache local), os tokens são estimados pelo tamanho do texto
+CODIFICACAO_TOKENS = os.getenv("ETP_CODIFICACAO_TOKENS", "cl100k_base")
+CARACTERES_POR_TOKEN = 4
+
+# Um item que só caberia com menos tokens que isso é descartado em vez de cortado
+TOKENS_MINIMOS_ITEM = 50
+# Custo aproximado do cabeçalho de fonte que acompanha cada trecho no prompt
+TOKENS_CABECALHO_TRECHO = 20
+# Fração máxima do orçamento do histórico que uma única mensagem pode ocupar
+PROPORCAO_MAXIMA_MENSAGEM = 1 / 3
+
+
+@lru_cache(maxsize=None)
+def _codificacao(nome: str):
+    """Carrega a codificação do tiktoken uma única vez; None se não estiver disponível."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(nome)
+    except Exception:
+        # Sem o pacote ou sem acesso ao arquivo da codificação: usa a estimativa
+        return None
+
+
+def contar_tokens(texto: str) -> int:
+    """Conta os tokens do texto com o tokenizador local, ou os estima pelo tamanho."""
+    codificacao = _codificacao(CODIFICACAO_TOKENS)
+    if codificacao is None:
+        return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+    return len(codificacao.encode(texto, disallowed_special=()))
+
+
+def truncar_tokens(texto: str, limite: int) -> str:
+    """Corta o texto para no máximo `limite` tokens, marcando o corte com "..."."""
+    codificacao = _codificacao(CODIFICACAO_TOKENS)
+    if codificacao is None:
+        if len(texto) <= limite * CARACTERES_POR_TOKEN:
+            return texto
+        return texto[:max(0, (limite - 1) * CARACTERES_POR_TOKEN)].rstrip() + "..."
+    tokens = codificacao.encode(texto, disallowed_special=())
+    if len(tokens) <= limite:
+        return texto
+    return codificacao.decode(tokens[:max(0, limite - 1)]).rstrip() + "..."
+
+
+class EmpacotadorContexto:
+    """
+    Seleciona o que vai para o prompt do RAG dentro de orçamentos de tokens.
+
+    Os trechos recuperados são ordenados pela pontuação do retriever
+    (metadado "pontuacao"; sem ela, vale a ordem recebida) e entram
+    inteiros enquanto couberem. O primeiro que não couber é cortado para
+    ocupar o restante do orçamento, se sobrarem ao menos TOKENS_MINIMOS_ITEM
+    tokens; os demais são descartados. Os menos relevantes saem primeiro.
+
+    No histórico, as mensagens mais recentes têm prioridade: são incluídas
+    de trás para a frente até esgotar o orçamento, e nenhuma ocupa mais que
+    PROPORCAO_MAXIMA_MENSAGEM dele, para que uma resposta longa não
+    empurre as perguntas anteriores para fora.
+    """
+
+    def __init__(self, orcamento_contexto: int = ORCAMENTO_TOKENS_CONTEXTO,
+                 orcamento_historico: int = ORCAMENTO_TOKENS_HISTORICO):
+        self.orcamento_contexto = orcamento_contexto
+        self.orcamento_historico = orcamento_historico
+
+    def selecionar_documentos(self, documentos: list[Document]) -> list[Document]:
+        """
+        Escolhe os trechos que cabem no orçamento de contexto.
+
+        Args:
+            documentos (list[Document]): Trechos candidatos, como vieram do retriever.
+
+        Returns:
+            list[Document]: Os trechos escolhidos, do mais para o menos relevante;
+                um trecho cortado é uma cópia com o texto reduzido.
+        """
+        ordenados = sorted(documentos, key=lambda documento: -(documento.metadata.get("pontuacao") or 0.0))
+        escolhidos = []
+        restante = self.orcamento_contexto
+        for documento in ordenados:
+            disponivel = restante - TOKENS_CABECALHO_TRECHO
+            tokens = contar_tokens(documento.page_content)
+            if tokens <= disponivel:
+                escolhidos.append(documento)
+                restante = disponivel - tokens
+                continue
+            if disponivel >= TOKENS_MINIMOS_ITEM:
+                escolhidos.append(Document(page_content=truncar_tokens(documento.page_content, disponivel),
+                                           metadata=dict(documento.metadata)))
+            break
+        return escolhidos
+
+    def selecionar_historico(self, mensagens: list[str]) -> list[str]:
+        """
+        Escolhe as mensagens da conversa que cabem no orçamento do histórico.
+
+        Args:
+            mensagens (list[str]): Mensagens já formatadas, em ordem cronológica.
+
+        Returns:
+            list[str]: As mensagens mais recentes que couberem, em ordem cronológica.
+        """
+        limite_mensagem = max(TOKENS_MINIMOS_ITEM, int(self.orcamento_historico * PROPORCAO_MAXIMA_MENSAGEM))
+        escolhidas = []
+        restante = self.orcamento_historico
+        for mensagem in reversed(mensagens):
+            if restante < TOKENS_MINIMOS_ITEM:
+                break
+            mensagem = truncar_tokens(mensagem, min(limite_mensagem, restante))
+            tokens = contar_tokens(mensagem)
+            escolhidas.append(mensagem)
+            restante -= tokens
+        escolhidas.reverse()
+        return escolhidas
+
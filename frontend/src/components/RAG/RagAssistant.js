@@ -31,6 +31,16 @@ import ReactMarkdown from 'react-markdown';
 import { apiService } from '../../services/apiService';
 
 const { Title, Text } = Typography;
+
+// Fonte retornada pela API: { fonte, pagina, artigo, secao, pontuacao, trecho }
+const formatarFonte = (source) => {
+  if (typeof source === 'string') return source;
+  return [
+    source.fonte,
+    source.pagina && `p. ${source.pagina}`,
+    source.artigo && `art. ${source.artigo}`
+  ].filter(Boolean).join(', ');
+};
 const { TextArea } = Input;
 
 // Styled Components
@@ -125,6 +135,8 @@ const RagAssistant = ({ apiStatus }) => {
   const [messages, setMessages] = useState([]);
   const [inputValue, setInputValue] = useState('');
   const [loading, setLoading] = useState(false);
+  // A conversa fica guardada na API; basta enviar a pergunta e o id da sessão
+  const [idSessao, setIdSessao] = useState(() => localStorage.getItem('rag_id_sessao'));
   const messagesEndRef = useRef(null);
 
   // Perguntas sugeridas
@@ -167,6 +179,14 @@ const RagAssistant = ({ apiStatus }) => {
     }
   }, [messages]);
 
+  useEffect(() => {
+    if (idSessao) {
+      localStorage.setItem('rag_id_sessao', idSessao);
+    } else {
+      localStorage.removeItem('rag_id_sessao');
+    }
+  }, [idSessao]);
+
   const handleSendMessage = async (question = null) => {
     const messageText = question || inputValue.trim();
     
@@ -193,13 +213,7 @@ const RagAssistant = ({ apiStatus }) => {
     setLoading(true);
 
     try {
-      // Preparar histórico para contexto
-      const chatHistory = messages.map(msg => ({
-        role: msg.type === 'user' ? 'human' : 'assistant',
-        content: msg.content
-      }));
-
-      const response = await apiService.consultarRag(messageText, chatHistory);
+      const response = await apiService.consultarRag(messageText, idSessao);
 
       if (response.status === 'success') {
         const assistantMessage = {
@@ -211,6 +225,7 @@ const RagAssistant = ({ apiStatus }) => {
         };
 
         setMessages(prev => [...prev, assistantMessage]);
+        setIdSessao(response.id_sessao);
       }
     } catch (error) {
       message.error(`Erro na consulta: ${error.message}`);
@@ -231,7 +246,12 @@ const RagAssistant = ({ apiStatus }) => {
   };
 
   const handleClearChat = () => {
+    if (idSessao) {
+      // A conversa pode já ter expirado na API; a limpeza local segue de qualquer forma
+      apiService.removerConversa(idSessao).catch(() => {});
+    }
     setMessages([]);
+    setIdSessao(null);
     localStorage.removeItem('rag_chat_history');
     message.success('Conversa limpa!');
   };
@@ -283,8 +303,8 @@ const RagAssistant = ({ apiStatus }) => {
               <BookOutlined /> Fontes consultadas:
             </Text>
             {msg.sources.map((source, index) => (
-              <Tag key={index} size="small" style={{ margin: '2px' }}>
-                {source}
+              <Tag key={index} size="small" style={{ margin: '2px' }} title={source.trecho}>
+                {formatarFonte(source)}
               </Tag>
             ))}
           </div>
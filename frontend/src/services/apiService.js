@@ -139,13 +139,24 @@ export const apiService = {
     });
   },
 
-  async consultarRag(pergunta, historico = []) {
+  /**
+   * Faz uma pergunta na conversa guardada na API; sem idSessao, inicia uma nova
+   */
+  async consultarRag(pergunta, idSessao = null) {
     return await apiClient.post('/api/perguntar-rag', {
       pergunta,
-      historico
+      id_sessao: idSessao,
+      nova_sessao: !idSessao
     });
   },
 
+  /**
+   * Apaga a conversa guardada de uma sessão
+   */
+  async removerConversa(idSessao) {
+    return await apiClient.delete(`/api/conversas/${idSessao}`);
+  },
+
   // ===== UTILITÁRIOS =====
 
   /**
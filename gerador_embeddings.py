@@ -0,0 +1,353 @@
+# gerador_embeddings.py
+import os
+import re
+import time
+import array
+import random
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from contextlib import closing
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from langchain_core.embeddings import Embeddings
+
+# Limites padrão do agendador (ajustáveis conforme a cota contratada no provedor)
+REQUISICOES_POR_MINUTO = int(os.getenv("ETP_EMBEDDINGS_RPM", "3000"))
+TOKENS_POR_MINUTO = int(os.getenv("ETP_EMBEDDINGS_TPM", "1000000"))
+MAX_CONCORRENCIA = int(os.getenv("ETP_EMBEDDINGS_CONCORRENCIA", "4"))
+TOKENS_POR_LOTE = 20000
+TEXTOS_POR_LOTE = 512
+MAX_TENTATIVAS = 6
+
+# Backend local (sentence-transformers, CPU)
+THREADS_EMBEDDINGS_LOCAIS = int(os.getenv("ETP_EMBEDDINGS_THREADS", "0")) or os.cpu_count() or 1
+TAMANHO_LOTE_LOCAL = 64
+
+# Cache persistente de embeddings por chunk
+CAMINHO_CACHE_EMBEDDINGS = os.getenv("ETP_CACHE_EMBEDDINGS", "data/cache/embeddings.sqlite3")
+# Embeddings de consultas recentes mantidos em memória
+CONSULTAS_EM_MEMORIA = 256
+
+# Códigos HTTP e tipos de erro que indicam limitação ou falha transitória do provedor
+_STATUS_RETENTAVEIS = {408, 409, 429, 500, 502, 503, 504}
+_ERROS_RETENTAVEIS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa conservadora de tokens para textos em português (~3 caracteres por token)."""
+    return len(texto) // 3 + 1
+
+
+def _erro_retentavel(erro: Exception) -> bool:
+    """Indica se o erro é de limitação de taxa ou transitório, e portanto vale tentar de novo."""
+    status = getattr(erro, "status_code", None) or getattr(getattr(erro, "response", None), "status_code", None)
+    return status in _STATUS_RETENTAVEIS or type(erro).__name__ in _ERROS_RETENTAVEIS
+
+
+class LimitadorTaxa:
+    """
+    Limitador de requisições e tokens por minuto, em janela deslizante de 60 segundos.
+
+    Seguro para uso concorrente: cada thread chama aguardar() antes de enviar
+    uma requisição e é bloqueada até que ambos os orçamentos comportem o envio.
+    """
+
+    def __init__(self, requisicoes_por_minuto: int, tokens_por_minuto: int):
+        self.requisicoes_por_minuto = requisicoes_por_minuto
+        self.tokens_por_minuto = tokens_por_minuto
+        self._janela = deque()  # (instante, tokens)
+        self._tokens_na_janela = 0
+        self._lock = threading.Lock()
+
+    def aguardar(self, tokens: int) -> None:
+        """Bloqueia até que a requisição de `tokens` tokens caiba na janela atual."""
+        # Um único lote maior que o orçamento por minuto nunca caberia; limita para não travar
+        tokens = min(tokens, self.tokens_por_minuto)
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                while self._janela and agora - self._janela[0][0] >= 60:
+                    _, tokens_antigos = self._janela.popleft()
+                    self._tokens_na_janela -= tokens_antigos
+
+                if (len(self._janela) < self.requisicoes_por_minuto
+                        and self._tokens_na_janela + tokens <= self.tokens_por_minuto):
+                    self._janela.append((agora, tokens))
+                    self._tokens_na_janela += tokens
+                    return
+
+                espera = 60 - (agora - self._janela[0][0])
+            time.sleep(max(espera, 0.05))
+
+
+class AgendadorEmbeddings(Embeddings):
+    """
+    Embeddings em lotes concorrentes, respeitando limites de taxa do provedor.
+
+    Envolve qualquer implementação de Embeddings da LangChain. Os textos são
+    agrupados em lotes limitados por tokens e por quantidade, os lotes são
+    enviados em paralelo sob um orçamento de requisições/tokens por minuto, e
+    lotes limitados pelo provedor (HTTP 429 e erros transitórios) são
+    reenviados com backoff exponencial, sem refazer os lotes já concluídos.
+    """
+
+    def __init__(self, embeddings: Embeddings,
+                 max_concorrencia: int = MAX_CONCORRENCIA,
+                 requisicoes_por_minuto: int = REQUISICOES_POR_MINUTO,
+                 tokens_por_minuto: int = TOKENS_POR_MINUTO,
+                 tokens_por_lote: int = TOKENS_POR_LOTE,
+                 textos_por_lote: int = TEXTOS_POR_LOTE,
+                 max_tentativas: int = MAX_TENTATIVAS,
+                 ao_concluir_lote: Optional[Callable[[list[str], list[list[float]]], None]] = None):
+        """
+        Inicializa o agendador.
+
+        Args:
+            embeddings (Embeddings): O provedor de embeddings subjacente.
+            max_concorrencia (int): Número máximo de lotes em voo ao mesmo tempo.
+            requisicoes_por_minuto (int): Orçamento de requisições por minuto.
+            tokens_por_minuto (int): Orçamento de tokens por minuto.
+            tokens_por_lote (int): Máximo de tokens (estimados) por lote.
+            textos_por_lote (int): Máximo de textos por lote.
+            max_tentativas (int): Tentativas por lote antes de desistir.
+            ao_concluir_lote (Callable): Chamado com (textos, vetores) a cada lote concluído.
+        """
+        self.embeddings = embeddings
+        self.max_concorrencia = max(1, max_concorrencia)
+        self.tokens_por_lote = tokens_por_lote
+        self.textos_por_lote = textos_por_lote
+        self.max_tentativas = max_tentativas
+        self.ao_concluir_lote = ao_concluir_lote
+        self.limitador = LimitadorTaxa(requisicoes_por_minuto, tokens_por_minuto)
+
+    def _montar_lotes(self, textos: list[str]) -> list[tuple[int, int, int]]:
+        """Agrupa textos consecutivos em lotes (inicio, fim, tokens) limitados por tokens e por quantidade."""
+        lotes = []
+        inicio, tokens_lote = 0, 0
+        for posicao, texto in enumerate(textos):
+            tokens = estimar_tokens(texto)
+            if posicao > inicio and (tokens_lote + tokens > self.tokens_por_lote
+                                     or posicao - inicio >= self.textos_por_lote):
+                lotes.append((inicio, posicao, tokens_lote))
+                inicio, tokens_lote = posicao, 0
+            tokens_lote += tokens
+        if inicio < len(textos):
+            lotes.append((inicio, len(textos), tokens_lote))
+        return lotes
+
+    def _com_retentativas(self, funcao: Callable, tokens: int):
+        """Executa uma chamada ao provedor respeitando o limitador e reenviando em caso de limitação."""
+        for tentativa in range(self.max_tentativas):
+            self.limitador.aguardar(tokens)
+            try:
+                return funcao()
+            except Exception as e:
+                if not _erro_retentavel(e) or tentativa == self.max_tentativas - 1:
+                    raise
+                # Backoff exponencial com jitter: 1s, 2s, 4s, ... (máx. 60s)
+                time.sleep(min(60, 2 ** tentativa) * (0.5 + random.random()))
+
+    def _embed_lote(self, textos: list[str], tokens: int) -> list[list[float]]:
+        vetores = self._com_retentativas(lambda: self.embeddings.embed_documents(textos), tokens)
+        if self.ao_concluir_lote:
+            self.ao_concluir_lote(textos, vetores)
+        return vetores
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Gera embeddings para os textos, em lotes concorrentes, preservando a ordem."""
+        lotes = self._montar_lotes(texts)
+        if len(lotes) <= 1 or self.max_concorrencia == 1:
+            resultados = [self._embed_lote(texts[inicio:fim], tokens) for inicio, fim, tokens in lotes]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concorrencia, len(lotes))) as executor:
+                futuros = [executor.submit(self._embed_lote, texts[inicio:fim], tokens)
+                           for inicio, fim, tokens in lotes]
+                resultados = [futuro.result() for futuro in futuros]
+
+        vetores = []
+        for resultado in resultados:
+            vetores.extend(resultado)
+        return vetores
+
+    def embed_query(self, text: str) -> list[float]:
+        """Gera o embedding de uma consulta, respeitando os mesmos limites de taxa."""
+        return self._com_retentativas(lambda: self.embeddings.embed_query(text), estimar_tokens(text))
+
+
+class EmbeddingsLocais(Embeddings):
+    """
+    Embeddings calculados localmente com sentence-transformers, sem rede nem chave de API.
+
+    Roda em CPU, codifica em lotes diretamente para arrays NumPy e devolve
+    vetores normalizados (norma 1), de modo que distância L2 e similaridade de
+    cosseno produzem a mesma ordenação. O modelo é carregado uma única vez,
+    na primeira chamada.
+    """
+
+    def __init__(self, modelo: str, tamanho_lote: int = TAMANHO_LOTE_LOCAL,
+                 threads: int = THREADS_EMBEDDINGS_LOCAIS):
+        """
+        Args:
+            modelo (str): Nome ou caminho local do modelo sentence-transformers.
+            tamanho_lote (int): Quantidade de textos codificados por lote.
+            threads (int): Threads usadas pelo PyTorch na inferência.
+        """
+        self.modelo = modelo
+        self.tamanho_lote = tamanho_lote
+        self.threads = threads
+        self._modelo_carregado = None
+        self._lock = threading.Lock()
+
+    def _obter_modelo(self):
+        with self._lock:
+            if self._modelo_carregado is None:
+                import torch
+                from sentence_transformers import SentenceTransformer
+
+                torch.set_num_threads(self.threads)
+                self._modelo_carregado = SentenceTransformer(self.modelo, device="cpu")
+            return self._modelo_carregado
+
+    def _codificar(self, textos: list[str]):
+        return self._obter_modelo().encode(
+            textos,
+            batch_size=self.tamanho_lote,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._codificar(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._codificar([text])[0].tolist()
+
+
+def normalizar_texto(texto: str) -> str:
+    """Normaliza o texto para fins de cache: Unicode NFC e espaços em branco colapsados."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", texto)).strip()
+
+
+def hash_texto(texto: str) -> str:
+    """Retorna o hash SHA-256 do texto normalizado."""
+    return hashlib.sha256(normalizar_texto(texto).encode("utf-8")).hexdigest()
+
+
+class CacheEmbeddings:
+    """
+    Armazenamento local de vetores em SQLite, indexado por (modelo, hash do texto).
+
+    Os vetores são gravados como float32 contíguos (BLOB). Cada operação abre
+    a sua própria conexão, de modo que o cache pode ser usado a partir das
+    threads do AgendadorEmbeddings e por vários processos ao mesmo tempo.
+    """
+
+    # Limite de parâmetros por consulta no SQLite
+    _TAMANHO_CONSULTA = 500
+
+    def __init__(self, caminho: str = CAMINHO_CACHE_EMBEDDINGS):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "modelo TEXT NOT NULL, hash TEXT NOT NULL, vetor BLOB NOT NULL, "
+                "PRIMARY KEY (modelo, hash)) WITHOUT ROWID"
+            )
+
+    def _conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    def buscar(self, modelo: str, hashes: list[str]) -> dict[str, list[float]]:
+        """Retorna os vetores já conhecidos para os hashes informados (hash -> vetor)."""
+        encontrados = {}
+        unicos = list(dict.fromkeys(hashes))
+        with closing(self._conectar()) as conexao:
+            for inicio in range(0, len(unicos), self._TAMANHO_CONSULTA):
+                parte = unicos[inicio:inicio + self._TAMANHO_CONSULTA]
+                marcadores = ",".join("?" * len(parte))
+                linhas = conexao.execute(
+                    f"SELECT hash, vetor FROM embeddings WHERE modelo = ? AND hash IN ({marcadores})",
+                    [modelo, *parte]
+                )
+                for hash_, vetor in linhas:
+                    encontrados[hash_] = array.array("f", vetor).tolist()
+        return encontrados
+
+    def salvar(self, modelo: str, textos: list[str], vetores: list[list[float]]) -> None:
+        """Grava os vetores dos textos informados."""
+        linhas = [(modelo, hash_texto(texto), array.array("f", vetor).tobytes())
+                  for texto, vetor in zip(textos, vetores)]
+        with self._lock, closing(self._conectar()) as conexao, conexao:
+            conexao.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", linhas)
+
+
+class EmbeddingsComCache(Embeddings):
+    """
+    Embeddings que só consultam o provedor para textos nunca vistos.
+
+    Antes de chamar o provedor, procura cada texto (normalizado) no
+    CacheEmbeddings; apenas os ausentes são enviados, uma única vez cada,
+    mesmo que se repitam. Quando o provedor é um AgendadorEmbeddings, cada
+    lote é gravado no cache assim que termina, então uma construção
+    interrompida não paga de novo pelos lotes concluídos.
+    """
+
+    def __init__(self, embeddings: Embeddings, modelo: str, cache: Optional[CacheEmbeddings] = None):
+        """
+        Args:
+            embeddings (Embeddings): O provedor de embeddings subjacente.
+            modelo (str): Nome do modelo, parte da chave do cache.
+            cache (CacheEmbeddings): O armazenamento a usar (padrão: CAMINHO_CACHE_EMBEDDINGS).
+        """
+        self.embeddings = embeddings
+        self.modelo = modelo
+        self.cache = cache or CacheEmbeddings()
+        self._consultas: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock_consultas = threading.Lock()
+        self._grava_por_lote = isinstance(embeddings, AgendadorEmbeddings) and embeddings.ao_concluir_lote is None
+        if self._grava_por_lote:
+            embeddings.ao_concluir_lote = lambda textos, vetores: self.cache.salvar(self.modelo, textos, vetores)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Gera embeddings reaproveitando os vetores em cache."""
+        hashes = [hash_texto(texto) for texto in texts]
+        vetores_por_hash = self.cache.buscar(self.modelo, hashes)
+
+        # Um texto por hash ausente, na ordem da primeira ocorrência
+        pendentes = {}
+        for texto, hash_ in zip(texts, hashes):
+            if hash_ not in vetores_por_hash and hash_ not in pendentes:
+                pendentes[hash_] = texto
+
+        if pendentes:
+            novos_vetores = self.embeddings.embed_documents(list(pendentes.values()))
+            if not self._grava_por_lote:
+                self.cache.salvar(self.modelo, list(pendentes.values()), novos_vetores)
+            vetores_por_hash.update(zip(pendentes.keys(), novos_vetores))
+
+        return [vetores_por_hash[hash_] for hash_ in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        """Gera o embedding da consulta, reaproveitando o das consultas recentes idênticas."""
+        chave = normalizar_texto(text)
+        with self._lock_consultas:
+            vetor = self._consultas.get(chave)
+            if vetor is not None:
+                self._consultas.move_to_end(chave)
+                return vetor
+
+        vetor = self.embeddings.embed_query(text)
+        with self._lock_consultas:
+            self._consultas[chave] = vetor
+            while len(self._consultas) > CONSULTAS_EM_MEMORIA:
+                self._consultas.popitem(last=False)
+        return vetor
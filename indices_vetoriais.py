@@ -0,0 +1,422 @@
+# indices_vetoriais.py
+import os
+import math
+import threading
+from contextlib import contextmanager
+from typing import Optional
+import numpy as np
+import faiss
+
+# Tipo de índice ANN: "flat" (busca exata), "ivf" (listas invertidas) ou "hnsw" (grafo).
+# Só o IVF é compartilhado entre processos pelo mapeamento em memória (ver
+# ler_indice_faiss); flat e HNSW ocupam uma cópia inteira em cada processo
+TIPO_INDICE = os.getenv("ETP_TIPO_INDICE", "flat").lower()
+TIPOS_INDICE = ("flat", "ivf", "hnsw")
+if TIPO_INDICE not in TIPOS_INDICE:
+    raise ValueError(f"Tipo de índice não suportado: {TIPO_INDICE}.")
+
+# Compressão dos vetores no índice: "nenhuma" (float32), "int8" (quantização escalar)
+# ou "pq" (product quantization)
+QUANTIZACAO = os.getenv("ETP_QUANTIZACAO", "nenhuma").lower()
+QUANTIZACOES = ("nenhuma", "int8", "pq")
+if QUANTIZACAO not in QUANTIZACOES:
+    raise ValueError(f"Quantização não suportada: {QUANTIZACAO}.")
+
+# Parâmetros de construção (fazem parte da chave do índice persistido)
+PQ_M = int(os.getenv("ETP_PQ_M", "0"))  # subquantizadores do PQ; 0 = automático (~d/16)
+IVF_NLIST = int(os.getenv("ETP_IVF_NLIST", "0"))  # 0 = automático (~4·√n)
+HNSW_M = int(os.getenv("ETP_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("ETP_HNSW_EF_CONSTRUCTION", "200"))
+
+# Parâmetros de busca (aplicados a cada carregamento, não afetam a chave)
+IVF_NPROBE = int(os.getenv("ETP_IVF_NPROBE", "16"))
+HNSW_EF_SEARCH = int(os.getenv("ETP_HNSW_EF_SEARCH", "64"))
+# Com quantização, a busca traz FATOR_RERANQUEAMENTO·k candidatos e os reordena pela distância exata
+FATOR_RERANQUEAMENTO = int(os.getenv("ETP_FATOR_RERANQUEAMENTO", "4"))
+
+# O k-means do IVF e do PQ precisa de ~39 pontos por centróide para centróides estáveis
+_PONTOS_POR_LISTA = 39
+
+# O HNSW com PQ usa sempre 256 centróides por subquantizador
+_CENTROIDES_HNSW_PQ = 256
+
+# Vetores acumulados para treinar o IVF (ou o PQ) antes de criar o índice em fluxo
+IVF_VETORES_TREINO = int(os.getenv("ETP_IVF_VETORES_TREINO", "20000"))
+
+
+def parametros_indice() -> dict:
+    """Retorna os parâmetros de construção do tipo de índice configurado."""
+    if TIPO_INDICE == "ivf":
+        parametros = {"tipo": "ivf", "nlist": IVF_NLIST}
+    elif TIPO_INDICE == "hnsw":
+        parametros = {"tipo": "hnsw", "m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    else:
+        parametros = {"tipo": "flat"}
+
+    if QUANTIZACAO != "nenhuma":
+        parametros["quantizacao"] = QUANTIZACAO
+    if QUANTIZACAO == "pq":
+        parametros["pq_m"] = PQ_M
+    return parametros
+
+
+def indice_quantizado() -> bool:
+    """Indica se o índice configurado armazena vetores comprimidos (e precisa de reranqueamento)."""
+    return QUANTIZACAO != "nenhuma"
+
+
+def vetores_para_criar_indice() -> int:
+    """
+    Quantidade mínima de vetores para criar um índice do tipo configurado.
+
+    Flat e HNSW (inclusive com int8) podem ser criados a partir do primeiro
+    vetor; o IVF e o PQ precisam de uma amostra de treino para os centróides.
+    Vetores adicionados depois da criação reutilizam os centróides já
+    treinados.
+    """
+    return IVF_VETORES_TREINO if TIPO_INDICE == "ivf" or QUANTIZACAO == "pq" else 1
+
+
+def _calcular_nlist(total_vetores: int) -> int:
+    """Número de listas do IVF: o configurado ou ~4·√n, limitado pelos pontos de treino disponíveis."""
+    nlist = IVF_NLIST or int(4 * math.sqrt(total_vetores))
+    return max(1, min(nlist, total_vetores // _PONTOS_POR_LISTA))
+
+
+def _calcular_pq_m(dimensao: int) -> int:
+    """Número de subquantizadores do PQ: o configurado ou o maior divisor da dimensão até d/16."""
+    alvo = PQ_M or max(1, dimensao // 16)
+    return max(m for m in range(1, min(alvo, dimensao) + 1) if dimensao % m == 0)
+
+
+def _calcular_nbits(total_vetores: int) -> int:
+    """Bits por código do PQ (até 8), limitados pelos pontos de treino disponíveis."""
+    return max(1, min(8, int(math.log2(max(2, total_vetores // _PONTOS_POR_LISTA)))))
+
+
+def criar_indice_faiss(vetores: np.ndarray):
+    """
+    Cria (e treina, quando necessário) um índice FAISS vazio do tipo configurado.
+
+    Os vetores servem apenas para definir a dimensão e para treinar o IVF;
+    devem ser adicionados ao índice depois, por quem o chamou.
+
+    Args:
+        vetores (np.ndarray): Matriz float32 (n, d) com os vetores do corpus.
+
+    Returns:
+        faiss.Index: O índice pronto para receber os vetores.
+    """
+    dimensao = vetores.shape[1]
+    int8 = faiss.ScalarQuantizer.QT_8bit
+
+    if TIPO_INDICE == "ivf":
+        quantizador = faiss.IndexFlatL2(dimensao)
+        nlist = _calcular_nlist(len(vetores))
+        if QUANTIZACAO == "int8":
+            indice = faiss.IndexIVFScalarQuantizer(quantizador, dimensao, nlist, int8)
+        elif QUANTIZACAO == "pq":
+            indice = faiss.IndexIVFPQ(quantizador, dimensao, nlist, _calcular_pq_m(dimensao),
+                                      _calcular_nbits(len(vetores)))
+        else:
+            indice = faiss.IndexIVFFlat(quantizador, dimensao, nlist)
+    elif TIPO_INDICE == "hnsw":
+        # O HNSW com PQ exige 256 centróides; com menos vetores de treino, usa int8
+        if QUANTIZACAO == "pq" and len(vetores) >= _CENTROIDES_HNSW_PQ * _PONTOS_POR_LISTA:
+            indice = faiss.IndexHNSWPQ(dimensao, _calcular_pq_m(dimensao), HNSW_M)
+        elif QUANTIZACAO != "nenhuma":
+            indice = faiss.IndexHNSWSQ(dimensao, int8, HNSW_M)
+        else:
+            indice = faiss.IndexHNSWFlat(dimensao, HNSW_M)
+        indice.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        if QUANTIZACAO == "int8":
+            indice = faiss.IndexScalarQuantizer(dimensao, int8)
+        elif QUANTIZACAO == "pq":
+            indice = faiss.IndexPQ(dimensao, _calcular_pq_m(dimensao), _calcular_nbits(len(vetores)))
+        else:
+            indice = faiss.IndexFlatL2(dimensao)
+
+    if not indice.is_trained:
+        indice.train(vetores)
+    aplicar_parametros_busca(indice)
+    return indice
+
+
+def aplicar_parametros_busca(indice) -> None:
+    """Aplica nprobe (IVF) ou efSearch (HNSW) ao índice."""
+    ivf = faiss.try_extract_index_ivf(indice)
+    if ivf is not None:
+        ivf.nprobe = min(IVF_NPROBE, ivf.nlist)
+    elif isinstance(indice, faiss.IndexHNSW):
+        indice.hnsw.efSearch = HNSW_EF_SEARCH
+
+
+def ler_indice_faiss(caminho: str, mmap: bool = True):
+    """
+    Lê um índice FAISS do disco.
+
+    Com mmap=True, as listas invertidas de índices IVF são mapeadas em memória
+    em vez de copiadas, de modo que vários processos de trabalho compartilham
+    a mesma cópia física através do cache de páginas do sistema operacional.
+    Índices flat e HNSW são sempre lidos para a memória do processo. Um índice
+    mapeado é somente leitura: use mmap=False para obter uma cópia alterável.
+
+    Args:
+        caminho (str): Caminho do arquivo .faiss.
+        mmap (bool): Se deve mapear o índice em memória.
+
+    Returns:
+        faiss.Index: O índice com os parâmetros de busca aplicados.
+    """
+    indice = faiss.read_index(caminho, faiss.IO_FLAG_MMAP if mmap else 0)
+    aplicar_parametros_busca(indice)
+    return indice
+
+
+def gravar_indice_faiss(indice, caminho: str) -> None:
+    """Grava um índice FAISS no disco, no formato lido por ler_indice_faiss()."""
+    faiss.write_index(indice, caminho)
+
+
+def remover_posicoes(indice, posicoes: list[int], vetores_exatos: Optional[np.ndarray] = None):
+    """
+    Remove vetores do índice pelas suas posições, preservando a ordem dos demais.
+
+    Depois da remoção, os vetores restantes ocupam as posições 0..n-1, na
+    mesma ordem. Índices HNSW não suportam remoção; nesse caso o índice é
+    reconstruído a partir dos vetores restantes (os exatos, se informados,
+    ou os recuperados do próprio índice), sem novos embeddings.
+
+    Args:
+        indice (faiss.Index): O índice (não mapeado em memória).
+        posicoes (list[int]): Posições dos vetores a remover.
+        vetores_exatos (np.ndarray): Vetores originais alinhados ao índice, se houver.
+
+    Returns:
+        faiss.Index: O índice resultante (o mesmo objeto, quando a remoção é direta).
+    """
+    manter = np.ones(indice.ntotal, dtype=bool)
+    manter[posicoes] = False
+
+    if not isinstance(indice, faiss.IndexHNSW):
+        indice.remove_ids(np.array(posicoes, dtype=np.int64))
+        ivf = faiss.try_extract_index_ivf(indice)
+        if ivf is not None:
+            # O IVF mantém os rótulos originais; renumera para as novas posições
+            _renumerar_ivf(ivf, np.cumsum(manter) - 1)
+        return indice
+
+    if vetores_exatos is not None:
+        vetores = np.asarray(vetores_exatos[manter], dtype=np.float32)
+    else:
+        vetores = indice.reconstruct_n(0, indice.ntotal)[manter]
+
+    # O clone preserva o tipo, os parâmetros e o treino dos quantizadores
+    novo_indice = faiss.clone_index(indice)
+    novo_indice.reset()
+    aplicar_parametros_busca(novo_indice)
+    if len(vetores):
+        novo_indice.add(vetores)
+    return novo_indice
+
+
+def reconstruir_vetores(indice, posicoes: list[int], vetores_exatos: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Recupera os vetores das posições informadas, sem novos embeddings.
+
+    Usa os vetores exatos quando houver (índices quantizados); caso
+    contrário, reconstrói a partir do próprio índice.
+    """
+    if vetores_exatos is not None:
+        return np.asarray(vetores_exatos[posicoes], dtype=np.float32)
+    ivf = faiss.try_extract_index_ivf(indice)
+    if ivf is None:
+        return np.array([indice.reconstruct(int(p)) for p in posicoes], dtype=np.float32)
+    # O IVF só reconstrói por rótulo com o mapa direto, desfeito em seguida para permitir remoções
+    ivf.make_direct_map(True)
+    try:
+        return np.array([indice.reconstruct(int(p)) for p in posicoes], dtype=np.float32)
+    finally:
+        ivf.make_direct_map(False)
+
+
+def _renumerar_ivf(ivf, novas_posicoes: np.ndarray) -> None:
+    """Substitui os rótulos das listas invertidas de um IVF pelas novas posições."""
+    listas = ivf.invlists
+    for lista in range(ivf.nlist):
+        tamanho = listas.list_size(lista)
+        if not tamanho:
+            continue
+        rotulos = faiss.rev_swig_ptr(listas.get_ids(lista), tamanho)
+        codigos = faiss.rev_swig_ptr(listas.get_codes(lista), tamanho * listas.code_size).copy()
+        novos_rotulos = np.ascontiguousarray(novas_posicoes[rotulos], dtype=np.int64)
+        listas.update_entries(lista, 0, tamanho, faiss.swig_ptr(novos_rotulos), faiss.swig_ptr(codigos))
+
+
+def buscar_posicoes(indice, vetor_consulta: np.ndarray, k: int,
+                    vetores_exatos: Optional[np.ndarray] = None) -> list[int]:
+    """
+    Retorna as posições dos k vetores mais próximos da consulta.
+
+    Com vetores exatos (índices quantizados), busca FATOR_RERANQUEAMENTO·k
+    candidatos no índice comprimido e os reordena pela distância L2 exata,
+    lendo do disco apenas as linhas dos candidatos.
+
+    Args:
+        indice (faiss.Index): O índice.
+        vetor_consulta (np.ndarray): Matriz float32 (1, d) com a consulta.
+        k (int): Quantidade de resultados.
+        vetores_exatos (np.ndarray): Vetores originais alinhados ao índice, se houver.
+
+    Returns:
+        list[int]: Posições em ordem crescente de distância.
+    """
+    if vetores_exatos is None:
+        _, posicoes = indice.search(vetor_consulta, k)
+        return [int(p) for p in posicoes[0] if p != -1]
+
+    _, candidatos = indice.search(vetor_consulta, k * FATOR_RERANQUEAMENTO)
+    candidatos = candidatos[0][candidatos[0] != -1]
+    distancias = np.sum((vetores_exatos[candidatos] - vetor_consulta[0]) ** 2, axis=1)
+    return [int(candidatos[i]) for i in np.argsort(distancias)[:k]]
+
+
+def tamanho_serializado(indice) -> int:
+    """Tamanho em bytes do índice serializado (aproximadamente a memória que ocupa)."""
+    return int(faiss.serialize_index(indice).nbytes)
+
+
+def tamanho_mapeavel(indice) -> int:
+    """
+    Bytes do índice que ler_indice_faiss(mmap=True) mapeia em vez de copiar.
+
+    São as listas invertidas do IVF (códigos e ids dos vetores); nos demais
+    tipos, nada é mapeado e o índice inteiro é lido para cada processo.
+    """
+    ivf = faiss.try_extract_index_ivf(indice)
+    if ivf is None:
+        return 0
+    return int(ivf.invlists.compute_ntotal() * (ivf.invlists.code_size + np.dtype(np.int64).itemsize))
+
+
+class VetoresExatos:
+    """
+    Vetores float32 originais, alinhados às posições do índice quantizado.
+
+    Servem apenas ao reranqueamento e à reconstrução de índices HNSW.
+    Persistidos em .npy e mapeados em memória ao carregar, ficam no cache de
+    páginas do sistema (compartilhado entre processos) e só as linhas dos
+    candidatos de cada busca são lidas.
+    """
+
+    def __init__(self, matriz: Optional[np.ndarray] = None):
+        self._partes = [] if matriz is None else [matriz]
+
+    def __len__(self) -> int:
+        return sum(len(parte) for parte in self._partes)
+
+    @property
+    def matriz(self) -> np.ndarray:
+        """Os vetores como uma única matriz (n, d)."""
+        if not self._partes:
+            return np.empty((0, 0), dtype=np.float32)
+        if len(self._partes) > 1:
+            self._partes = [np.concatenate(self._partes)]
+        return self._partes[0]
+
+    def adicionar(self, vetores) -> None:
+        """Acrescenta vetores ao final (sem copiar os já existentes até a próxima leitura)."""
+        self._partes.append(np.asarray(vetores, dtype=np.float32))
+
+    def remover(self, posicoes: list[int]) -> None:
+        """Remove as linhas das posições informadas, preservando a ordem das demais."""
+        self._partes = [np.delete(self.matriz, posicoes, axis=0)]
+
+    def salvar(self, caminho: str) -> None:
+        np.save(caminho, self.matriz)
+
+    @classmethod
+    def carregar(cls, caminho: str, mmap: bool = True) -> "VetoresExatos":
+        return cls(np.load(caminho, mmap_mode="r" if mmap else None))
+
+
+class TravaLeituraEscrita:
+    """
+    Trava de um índice vetorial: várias buscas simultâneas ou uma única alteração.
+
+    Alterações (adicionar lotes, remover e renumerar posições, trocar o
+    índice mapeado por uma cópia gravável) mudam juntos o índice FAISS, o
+    index_to_docstore_id, o docstore e o índice lexical; uma busca que lesse
+    no meio delas poderia consultar uma posição já renumerada. Escritores à
+    espera têm prioridade sobre novos leitores. Leitura e escrita são
+    reentrantes: uma thread que já lê não espera pelos escritores na fila
+    (que, por sua vez, esperam por ela), e a thread que escreve também pode ler.
+    """
+
+    def __init__(self):
+        self._condicao = threading.Condition()
+        self._local = threading.local()
+        self._leitores = 0
+        self._escritor = None
+        self._profundidade_escrita = 0
+        self._escritores_esperando = 0
+
+    @contextmanager
+    def leitura(self):
+        """Mantém o índice inalterado durante o bloco."""
+        profundidade = getattr(self._local, "leituras", 0)
+        if self._escritor == threading.get_ident() or profundidade:
+            self._local.leituras = profundidade + 1
+            try:
+                yield
+            finally:
+                self._local.leituras = profundidade
+            return
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._escritor is None and not self._escritores_esperando)
+            self._leitores += 1
+        self._local.leituras = 1
+        try:
+            yield
+        finally:
+            self._local.leituras = 0
+            with self._condicao:
+                self._leitores -= 1
+                if not self._leitores:
+                    self._condicao.notify_all()
+
+    @contextmanager
+    def escrita(self):
+        """Dá acesso exclusivo ao índice durante o bloco."""
+        eu = threading.get_ident()
+        with self._condicao:
+            if self._escritor != eu:
+                self._escritores_esperando += 1
+                self._condicao.wait_for(lambda: self._escritor is None and not self._leitores)
+                self._escritores_esperando -= 1
+                self._escritor = eu
+            self._profundidade_escrita += 1
+        try:
+            yield
+        finally:
+            with self._condicao:
+                self._profundidade_escrita -= 1
+                if not self._profundidade_escrita:
+                    self._escritor = None
+                    self._condicao.notify_all()
+
+
+_lock_travas = threading.Lock()
+
+
+def trava_indice(indice_vetorial) -> TravaLeituraEscrita:
+    """Retorna a trava associada ao índice vetorial, criando-a na primeira chamada."""
+    trava = getattr(indice_vetorial, "trava", None)
+    if trava is None:
+        with _lock_travas:
+            trava = getattr(indice_vetorial, "trava", None)
+            if trava is None:
+                trava = TravaLeituraEscrita()
+                indice_vetorial.trava = trava
+    return trava
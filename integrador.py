@@ -7,6 +7,9 @@ using different AI language model providers such as OpenAI and Anthropic.
 # etp_llm_generator.py
 import re
 import io
+import asyncio
+import weakref
+from operator import itemgetter
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 from reportlab.lib.units import inch
@@ -15,13 +18,14 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.pagesizes import A4
 import os
 import streamlit as st
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterator, AsyncIterator
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 from dotenv import load_dotenv
+from empacotador_contexto import EmpacotadorContexto, ORCAMENTO_TOKENS_RESUMO, truncar_tokens
 import tempfile
 from datetime import datetime
 
@@ -324,17 +328,58 @@ class AssistenteEtpInteligente:
             Dict: Análise estruturada com feedback e sugestões
         """
         if not self.llm:
-            return {
-                "erro": "LLM não inicializado. Verifique as chaves de API.",
-                "feedback": "",
-                "sugestoes": [],
-                "qualidade": "erro"
-            }
+            return self._erro_analise("LLM não inicializado. Verifique as chaves de API.")
         
         # Verificar se o campo tem prompt especializado
         if nome_campo not in self.prompts_especializados:
             return self._analise_generica(nome_campo, conteudo_atual, contexto_anterior)
         
+        try:
+            # Executar análise
+            resultado = self._cadeia(*self._prompt_analise(nome_campo, conteudo_atual, contexto_anterior)).invoke({})
+            
+            # Processar resultado
+            return self._processar_resultado_analise(resultado, nome_campo)
+            
+        except Exception as e:
+            st.error(f"Erro na análise do campo {nome_campo}: {str(e)}")
+            return self._erro_analise(f"Erro na análise: {str(e)}")
+    
+    async def aanalisar_campo(self, nome_campo: str, conteudo_atual: str, contexto_anterior: Dict[str, Any]) -> Dict[str, Any]:
+        """Versão assíncrona de analisar_campo: aguarda o LLM sem bloquear o event loop."""
+        if not self.llm:
+            return self._erro_analise("LLM não inicializado. Verifique as chaves de API.")
+        
+        if nome_campo not in self.prompts_especializados:
+            return await self._aanalise_generica(nome_campo, conteudo_atual, contexto_anterior)
+        
+        try:
+            resultado = await self._cadeia(*self._prompt_analise(nome_campo, conteudo_atual, contexto_anterior)).ainvoke({})
+            return self._processar_resultado_analise(resultado, nome_campo)
+            
+        except Exception as e:
+            st.error(f"Erro na análise do campo {nome_campo}: {str(e)}")
+            return self._erro_analise(f"Erro na análise: {str(e)}")
+    
+    def _cadeia(self, sistema: str, prompt: str):
+        """Cria a cadeia mensagem de sistema + prompt -> LLM -> texto."""
+        chat_template = ChatPromptTemplate.from_messages([
+            ("system", sistema),
+            ("user", prompt)
+        ])
+        return chat_template | self.llm | StrOutputParser()
+    
+    def _erro_analise(self, mensagem: str) -> Dict[str, Any]:
+        """Resposta de análise para quando o LLM não pôde ser consultado."""
+        return {
+            "erro": mensagem,
+            "feedback": "",
+            "sugestoes": [],
+            "qualidade": "erro"
+        }
+    
+    def _prompt_analise(self, nome_campo: str, conteudo_atual: str, contexto_anterior: Dict[str, Any]) -> tuple:
+        """Monta (mensagem de sistema, prompt) da análise de um campo com prompt especializado."""
         # Formatar contexto anterior
         contexto_formatado = self._formatar_contexto(contexto_anterior)
         
@@ -347,31 +392,9 @@ class AssistenteEtpInteligente:
             conteudo_atual=conteudo_atual
         )
         
-        try:
-            # Criar template de chat
-            chat_template = ChatPromptTemplate.from_messages([
-                ("system", "Você é um especialista em elaboração de documentos técnicos governamentais, "
-                          "especialmente ETPs conforme Lei 14.133/2021 e Manual TRT-2."),
-                ("user", prompt_final)
-            ])
-            
-            # Criar cadeia de processamento
-            chain = chat_template | self.llm | StrOutputParser()
-            
-            # Executar análise
-            resultado = chain.invoke({})
-            
-            # Processar resultado
-            return self._processar_resultado_analise(resultado, nome_campo)
-            
-        except Exception as e:
-            st.error(f"Erro na análise do campo {nome_campo}: {str(e)}")
-            return {
-                "erro": f"Erro na análise: {str(e)}",
-                "feedback": "",
-                "sugestoes": [],
-                "qualidade": "erro"
-            }
+        sistema = ("Você é um especialista em elaboração de documentos técnicos governamentais, "
+                   "especialmente ETPs conforme Lei 14.133/2021 e Manual TRT-2.")
+        return sistema, prompt_final
     
     def _formatar_contexto(self, contexto: Dict[str, Any]) -> str:
         """Formata o contexto anterior para inclusão no prompt."""
@@ -387,6 +410,27 @@ class AssistenteEtpInteligente:
     
     def _analise_generica(self, nome_campo: str, conteudo_atual: str, contexto_anterior: Dict[str, Any]) -> Dict[str, Any]:
         """Realiza análise genérica para campos sem prompt especializado."""
+        try:
+            chain = self._cadeia(*self._prompt_analise_generica(nome_campo, conteudo_atual, contexto_anterior))
+            resultado = chain.invoke({})
+            
+            return self._processar_resultado_analise(resultado, nome_campo)
+            
+        except Exception as e:
+            return self._erro_analise(f"Erro na análise genérica: {str(e)}")
+    
+    async def _aanalise_generica(self, nome_campo: str, conteudo_atual: str, contexto_anterior: Dict[str, Any]) -> Dict[str, Any]:
+        """Versão assíncrona de _analise_generica."""
+        try:
+            chain = self._cadeia(*self._prompt_analise_generica(nome_campo, conteudo_atual, contexto_anterior))
+            resultado = await chain.ainvoke({})
+            return self._processar_resultado_analise(resultado, nome_campo)
+            
+        except Exception as e:
+            return self._erro_analise(f"Erro na análise genérica: {str(e)}")
+    
+    def _prompt_analise_generica(self, nome_campo: str, conteudo_atual: str, contexto_anterior: Dict[str, Any]) -> tuple:
+        """Monta (mensagem de sistema, prompt) da análise genérica de um campo."""
         prompt_generico = f"""
         Analise o campo "{nome_campo}" de um ETP considerando:
         
@@ -400,25 +444,7 @@ class AssistenteEtpInteligente:
         
         Forneça feedback estruturado com sugestões de melhoria.
         """
-        
-        try:
-            chat_template = ChatPromptTemplate.from_messages([
-                ("system", "Você é um especialista em documentos técnicos governamentais."),
-                ("user", prompt_generico)
-            ])
-            
-            chain = chat_template | self.llm | StrOutputParser()
-            resultado = chain.invoke({})
-            
-            return self._processar_resultado_analise(resultado, nome_campo)
-            
-        except Exception as e:
-            return {
-                "erro": f"Erro na análise genérica: {str(e)}",
-                "feedback": "",
-                "sugestoes": [],
-                "qualidade": "erro"
-            }
+        return "Você é um especialista em documentos técnicos governamentais.", prompt_generico
     
     def _processar_resultado_analise(self, resultado: str, nome_campo: str) -> Dict[str, Any]:
         """Processa o resultado da análise e estrutura a resposta."""
@@ -486,6 +512,33 @@ class AssistenteEtpInteligente:
         if not self.llm:
             return {"erro": "LLM não inicializado"}
         
+        try:
+            resultado = self._cadeia(*self._prompt_consistencia(dados_etp)).invoke({})
+            return self._resultado_consistencia(resultado)
+            
+        except Exception as e:
+            return {
+                "erro": f"Erro na validação geral: {str(e)}",
+                "status": "erro"
+            }
+    
+    async def avalidar_consistencia_geral(self, dados_etp: Dict[str, Any]) -> Dict[str, Any]:
+        """Versão assíncrona de validar_consistencia_geral."""
+        if not self.llm:
+            return {"erro": "LLM não inicializado"}
+        
+        try:
+            resultado = await self._cadeia(*self._prompt_consistencia(dados_etp)).ainvoke({})
+            return self._resultado_consistencia(resultado)
+            
+        except Exception as e:
+            return {
+                "erro": f"Erro na validação geral: {str(e)}",
+                "status": "erro"
+            }
+    
+    def _prompt_consistencia(self, dados_etp: Dict[str, Any]) -> tuple:
+        """Monta (mensagem de sistema, prompt) da validação de consistência geral."""
         prompt_consistencia = f"""
         Analise a consistência geral entre todos os campos deste ETP:
         
@@ -504,27 +557,15 @@ class AssistenteEtpInteligente:
         - Recomendações de ajustes
         - Avaliação geral de qualidade
         """
-        
-        try:
-            chat_template = ChatPromptTemplate.from_messages([
-                ("system", "Você é um especialista em ETPs e Lei 14.133/2021."),
-                ("user", prompt_consistencia)
-            ])
-            
-            chain = chat_template | self.llm | StrOutputParser()
-            resultado = chain.invoke({})
-            
-            return {
-                "analise_geral": resultado,
-                "timestamp": datetime.now().isoformat(),
-                "status": "concluida"
-            }
-            
-        except Exception as e:
-            return {
-                "erro": f"Erro na validação geral: {str(e)}",
-                "status": "erro"
-            }
+        return "Você é um especialista em ETPs e Lei 14.133/2021.", prompt_consistencia
+    
+    def _resultado_consistencia(self, resultado: str) -> Dict[str, Any]:
+        """Estrutura a resposta da validação de consistência geral."""
+        return {
+            "analise_geral": resultado,
+            "timestamp": datetime.now().isoformat(),
+            "status": "concluida"
+        }
     
     def _formatar_dados_completos(self, dados_etp: Dict[str, Any]) -> str:
         """Formata todos os dados do ETP para análise geral."""
@@ -552,6 +593,33 @@ class AssistenteEtpInteligente:
         if not self.llm:
             return {"erro": "LLM não inicializado"}
         
+        try:
+            resultado = self._cadeia(*self._prompt_melhoria(texto, tipo_melhoria)).invoke({})
+            return self._resultado_melhoria(resultado, texto, tipo_melhoria)
+            
+        except Exception as e:
+            return {
+                "erro": f"Erro na melhoria do texto: {str(e)}",
+                "texto_original": texto
+            }
+    
+    async def amelhorar_texto(self, texto: str, tipo_melhoria: str = "geral") -> Dict[str, Any]:
+        """Versão assíncrona de melhorar_texto."""
+        if not self.llm:
+            return {"erro": "LLM não inicializado"}
+        
+        try:
+            resultado = await self._cadeia(*self._prompt_melhoria(texto, tipo_melhoria)).ainvoke({})
+            return self._resultado_melhoria(resultado, texto, tipo_melhoria)
+            
+        except Exception as e:
+            return {
+                "erro": f"Erro na melhoria do texto: {str(e)}",
+                "texto_original": texto
+            }
+    
+    def _prompt_melhoria(self, texto: str, tipo_melhoria: str) -> tuple:
+        """Monta (mensagem de sistema, prompt) da melhoria de texto."""
         prompts_melhoria = {
             "gramatica": """
             Corrija apenas os erros gramaticais e de ortografia do texto abaixo,
@@ -594,34 +662,22 @@ class AssistenteEtpInteligente:
         }
         
         prompt_escolhido = prompts_melhoria.get(tipo_melhoria, prompts_melhoria["geral"])
+        return ("Você é um especialista em redação técnica para documentos governamentais.",
+                prompt_escolhido.format(texto=texto))
+    
+    def _resultado_melhoria(self, resultado: str, texto: str, tipo_melhoria: str) -> Dict[str, Any]:
+        """Separa o texto melhorado da explicação das mudanças."""
+        partes = resultado.split("2. PRINCIPAIS")
+        texto_melhorado = partes[0].replace("1. TEXTO MELHORADO", "").replace("1. TEXTO CORRIGIDO", "").strip()
+        melhorias = partes[1] if len(partes) > 1 else "Melhorias aplicadas."
         
-        try:
-            chat_template = ChatPromptTemplate.from_messages([
-                ("system", "Você é um especialista em redação técnica para documentos governamentais."),
-                ("user", prompt_escolhido.format(texto=texto))
-            ])
-            
-            chain = chat_template | self.llm | StrOutputParser()
-            resultado = chain.invoke({})
-            
-            # Processar resultado
-            partes = resultado.split("2. PRINCIPAIS")
-            texto_melhorado = partes[0].replace("1. TEXTO MELHORADO", "").replace("1. TEXTO CORRIGIDO", "").strip()
-            melhorias = partes[1] if len(partes) > 1 else "Melhorias aplicadas."
-            
-            return {
-                "texto_original": texto,
-                "texto_melhorado": texto_melhorado,
-                "melhorias_realizadas": melhorias,
-                "tipo_melhoria": tipo_melhoria,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-        except Exception as e:
-            return {
-                "erro": f"Erro na melhoria do texto: {str(e)}",
-                "texto_original": texto
-            }
+        return {
+            "texto_original": texto,
+            "texto_melhorado": texto_melhorado,
+            "melhorias_realizadas": melhorias,
+            "tipo_melhoria": tipo_melhoria,
+            "timestamp": datetime.now().isoformat()
+        }
     
     def gerar_exemplo_campo(self, nome_campo: str, contexto_anterior: Dict[str, Any]) -> str:
         """
@@ -637,6 +693,25 @@ class AssistenteEtpInteligente:
         if not self.llm:
             return "Erro: LLM não inicializado."
         
+        try:
+            return self._cadeia(*self._prompt_exemplo(nome_campo, contexto_anterior)).invoke({})
+            
+        except Exception as e:
+            return f"Erro ao gerar exemplo: {str(e)}"
+    
+    async def agerar_exemplo_campo(self, nome_campo: str, contexto_anterior: Dict[str, Any]) -> str:
+        """Versão assíncrona de gerar_exemplo_campo."""
+        if not self.llm:
+            return "Erro: LLM não inicializado."
+        
+        try:
+            return await self._cadeia(*self._prompt_exemplo(nome_campo, contexto_anterior)).ainvoke({})
+            
+        except Exception as e:
+            return f"Erro ao gerar exemplo: {str(e)}"
+    
+    def _prompt_exemplo(self, nome_campo: str, contexto_anterior: Dict[str, Any]) -> tuple:
+        """Monta (mensagem de sistema, prompt) do exemplo de preenchimento de um campo."""
         contexto_formatado = self._formatar_contexto(contexto_anterior)
         
         prompt_exemplo = f"""
@@ -651,18 +726,7 @@ class AssistenteEtpInteligente:
         Forneça um exemplo prático, técnico e bem estruturado que sirva como
         referência para o usuário.
         """
-        
-        try:
-            chat_template = ChatPromptTemplate.from_messages([
-                ("system", "Você é um especialista em ETPs e Lei 14.133/2021."),
-                ("user", prompt_exemplo)
-            ])
-            
-            chain = chat_template | self.llm | StrOutputParser()
-            return chain.invoke({})
-            
-        except Exception as e:
-            return f"Erro ao gerar exemplo: {str(e)}"
+        return "Você é um especialista em ETPs e Lei 14.133/2021.", prompt_exemplo
     
     def _mapear_campo_para_secao_trt2(self, nome_campo: str) -> Dict[str, str]:
         """Mapeia campos do formulário para seções do Manual TRT-2."""
@@ -740,12 +804,23 @@ class AssistenteEtpInteligente:
         """
         Analisa campo considerando contexto TRT-2 e integração com novo prompt.
         """
-        # Obter mapeamento para seção TRT-2
-        mapeamento = self._mapear_campo_para_secao_trt2(nome_campo)
-        
         # Análise normal do campo
         resultado = self.analisar_campo(nome_campo, conteudo_atual, contexto_anterior)
         
+        return self._adicionar_contexto_trt2(resultado, nome_campo, conteudo_atual)
+    
+    async def aanalisar_campo_com_contexto_trt2(self, nome_campo: str, conteudo_atual: str,
+                                               contexto_anterior: Dict[str, Any]) -> Dict[str, Any]:
+        """Versão assíncrona de analisar_campo_com_contexto_trt2."""
+        resultado = await self.aanalisar_campo(nome_campo, conteudo_atual, contexto_anterior)
+        return self._adicionar_contexto_trt2(resultado, nome_campo, conteudo_atual)
+    
+    def _adicionar_contexto_trt2(self, resultado: Dict[str, Any], nome_campo: str,
+                                 conteudo_atual: str) -> Dict[str, Any]:
+        """Acrescenta à análise a seção TRT-2 correspondente e a conformidade com o manual."""
+        # Obter mapeamento para seção TRT-2
+        mapeamento = self._mapear_campo_para_secao_trt2(nome_campo)
+        
         # Adicionar contexto TRT-2
         if "erro" not in resultado:
             resultado["secao_trt2"] = mapeamento["secao_trt2"]
@@ -1077,6 +1152,27 @@ def criar_validacao_completa_trt2(dados_etp: Dict[str, Any], assistente: Assiste
             st.info("Funcionalidade em desenvolvimento - análise seção por seção")
 
 
+# As 17 seções do ETP, divididas em 3 grupos gerados separadamente
+GRUPOS_SECOES_ETP = [
+    [1, 2, 3, 4, 5, 6],      # Seções 1-6
+    [7, 8, 9, 10, 11, 12],   # Seções 7-12
+    [13, 14, 15, 16, 17]     # Seções 13-17 (inclui cronograma)
+]
+
+# Grupos de seções pedidos ao LLM ao mesmo tempo, somando todas as gerações
+# assíncronas em andamento no processo (1 = um grupo por vez)
+GRUPOS_SIMULTANEOS_ETP = max(1, int(os.getenv("ETP_GRUPOS_SIMULTANEOS", "2")))
+_semaforos_grupos = weakref.WeakKeyDictionary()
+
+
+def _semaforo_grupos() -> asyncio.Semaphore:
+    """Semáforo que limita os grupos de seções em geração no event loop atual."""
+    loop = asyncio.get_running_loop()
+    if loop not in _semaforos_grupos:
+        _semaforos_grupos[loop] = asyncio.Semaphore(GRUPOS_SIMULTANEOS_ETP)
+    return _semaforos_grupos[loop]
+
+
 class EtpLlmGenerator:
     """Gerador de Estudos Técnicos Preliminares (ETP) usando LangChain."""
 
@@ -1325,24 +1421,50 @@ Elabore o ETP completo seguindo rigorosamente esta estrutura e diretrizes.
             st.error(f"Erro ao gerar o ETP: {str(e)}")
             return f"Erro na geração do documento: {str(e)}"
     
+    async def agenerate_etp(self, dados_etp: Dict[str, Any]) -> str:
+        """Versão assíncrona de generate_etp, para uso no event loop da API."""
+        if not self.llm:
+            return "Erro: LLM não inicializado. Verifique as chaves de API."
+        
+        try:
+            return await self.agenerate_etp_modular(dados_etp)
+        except Exception as e:
+            st.error(f"Erro ao gerar o ETP: {str(e)}")
+            return f"Erro na geração do documento: {str(e)}"
+    
     def generate_etp_modular(self, dados_etp: Dict[str, Any]) -> str:
         """Gera ETP em etapas para evitar truncamento."""
-        
-        # Dividir as 17 seções em 3 grupos
-        grupos_secoes = [
-            [1, 2, 3, 4, 5, 6],      # Seções 1-6
-            [7, 8, 9, 10, 11, 12],   # Seções 7-12
-            [13, 14, 15, 16, 17]     # Seções 13-17 (inclui cronograma)
-        ]
-        
         documento_completo = []
         
-        for i, grupo in enumerate(grupos_secoes):
+        for grupo in GRUPOS_SECOES_ETP:
             st.info(f"Gerando seções {grupo[0]}-{grupo[-1]}...")
             prompt_grupo = self._construct_prompt_grupo(dados_etp, grupo)
             resultado_grupo = self.chain.invoke({"prompt": prompt_grupo})
             documento_completo.append(resultado_grupo)
         
+        return self._finalizar_etp(documento_completo)
+    
+    async def agenerate_etp_modular(self, dados_etp: Dict[str, Any]) -> str:
+        """
+        Versão assíncrona de generate_etp_modular.
+        
+        Os grupos de seções não dependem uns dos outros, então são pedidos ao
+        LLM em paralelo, até ETP_GRUPOS_SIMULTANEOS por vez no processo: com
+        o limite igual ao número de grupos, o tempo total é o do mais lento.
+        """
+        st.info(f"Gerando seções 1-{GRUPOS_SECOES_ETP[-1][-1]}...")
+        documento_completo = await asyncio.gather(*(
+            self._agerar_grupo(dados_etp, grupo) for grupo in GRUPOS_SECOES_ETP
+        ))
+        return self._finalizar_etp(list(documento_completo))
+    
+    async def _agerar_grupo(self, dados_etp: Dict[str, Any], grupo: list) -> str:
+        """Gera um grupo de seções, respeitando o limite de chamadas simultâneas."""
+        async with _semaforo_grupos():
+            return await self.chain.ainvoke({"prompt": self._construct_prompt_grupo(dados_etp, grupo)})
+    
+    def _finalizar_etp(self, documento_completo: list) -> str:
+        """Junta os grupos de seções gerados e avisa se alguma seção ficou faltando."""
         # Juntar documento completo
         documento_final = "\n\n".join(documento_completo)
         
@@ -1495,21 +1617,85 @@ Desenvolva APENAS as seções solicitadas ({secoes[0]} a {secoes[-1]}) com conte
         }
 
 
+# Prompt da cadeia de RAG; o histórico chega já formatado em {chat_history}
+TEMPLATE_RAG = """
+        Você é um assistente especialista em licitações e contratos públicos, com profundo conhecimento da Lei 14.133/2021 e de manuais de boas práticas.
+        Sua tarefa é fornecer orientações claras e práticas para os usuários, baseando-se no contexto fornecido e mantendo a continuidade da conversa.
+
+        Contexto dos Documentos:
+        {contexto_formatado}
+
+        Histórico da Conversa:
+        {chat_history}
+
+        Pergunta Atual:
+        {question}
+
+        Instruções:
+        1.  **Mantenha a Continuidade:** Considere todo o histórico da conversa para fornecer respostas coerentes e contextualizadas.
+        2.  **Seja um Orientador:** Sintetize os pontos relevantes do contexto para fornecer recomendações práticas.
+        3.  **Fundamente sua Resposta:** Baseie suas orientações nas informações do contexto e cite fontes quando possível.
+        4.  **Seja Prático:** Traduza a linguagem técnica para orientações aplicáveis no dia a dia.
+        5.  **Estruture a Resposta:** Organize de forma lógica para facilitar o entendimento.
+        6.  **Referências Contextuais:** Quando apropriado, faça referência a pontos discutidos anteriormente na conversa.
+        """
+
+ERRO_CADEIA_RAG = "Erro: A cadeia de RAG não foi inicializada corretamente. Verifique as configurações da API."
+
+# Mensagens mais recentes mantidas na íntegra no prompt; as anteriores entram
+# apenas no resumo da conversa
+JANELA_HISTORICO = int(os.getenv("ETP_JANELA_HISTORICO", "6"))
+
+TEMPLATE_RESUMO = """
+        Você mantém o resumo de uma conversa sobre licitações e contratos públicos (Lei 14.133/2021).
+        Atualize o resumo incorporando as novas mensagens. Preserve o que ainda importa para a
+        continuidade da conversa: o objeto e o contexto da contratação, dúvidas do usuário,
+        conclusões e orientações já dadas, e os artigos e documentos citados. Descarte cumprimentos
+        e repetições. Responda apenas com o resumo atualizado, em até 150 palavras.
+
+        Resumo atual:
+        {resumo_anterior}
+
+        Novas mensagens:
+        {mensagens}
+        """
+
+
 class RagChain:
-    """Cadeia de RAG para responder perguntas sobre a Lei 14.133."""
+    """
+    Cadeia de RAG para responder perguntas sobre a Lei 14.133.
+
+    A cadeia é montada uma única vez, na criação: a pergunta e o histórico
+    formatado são variáveis de entrada, então a mesma instância atende
+    qualquer conversa (e pode ser compartilhada entre sessões).
+
+    Trechos recuperados e histórico entram no prompt dentro dos orçamentos
+    de tokens do EmpacotadorContexto; os trechos que ficam de fora também
+    não aparecem nas fontes.
+
+    Em conversas longas, as mensagens que saem da janela das JANELA_HISTORICO
+    mais recentes são condensadas em um resumo (ver atualizar_resumo), que
+    o chamador guarda por conversa e repassa a cada pergunta. O resumo é um
+    dicionário {"texto": str, "mensagens_resumidas": int}, onde
+    "mensagens_resumidas" é quantas mensagens do início do histórico ele
+    cobre; elas deixam de ser enviadas na íntegra.
+    """
 
-    def __init__(self, retriever, provider: str = "openai"):
+    def __init__(self, retriever, provider: str = "openai", empacotador: Optional[EmpacotadorContexto] = None):
         """
         Inicializa a cadeia de RAG.
 
         Args:
             retriever: O retriever configurado para buscar documentos.
             provider (str): O provedor LLM a ser usado.
+            empacotador (EmpacotadorContexto): Orçamentos de tokens do prompt (padrão: os configurados).
         """
         self.retriever = retriever
         self.provider = provider.lower()
+        self.empacotador = empacotador or EmpacotadorContexto()
         self.llm = self._get_llm()
         self.chain = self._create_rag_chain()
+        self.cadeia_resumo = self._create_summary_chain()
 
     def _get_llm(self):
         """Configura e retorna o modelo LLM com base no provedor."""
@@ -1518,43 +1704,46 @@ class RagChain:
         return generator.llm
 
     def _create_rag_chain(self):
-        """Cria a cadeia de RAG completa."""
+        """
+        Cria a cadeia de RAG completa.
+
+        Recebe {"question", "chat_history"} e devolve o mesmo dicionário com
+        os documentos que foram para o prompt ("context") e a resposta
+        ("resposta"). No stream, os documentos chegam completos antes do
+        primeiro token da resposta.
+        """
         if not self.llm:
             return None
 
-        template = """
-        Você é um assistente especialista em licitações e contratos públicos, com profundo conhecimento da Lei 14.133/2021 e de manuais de boas práticas.
-        Sua tarefa é fornecer orientações claras e práticas para os usuários, baseando-se no contexto fornecido e mantendo a continuidade da conversa.
-
-        Contexto dos Documentos:
-        {context}
-
-        Histórico da Conversa:
-        {chat_history}
-
-        Pergunta Atual:
-        {question}
-
-        Instruções:
-        1.  **Mantenha a Continuidade:** Considere todo o histórico da conversa para fornecer respostas coerentes e contextualizadas.
-        2.  **Seja um Orientador:** Sintetize os pontos relevantes do contexto para fornecer recomendações práticas.
-        3.  **Fundamente sua Resposta:** Baseie suas orientações nas informações do contexto e cite fontes quando possível.
-        4.  **Seja Prático:** Traduza a linguagem técnica para orientações aplicáveis no dia a dia.
-        5.  **Estruture a Resposta:** Organize de forma lógica para facilitar o entendimento.
-        6.  **Referências Contextuais:** Quando apropriado, faça referência a pontos discutidos anteriormente na conversa.
-        """
-        
-        prompt = ChatPromptTemplate.from_template(template)
+        prompt = ChatPromptTemplate.from_template(TEMPLATE_RAG)
 
         rag_chain = (
-            {"context": self.retriever, "question": RunnablePassthrough()}
-            | prompt
-            | self.llm
-            | StrOutputParser()
+            RunnablePassthrough.assign(
+                context=itemgetter("question") | self.retriever | self.empacotador.selecionar_documentos
+            )
+            | RunnablePassthrough.assign(
+                resposta=RunnablePassthrough.assign(contexto_formatado=lambda x: self._format_context(x["context"]))
+                | prompt | self.llm | StrOutputParser()
+            )
         )
         return rag_chain
 
-    def _format_chat_history(self, chat_history: list) -> str:
+    def _create_summary_chain(self):
+        """Cria a cadeia que incorpora novas mensagens ao resumo da conversa."""
+        if not self.llm:
+            return None
+        return ChatPromptTemplate.from_template(TEMPLATE_RESUMO) | self.llm | StrOutputParser()
+
+    def _format_context(self, documentos: list) -> str:
+        """Formata os trechos escolhidos para o prompt, cada um precedido da sua fonte."""
+        if not documentos:
+            return "Nenhum trecho relevante encontrado."
+        blocos = []
+        for numero, (documento, fonte) in enumerate(zip(documentos, extrair_fontes(documentos)), start=1):
+            blocos.append(f"[{numero}] {formatar_fonte(fonte)}\n{documento.page_content}")
+        return "\n\n".join(blocos)
+
+    def _format_chat_history(self, chat_history: list, resumo: Optional[Dict[str, Any]] = None) -> str:
         """
         Formata o histórico de chat para inclusão no prompt.
         
@@ -1562,25 +1751,96 @@ class RagChain:
             chat_history (list): Lista de mensagens no formato:
                                [{"role": "user", "content": "..."},
                                 {"role": "assistant", "content": "..."}]
+            resumo (Dict): Resumo da conversa; as mensagens que ele cobre não
+                são repetidas na íntegra
             
         Returns:
             str: Histórico formatado
         """
-        if not chat_history:
+        resumo = self._validar_resumo(chat_history, resumo)
+        recentes = chat_history[resumo["mensagens_resumidas"]:]
+        if not recentes and not resumo["texto"]:
             return "Nenhuma conversa anterior."
         
-        # Pegar apenas as últimas 6 mensagens para não sobrecarregar o prompt
-        recent_history = chat_history[-6:] if len(chat_history) > 6 else chat_history
+        linhas = []
+        if resumo["texto"]:
+            linhas.append(f"Resumo da conversa até aqui: {resumo['texto']}")
+        # Mensagens mais recentes primeiro, até o orçamento de tokens do histórico
+        linhas.extend(self.empacotador.selecionar_historico(self._format_messages(recentes)))
+        return "\n".join(linhas)
+
+    def _format_messages(self, mensagens: list) -> list:
+        """Formata cada mensagem como "Usuário: ..." ou "Assistente: ..."."""
+        return [f"{'Usuário' if message['role'] in ('user', 'human') else 'Assistente'}: {message['content']}"
+                for message in mensagens]
+
+    def _validar_resumo(self, chat_history: list, resumo: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Normaliza o resumo recebido; um resumo que não corresponde ao histórico é ignorado."""
+        if not resumo or not 0 <= resumo.get("mensagens_resumidas", 0) <= len(chat_history):
+            return {"texto": "", "mensagens_resumidas": 0}
+        return {"texto": resumo.get("texto") or "", "mensagens_resumidas": resumo.get("mensagens_resumidas", 0)}
+
+    def _mensagens_a_resumir(self, chat_history: list, resumo: Optional[Dict[str, Any]]) -> tuple:
+        """Retorna (resumo normalizado, mensagens que saíram da janela e ainda não foram resumidas)."""
+        resumo = self._validar_resumo(chat_history, resumo)
+        limite = max(0, len(chat_history) - JANELA_HISTORICO)
+        return resumo, chat_history[resumo["mensagens_resumidas"]:limite]
+
+    def _entrada_resumo(self, resumo: Dict[str, Any], novas: list) -> Dict[str, str]:
+        """Monta a entrada da cadeia de resumo."""
+        return {"resumo_anterior": resumo["texto"] or "Nenhum (início da conversa).",
+                "mensagens": "\n".join(self._format_messages(novas))}
+
+    def _resumo_atualizado(self, texto: str, resumo: Dict[str, Any], novas: list) -> Dict[str, Any]:
+        """Monta o novo resumo, limitado a ORCAMENTO_TOKENS_RESUMO tokens."""
+        return {"texto": truncar_tokens(texto.strip(), ORCAMENTO_TOKENS_RESUMO),
+                "mensagens_resumidas": resumo["mensagens_resumidas"] + len(novas)}
+
+    def atualizar_resumo(self, chat_history: list, resumo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Incorpora ao resumo as mensagens que saíram da janela do histórico.
         
-        formatted_history = []
-        for message in recent_history:
-            role = "Usuário" if message["role"] == "user" else "Assistente"
-            content = message["content"][:200] + "..." if len(message["content"]) > 200 else message["content"]
-            formatted_history.append(f"{role}: {content}")
+        O LLM só é chamado quando há mensagens novas fora da janela, e recebe
+        apenas elas e o resumo anterior; o tamanho do prompt não cresce com a
+        conversa. Se a atualização falhar, o resumo anterior é mantido e as
+        mensagens continuam indo na íntegra, dentro do orçamento do histórico.
         
-        return "\n".join(formatted_history)
+        Args:
+            chat_history (list): Todas as mensagens da conversa, em ordem
+            resumo (Dict): Resumo anterior da conversa, ou None
+        
+        Returns:
+            Dict: O resumo atualizado ({"texto", "mensagens_resumidas"})
+        """
+        resumo, novas = self._mensagens_a_resumir(chat_history, resumo)
+        if not novas or not self.cadeia_resumo:
+            return resumo
+        try:
+            texto = self.cadeia_resumo.invoke(self._entrada_resumo(resumo, novas))
+        except Exception as e:
+            st.warning(f"Não foi possível atualizar o resumo da conversa: {str(e)}")
+            return resumo
+        return self._resumo_atualizado(texto, resumo, novas)
+
+    async def aatualizar_resumo(self, chat_history: list, resumo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Versão assíncrona de atualizar_resumo."""
+        resumo, novas = self._mensagens_a_resumir(chat_history, resumo)
+        if not novas or not self.cadeia_resumo:
+            return resumo
+        try:
+            texto = await self.cadeia_resumo.ainvoke(self._entrada_resumo(resumo, novas))
+        except Exception as e:
+            st.warning(f"Não foi possível atualizar o resumo da conversa: {str(e)}")
+            return resumo
+        return self._resumo_atualizado(texto, resumo, novas)
 
-    def invoke_with_history(self, question: str, chat_history: list) -> str:
+    def _entrada(self, question: str, chat_history: Optional[list],
+                 resumo: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        """Monta a entrada da cadeia para uma pergunta."""
+        return {"question": question, "chat_history": self._format_chat_history(chat_history or [], resumo)}
+
+    def invoke_with_history(self, question: str, chat_history: list,
+                            resumo: Optional[Dict[str, Any]] = None) -> str:
         """
         Invoca a cadeia de RAG com histórico de conversa.
         
@@ -1590,48 +1850,90 @@ class RagChain:
                                [{"role": "user", "content": "..."},
                                 {"role": "assistant", "content": "..."}]
         
+            resumo (Dict): Resumo da conversa, de atualizar_resumo (opcional)
+        
         Returns:
             str: A resposta gerada pela IA considerando o contexto
         """
-        if not self.chain:
-            return "Erro: A cadeia de RAG não foi inicializada corretamente. Verifique as configurações da API."
-        
-        # Formatar o histórico da conversa
-        formatted_history = self._format_chat_history(chat_history)
-        
-        # Criar uma nova cadeia que inclui o histórico
-        template = """
-        Você é um assistente especialista em licitações e contratos públicos, com profundo conhecimento da Lei 14.133/2021 e de manuais de boas práticas.
-        Sua tarefa é fornecer orientações claras e práticas para os usuários, baseando-se no contexto fornecido e mantendo a continuidade da conversa.
+        return self.invoke_with_sources(question, chat_history, resumo)["resposta"]
 
-        Contexto dos Documentos:
-        {context}
+    async def ainvoke_with_history(self, question: str, chat_history: list,
+                                   resumo: Optional[Dict[str, Any]] = None) -> str:
+        """Versão assíncrona de invoke_with_history."""
+        return (await self.ainvoke_with_sources(question, chat_history, resumo))["resposta"]
 
-        Histórico da Conversa:
-        {chat_history}
+    def invoke_with_sources(self, question: str, chat_history: Optional[list] = None,
+                            resumo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Invoca a cadeia de RAG e retorna a resposta junto com as fontes usadas.
+        
+        As fontes são os mesmos trechos recuperados que foram para o prompt,
+        sem uma segunda busca.
+        
+        Args:
+            question (str): A pergunta atual do usuário
+            chat_history (list): Mensagens anteriores, como em invoke_with_history
+            resumo (Dict): Resumo da conversa, de atualizar_resumo (opcional)
+        
+        Returns:
+            Dict: {"resposta": str, "fontes": list}, com as fontes no formato de extrair_fontes
+        """
+        if not self.chain:
+            return {"resposta": ERRO_CADEIA_RAG, "fontes": []}
+        
+        resultado = self.chain.invoke(self._entrada(question, chat_history, resumo))
+        return {"resposta": resultado["resposta"], "fontes": extrair_fontes(resultado["context"])}
 
-        Pergunta Atual:
-        {question}
+    async def ainvoke_with_sources(self, question: str, chat_history: Optional[list] = None,
+                                   resumo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Versão assíncrona de invoke_with_sources."""
+        if not self.chain:
+            return {"resposta": ERRO_CADEIA_RAG, "fontes": []}
+        
+        resultado = await self.chain.ainvoke(self._entrada(question, chat_history, resumo))
+        return {"resposta": resultado["resposta"], "fontes": extrair_fontes(resultado["context"])}
 
-        Instruções:
-        1.  **Mantenha a Continuidade:** Considere todo o histórico da conversa para fornecer respostas coerentes e contextualizadas.
-        2.  **Seja um Orientador:** Sintetize os pontos relevantes do contexto para fornecer recomendações práticas.
-        3.  **Fundamente sua Resposta:** Baseie suas orientações nas informações do contexto e cite fontes quando possível.
-        4.  **Seja Prático:** Traduza a linguagem técnica para orientações aplicáveis no dia a dia.
-        5.  **Estruture a Resposta:** Organize de forma lógica para facilitar o entendimento.
-        6.  **Referências Contextuais:** Quando apropriado, faça referência a pontos discutidos anteriormente na conversa.
+    def stream_with_history(self, question: str, chat_history: list,
+                            resumo: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
         """
+        Gera a resposta em partes, à medida que o LLM a produz.
         
-        prompt = ChatPromptTemplate.from_template(template)
+        Args:
+            question (str): A pergunta atual do usuário
+            chat_history (list): Mensagens anteriores, como em invoke_with_history
+            resumo (Dict): Resumo da conversa, de atualizar_resumo (opcional)
         
-        chain_with_history = (
-            {"context": self.retriever, "chat_history": lambda x: formatted_history, "question": RunnablePassthrough()}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        Yields:
+            Dict: Primeiro {"tipo": "fontes", "fontes": [...]}, com os trechos
+                recuperados para a pergunta; depois {"tipo": "token", "texto": "..."}
+                para cada parte da resposta.
+        """
+        if not self.chain:
+            yield {"tipo": "token", "texto": ERRO_CADEIA_RAG}
+            return
         
-        return chain_with_history.invoke(question)
+        for parte in self.chain.stream(self._entrada(question, chat_history, resumo)):
+            yield from self._eventos_stream(parte)
+
+    async def astream_with_history(self, question: str, chat_history: list,
+                                   resumo: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Versão assíncrona de stream_with_history."""
+        if not self.chain:
+            yield {"tipo": "token", "texto": ERRO_CADEIA_RAG}
+            return
+        
+        async for parte in self.chain.astream(self._entrada(question, chat_history, resumo)):
+            for evento in self._eventos_stream(parte):
+                yield evento
+
+    def _eventos_stream(self, parte: Dict[str, Any]) -> list:
+        """Converte uma parte do stream da cadeia em eventos de fontes e de tokens."""
+        eventos = []
+        if "context" in parte:
+            eventos.append({"tipo": "fontes", "fontes": extrair_fontes(parte["context"])})
+        if parte.get("resposta"):
+            eventos.append({"tipo": "token", "texto": parte["resposta"]})
+        return eventos
 
     def invoke(self, question: str) -> str:
         """
@@ -1643,10 +1945,48 @@ class RagChain:
         Returns:
             str: A resposta gerada pela IA.
         """
-        if not self.chain:
-            return "Erro: A cadeia de RAG não foi inicializada corretamente. Verifique as configurações da API."
-        
-        return self.chain.invoke(question)
+        return self.invoke_with_sources(question)["resposta"]
+
+    async def ainvoke(self, question: str) -> str:
+        """Versão assíncrona de invoke."""
+        return (await self.ainvoke_with_sources(question))["resposta"]
+
+
+def extrair_fontes(documentos: list) -> list:
+    """
+    Resume os documentos recuperados pelo RAG como fontes citáveis.
+
+    Args:
+        documentos (list): Documentos retornados pelo retriever.
+
+    Returns:
+        list: Para cada documento, {"fonte", "pagina", "artigo", "secao",
+            "pontuacao", "trecho"}; a página é numerada a partir de 1 e a
+            pontuação é a do retriever (None se ele não informar).
+    """
+    fontes = []
+    for documento in documentos:
+        metadados = documento.metadata
+        pagina = metadados.get("page")
+        fontes.append({
+            "fonte": os.path.basename(metadados.get("source", "")),
+            "pagina": pagina + 1 if isinstance(pagina, int) else None,
+            "artigo": metadados.get("artigo"),
+            "secao": metadados.get("secao"),
+            "pontuacao": metadados.get("pontuacao"),
+            "trecho": documento.page_content[:300]
+        })
+    return fontes
+
+
+def formatar_fonte(fonte: Dict[str, Any]) -> str:
+    """Formata uma fonte de extrair_fontes como "arquivo.pdf, p. 12, art. 75"."""
+    partes = [fonte["fonte"]]
+    if fonte.get("pagina"):
+        partes.append(f"p. {fonte['pagina']}")
+    if fonte.get("artigo"):
+        partes.append(f"art. {fonte['artigo']}")
+    return ", ".join(partes)
 
 
 def format_etp_as_html(etp_text: str) -> str:
@@ -0,0 +1,172 @@
+# limpeza_paginas.py
+import re
+from collections import Counter
+from itertools import groupby, islice
+from typing import Iterable, Iterator, Optional
+from langchain_core.documents import Document
+
+# Linhas no topo e no rodapé de cada página em que se procuram cabeçalhos e rodapés
+LINHAS_BORDA = 3
+# Fração das páginas em que um trecho precisa se repetir, na mesma posição, para ser removido
+PROPORCAO_REPETICAO = 0.5
+MINIMO_PAGINAS = 3
+# Páginas iniciais de cada documento usadas para aprender os trechos repetidos
+PAGINAS_AMOSTRA = 50
+# Tamanho mínimo de um trecho repetido colado a uma linha de conteúdo
+# (ex.: "...de 2006.7/20/25, 6:58 PM L14133")
+TAMANHO_MINIMO_FRAGMENTO = 10
+
+_RE_DIGITOS = re.compile(r"\d+")
+_RE_ESPACOS = re.compile(r"\s+")
+# Quebra de linha após hífen colado a uma palavra: "contra-\ntação", "carta-\ncontrato"
+_RE_HIFENIZACAO = re.compile(r"(\w+)-[ \t]*\n[ \t]*([a-zà-ÿ]\w*)")
+_RE_PALAVRA = re.compile(r"\w+(?:-\w+)*")
+
+
+def _normalizar_linha(linha: str) -> str:
+    """Forma usada para comparar linhas entre páginas: números viram "#" e espaços são removidos."""
+    return _RE_ESPACOS.sub("", _RE_DIGITOS.sub("#", linha))
+
+
+def _padrao(normalizada: str) -> str:
+    """Converte um trecho normalizado em regex que casa com o texto original."""
+    partes = []
+    for caractere in normalizada:
+        partes.append(r"\d+" if caractere == "#" else re.escape(caractere))
+    return r"\s*".join(partes)
+
+
+class LimpadorPaginas:
+    """
+    Remove cabeçalhos, rodapés e numeração de página repetidos e desfaz a hifenização.
+
+    Para cada documento, as primeiras páginas servem de amostra: um trecho
+    que se repete na mesma posição (uma das LINHAS_BORDA primeiras ou
+    últimas linhas) em pelo menos PROPORCAO_REPETICAO das páginas é
+    considerado cabeçalho ou rodapé. Na comparação, números são ignorados,
+    de modo que "| 12" e "| 13" ou "44/89" e "45/89" contam como o mesmo
+    trecho. Além de linhas inteiras, remove trechos repetidos colados ao
+    início ou ao fim de uma linha de conteúdo, comuns em PDFs impressos do
+    navegador.
+
+    Palavras partidas no fim da linha são unidas; o hífen só é mantido se a
+    forma com hífen for a usada no documento (ex.: "carta-contrato").
+    """
+
+    def __init__(self, paginas_amostra: int = PAGINAS_AMOSTRA):
+        self.paginas_amostra = paginas_amostra
+
+    def limpar(self, paginas: Iterable[Document]) -> Iterator[Document]:
+        """
+        Limpa um fluxo de páginas, documento a documento.
+
+        Args:
+            paginas (Iterable[Document]): Páginas em ordem (arquivo, página), com metadado "source".
+
+        Yields:
+            Document: As páginas limpas, com os mesmos metadados.
+        """
+        for _, paginas_documento in groupby(paginas, key=lambda pagina: pagina.metadata["source"]):
+            paginas_documento = iter(paginas_documento)
+            amostra = list(islice(paginas_documento, self.paginas_amostra))
+            repetidos = _aprender_repetidos([pagina.page_content.splitlines() for pagina in amostra])
+            vocabulario = Counter()
+            for pagina in amostra:
+                vocabulario.update(_RE_PALAVRA.findall(pagina.page_content.lower()))
+
+            for pagina in amostra:
+                yield self._limpar_pagina(pagina, repetidos, vocabulario)
+            for pagina in paginas_documento:
+                vocabulario.update(_RE_PALAVRA.findall(pagina.page_content.lower()))
+                yield self._limpar_pagina(pagina, repetidos, vocabulario)
+
+    def _limpar_pagina(self, pagina: Document, repetidos: dict, vocabulario: Counter) -> Document:
+        linhas = _remover_repetidos(pagina.page_content.splitlines(), repetidos)
+        texto = desfazer_hifenizacao("\n".join(linhas), vocabulario)
+        return Document(page_content=texto, metadata=dict(pagina.metadata))
+
+
+def _posicoes_borda(linhas: list[str]) -> list[tuple[str, int]]:
+    """Posições ("topo", i) e ("rodape", i) das linhas não vazias nas bordas da página."""
+    indices = [i for i, linha in enumerate(linhas) if linha.strip()]
+    posicoes = {indice: ("topo", ordem) for ordem, indice in enumerate(indices[:LINHAS_BORDA])}
+    for ordem, indice in enumerate(reversed(indices[-LINHAS_BORDA:])):
+        posicoes.setdefault(indice, ("rodape", ordem))
+    return sorted((indice, posicao) for indice, posicao in posicoes.items())
+
+
+def _aprender_repetidos(paginas: list[list[str]]) -> dict:
+    """
+    Encontra os trechos repetidos em cada posição de borda.
+
+    Returns:
+        dict: posição -> {"linhas": normalizadas a remover inteiras,
+            "fragmentos": [regex de prefixos (topo) ou sufixos (rodapé)]}.
+    """
+    minimo = max(MINIMO_PAGINAS, PROPORCAO_REPETICAO * len(paginas))
+    if len(paginas) < MINIMO_PAGINAS:
+        return {}
+
+    linhas_por_posicao: dict[tuple, Counter] = {}
+    fragmentos_por_posicao: dict[tuple, Counter] = {}
+    for linhas in paginas:
+        for indice, posicao in _posicoes_borda(linhas):
+            normalizada = _normalizar_linha(linhas[indice])
+            linhas_por_posicao.setdefault(posicao, Counter())[normalizada] += 1
+            # Cada prefixo (no topo) ou sufixo (no rodapé) conta uma vez por página
+            if posicao[0] == "topo":
+                fragmentos = {normalizada[:n] for n in range(TAMANHO_MINIMO_FRAGMENTO, len(normalizada))}
+            else:
+                fragmentos = {normalizada[-n:] for n in range(TAMANHO_MINIMO_FRAGMENTO, len(normalizada))}
+            fragmentos_por_posicao.setdefault(posicao, Counter()).update(fragmentos)
+
+    repetidos = {}
+    for posicao, contagem in linhas_por_posicao.items():
+        linhas = {linha for linha, vezes in contagem.items() if vezes >= minimo}
+        frequentes = [f for f, vezes in fragmentos_por_posicao[posicao].items() if vezes >= minimo]
+        # Só os fragmentos maximais: os mais curtos contidos neles são redundantes
+        maximais = [f for f in frequentes
+                    if not any(len(g) > len(f) and (g.startswith(f) if posicao[0] == "topo" else g.endswith(f))
+                               for g in frequentes)]
+        if linhas or maximais:
+            fragmentos = [re.compile(("^" + _padrao(f)) if posicao[0] == "topo" else (_padrao(f) + r"\s*$"))
+                          for f in sorted(maximais, key=len, reverse=True)]
+            repetidos[posicao] = {"linhas": linhas, "fragmentos": fragmentos}
+    return repetidos
+
+
+def _remover_repetidos(linhas: list[str], repetidos: dict) -> list[str]:
+    """Remove das bordas da página as linhas e fragmentos aprendidos."""
+    if not repetidos:
+        return linhas
+    resultado: list[Optional[str]] = list(linhas)
+    for indice, posicao in _posicoes_borda(linhas):
+        regra = repetidos.get(posicao)
+        if regra is None:
+            continue
+        if _normalizar_linha(linhas[indice]) in regra["linhas"]:
+            resultado[indice] = None
+            continue
+        for fragmento in regra["fragmentos"]:
+            limpa, removidos = fragmento.subn("", linhas[indice], count=1)
+            if removidos:
+                resultado[indice] = limpa if limpa.strip() else None
+                break
+    return [linha for linha in resultado if linha is not None]
+
+
+def desfazer_hifenizacao(texto: str, vocabulario: Optional[Counter] = None) -> str:
+    """
+    Une palavras partidas por hífen no fim da linha.
+
+    Sem vocabulário, o hífen é sempre removido. Com o vocabulário do
+    documento, só é removido se a palavra unida aparecer nele mais vezes que
+    a forma composta; na dúvida, mantém o hífen, que é o erro menos grave
+    para a busca.
+    """
+    def unir(partes: re.Match) -> str:
+        inicio, fim = partes.group(1), partes.group(2)
+        if vocabulario is None or vocabulario[(inicio + fim).lower()] > vocabulario[f"{inicio}-{fim}".lower()]:
+            return inicio + fim
+        return f"{inicio}-{fim}"
+    return _RE_HIFENIZACAO.sub(unir, texto)
@@ -1,17 +1,1013 @@
 # processador_documentos.py
 import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import tempfile
+import multiprocessing
+from collections import deque, defaultdict
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import streamlit as st
+from pypdf import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
+from gerador_embeddings import AgendadorEmbeddings, EmbeddingsComCache, EmbeddingsLocais
+from indices_vetoriais import (
+    parametros_indice, indice_quantizado, criar_indice_faiss, ler_indice_faiss, gravar_indice_faiss,
+    remover_posicoes, reconstruir_vetores, vetores_para_criar_indice, tamanho_serializado, tamanho_mapeavel,
+    VetoresExatos,
+    TravaLeituraEscrita, trava_indice
+)
+from docstore_compacto import DocstoreCompacto
+from deduplicacao import LIMIAR_DUPLICATAS, IndiceDuplicatas, construir_indice_duplicatas
+from busca_hibrida import RetrieverHibrido, construir_indice_lexical, VERSAO_TOKENIZADOR
+from divisor_juridico import DivisorJuridico
+from limpeza_paginas import LimpadorPaginas
+from cache_paginas import CachePaginas, criar_cache_paginas
+from cache_recuperacao import RetrieverComCache, obter_cache_recuperacao
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
-# Configura a chave da API da OpenAI
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+# Backend de embeddings: "openai" (API) ou "local" (sentence-transformers em CPU, offline)
+BACKEND_EMBEDDINGS = os.getenv("ETP_BACKEND_EMBEDDINGS", "openai").lower()
+MODELOS_EMBEDDINGS_PADRAO = {
+    "openai": "text-embedding-ada-002",
+    "local": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+}
+if BACKEND_EMBEDDINGS not in MODELOS_EMBEDDINGS_PADRAO:
+    raise ValueError(f"Backend de embeddings não suportado: {BACKEND_EMBEDDINGS}.")
+
+# Estratégia de divisão em chunks: "estrutural" (alinhada a artigos, dispositivos e
+# seções, sem sobreposição) ou "recursiva" (tamanho fixo com sobreposição)
+ESTRATEGIA_CHUNKS = os.getenv("ETP_ESTRATEGIA_CHUNKS", "estrutural").lower()
+if ESTRATEGIA_CHUNKS not in ("estrutural", "recursiva"):
+    raise ValueError(f"Estratégia de chunks não suportada: {ESTRATEGIA_CHUNKS}.")
+
+# Remoção de cabeçalhos/rodapés repetidos e da hifenização antes da divisão em chunks
+LIMPEZA_PAGINAS = os.getenv("ETP_LIMPEZA_PAGINAS", "1") != "0"
+
+# Parâmetros do pipeline de indexação (fazem parte da chave do cache em disco)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200 if ESTRATEGIA_CHUNKS == "recursiva" else 0
+MODELO_EMBEDDINGS = os.getenv("ETP_MODELO_EMBEDDINGS", MODELOS_EMBEDDINGS_PADRAO[BACKEND_EMBEDDINGS])
+
+# Diretório onde os índices construídos são persistidos entre execuções
+DIRETORIO_INDICES = os.getenv("ETP_DIRETORIO_INDICES", "data/indices")
+# Índices mantidos por configuração: cada inclusão ou remoção de documento grava
+# um novo índice, e os mais antigos além deste limite são apagados (0 = manter todos)
+INDICES_MANTIDOS = int(os.getenv("ETP_INDICES_MANTIDOS", "3"))
+
+# Paralelismo da extração de texto dos PDFs (0 = um processo por núcleo)
+PROCESSOS_EXTRACAO = int(os.getenv("ETP_PROCESSOS_EXTRACAO", "0")) or os.cpu_count() or 1
+# Os processos de extração são iniciados do zero ("spawn"): a extração roda
+# dentro de servidores com várias threads, e um fork copiaria travas
+# mantidas por outras threads, podendo travar o processo filho
+CONTEXTO_PROCESSOS = multiprocessing.get_context("spawn")
+PAGINAS_POR_TAREFA = 25
+
+# Quantidade de chunks enviados juntos à etapa de embeddings no pipeline em fluxo
+TAMANHO_JANELA_EMBEDDINGS = 512
+
+# Busca híbrida (BM25 + vetorial); com "0", apenas a busca vetorial é usada
+BUSCA_HIBRIDA = os.getenv("ETP_BUSCA_HIBRIDA", "1") != "0"
+
+# Chunks candidatos retornados por consulta; o RAG escolhe entre eles os que
+# cabem no orçamento de tokens do prompt (ver empacotador_contexto)
+CHUNKS_POR_CONSULTA = int(os.getenv("ETP_CHUNKS_POR_CONSULTA", "8"))
+
+# Incrementar sempre que o formato do índice persistido mudar
+VERSAO_INDICE = 5
+
+# Quantidade de caracteres do hash usada como identificador de documento
+TAMANHO_ID_DOCUMENTO = 16
+
+# Com "0", o índice nunca é construído no caminho das requisições: apenas
+# índices pré-construídos (python construir_indice.py) são carregados
+CONSTRUIR_INDICE_SOB_DEMANDA = os.getenv("ETP_CONSTRUIR_INDICE_SOB_DEMANDA", "1") != "0"
+
+
+class Cronometro:
+    """
+    Acumula o tempo e a quantidade de itens de cada etapa do pipeline de indexação.
+
+    As medições podem ser aninhadas (inclusive através de geradores
+    consumidos dentro de outra etapa): o tempo de uma etapa interna é
+    descontado da etapa externa, de modo que cada etapa registra apenas o
+    tempo gasto nela mesma.
+    """
+
+    def __init__(self, relatar: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            relatar (Callable): Se informado, recebe mensagens de progresso da indexação.
+        """
+        self.tempos = defaultdict(float)
+        self.contagens = defaultdict(int)
+        self.relatar = relatar
+        self._pilha = []
+
+    def _iniciar(self, etapa: str) -> None:
+        agora = time.perf_counter()
+        if self._pilha:
+            self.tempos[self._pilha[-1][0]] += agora - self._pilha[-1][1]
+        self._pilha.append([etapa, agora])
+
+    def _encerrar(self) -> None:
+        agora = time.perf_counter()
+        etapa, inicio = self._pilha.pop()
+        self.tempos[etapa] += agora - inicio
+        if self._pilha:
+            self._pilha[-1][1] = agora
+
+    @contextmanager
+    def medir(self, etapa: str):
+        """Mede o bloco como parte da etapa."""
+        self._iniciar(etapa)
+        try:
+            yield
+        finally:
+            self._encerrar()
+
+    def iterar(self, etapa: str, itens: Iterable) -> Iterator:
+        """Repassa os itens, atribuindo à etapa o tempo gasto para produzi-los e contando-os."""
+        iterador = iter(itens)
+        while True:
+            self._iniciar(etapa)
+            try:
+                item = next(iterador)
+            except StopIteration:
+                return
+            finally:
+                self._encerrar()
+            self.contagens[etapa] += 1
+            yield item
+
+    def contar(self, etapa: str, quantidade: int) -> None:
+        self.contagens[etapa] += quantidade
+
+    def progresso(self, mensagem: str) -> None:
+        if self.relatar is not None:
+            self.relatar(mensagem)
+
+
+def calcular_hash_arquivo(caminho: str, tamanho_bloco: int = 1 << 20) -> str:
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo, lendo-o em blocos.
+
+    Args:
+        caminho (str): Caminho do arquivo.
+        tamanho_bloco (int): Tamanho de cada leitura em bytes.
+
+    Returns:
+        str: O hash hexadecimal do conteúdo.
+    """
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def configuracao_indice() -> dict:
+    """Retorna os parâmetros que determinam o conteúdo do índice (parte da chave do cache)."""
+    return {
+        "versao": VERSAO_INDICE,
+        "estrategia_chunks": ESTRATEGIA_CHUNKS,
+        "limpeza_paginas": LIMPEZA_PAGINAS,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "modelo_embeddings": MODELO_EMBEDDINGS,
+        "limiar_duplicatas": LIMIAR_DUPLICATAS,
+        "indice": parametros_indice(),
+    }
+
+
+def calcular_chave_indice(hashes_pdf: list[str], configuracao: dict) -> str:
+    """
+    Deriva a chave do índice persistido a partir do conteúdo e dos parâmetros.
+
+    A chave muda sempre que qualquer PDF muda de conteúdo, quando um PDF é
+    adicionado ou removido, ou quando qualquer parâmetro da configuração
+    (chunking, modelo de embeddings, tipo de índice) é alterado. A ordem dos
+    arquivos não influencia a chave.
+
+    Args:
+        hashes_pdf (list[str]): Hashes SHA-256 do conteúdo de cada PDF.
+        configuracao (dict): Parâmetros do pipeline, ver configuracao_indice().
+
+    Returns:
+        str: A chave hexadecimal do índice.
+    """
+    descricao = json.dumps({"pdfs": sorted(hashes_pdf), **configuracao}, sort_keys=True)
+    return hashlib.sha256(descricao.encode("utf-8")).hexdigest()
+
+
+def calcular_id_documento(hash_documento: str) -> str:
+    """Retorna o identificador estável de um documento a partir do hash do seu conteúdo."""
+    return hash_documento[:TAMANHO_ID_DOCUMENTO]
+
+
+def criar_embeddings():
+    """
+    Cria o provedor de embeddings usado na construção e na consulta do índice.
+
+    Com o backend "openai", as chamadas passam pelo AgendadorEmbeddings, que
+    envia os chunks em lotes concorrentes dentro dos limites de taxa
+    configurados. Com o backend "local", os embeddings são calculados em CPU,
+    sem rede nem chave de API. Em ambos os casos o cache persistente de
+    embeddings garante que apenas chunks com texto inédito sejam calculados.
+    """
+    if BACKEND_EMBEDDINGS == "local":
+        return EmbeddingsComCache(EmbeddingsLocais(MODELO_EMBEDDINGS), MODELO_EMBEDDINGS)
+
+    agendador = AgendadorEmbeddings(OpenAIEmbeddings(model=MODELO_EMBEDDINGS))
+    return EmbeddingsComCache(agendador, MODELO_EMBEDDINGS)
+
+
+def _carregar_indice_persistido(diretorio: str, embeddings, mmap: bool = True):
+    """
+    Carrega um índice FAISS persistido, ou retorna None se não existir ou estiver corrompido.
+
+    Com mmap=True o índice é mapeado em memória (ver ler_indice_faiss) e fica
+    somente leitura; antes de alterá-lo, use _garantir_gravavel(). O docstore
+    é sempre mapeado, já que nunca é alterado no lugar.
+    """
+    if not os.path.exists(os.path.join(diretorio, "manifesto.json")):
+        return None
+    try:
+        indice = ler_indice_faiss(os.path.join(diretorio, "index.faiss"), mmap=mmap)
+        docstore = DocstoreCompacto.carregar(os.path.join(diretorio, "docstore"))
+        # O docstore é gravado na ordem das posições do índice
+        index_to_docstore_id = dict(enumerate(docstore.ids()))
+    except Exception as e:
+        st.warning(f"Índice em cache inválido em {diretorio}, será reconstruído: {e}")
+        return None
+
+    indice_vetorial = FAISS(embeddings, indice, docstore, index_to_docstore_id)
+    indice_vetorial.diretorio_mapeado = diretorio if mmap else None
+    indice_vetorial.indice_lexical = _carregar_indice_lexical(diretorio, indice_vetorial)
+    indice_vetorial.indice_duplicatas = _carregar_indice_duplicatas(diretorio, indice_vetorial)
+    caminho_vetores = os.path.join(diretorio, "vetores.npy")
+    indice_vetorial.vetores_exatos = (VetoresExatos.carregar(caminho_vetores, mmap=mmap)
+                                      if os.path.exists(caminho_vetores) else None)
+    return indice_vetorial
+
+
+def _carregar_indice_lexical(diretorio: str, indice_vetorial):
+    """
+    Lê o índice lexical persistido ao lado do vetorial, reconstruindo-o a
+    partir do docstore se faltar ou se tiver sido gerado por outra versão do
+    tokenizador.
+    """
+    try:
+        with open(os.path.join(diretorio, "lexical.pkl"), "rb") as f:
+            indice_lexical = pickle.load(f)
+    except Exception:
+        return construir_indice_lexical(indice_vetorial)
+    if getattr(indice_lexical, "versao", None) != VERSAO_TOKENIZADOR:
+        return construir_indice_lexical(indice_vetorial)
+    return indice_lexical
+
+
+def _carregar_indice_duplicatas(diretorio: str, indice_vetorial):
+    """Lê o índice de duplicatas persistido, recalculando as assinaturas a partir do docstore se faltar."""
+    if LIMIAR_DUPLICATAS <= 0:
+        return None
+    try:
+        with open(os.path.join(diretorio, "duplicatas.pkl"), "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return construir_indice_duplicatas(indice_vetorial)
+
+
+def _garantir_gravavel(indice_vetorial) -> None:
+    """Substitui um índice mapeado em memória (somente leitura) por uma cópia alterável."""
+    diretorio = getattr(indice_vetorial, "diretorio_mapeado", None)
+    if diretorio:
+        indice = ler_indice_faiss(os.path.join(diretorio, "index.faiss"), mmap=False)
+        with trava_indice(indice_vetorial).escrita():
+            indice_vetorial.index = indice
+            indice_vetorial.diretorio_mapeado = None
+
+
+def _criar_indice_de_lotes(lotes: list[tuple], embeddings, duplicatas: Optional[IndiceDuplicatas] = None):
+    """Monta um novo índice do tipo configurado a partir de lotes (textos, vetores, metadados, ids)."""
+    vetores = np.array([vetor for lote in lotes for vetor in lote[1]], dtype=np.float32)
+    indice_vetorial = FAISS(embeddings, criar_indice_faiss(vetores), DocstoreCompacto(), {})
+    indice_vetorial.indice_lexical = construir_indice_lexical(indice_vetorial)
+    indice_vetorial.indice_duplicatas = duplicatas
+    # Índices quantizados guardam os vetores originais à parte, para o reranqueamento
+    indice_vetorial.vetores_exatos = VetoresExatos() if indice_quantizado() else None
+    for lote in lotes:
+        _adicionar_lote(indice_vetorial, *lote)
+    return indice_vetorial
+
+
+def _adicionar_lote(indice_vetorial, textos: list[str], vetores: list, metadados: list[dict], ids: list[str]) -> None:
+    """Adiciona um lote de chunks já com embeddings aos índices vetorial e lexical."""
+    with trava_indice(indice_vetorial).escrita():
+        indice_vetorial.add_embeddings(zip(textos, vetores), metadados, ids=ids)
+        indice_vetorial.indice_lexical.adicionar(ids, textos)
+        if indice_vetorial.vetores_exatos is not None:
+            indice_vetorial.vetores_exatos.adicionar(vetores)
+        _marcar_alterado(indice_vetorial)
+
+
+def _marcar_alterado(indice_vetorial) -> None:
+    """Avança a geração do índice, invalidando os resultados de consultas em cache."""
+    indice_vetorial.geracao = getattr(indice_vetorial, "geracao", 0) + 1
+
+
+def _indexar_em_janelas(chunks: Iterable[tuple[Document, str]], embeddings, indice_vetorial=None,
+                        cronometro: Optional[Cronometro] = None):
+    """
+    Gera embeddings e indexa um fluxo de (chunk, id) em janelas de tamanho fixo.
+
+    Cada janela de TAMANHO_JANELA_EMBEDDINGS chunks é enviada aos embeddings e
+    adicionada ao índice antes da próxima ser consumida, de modo que a memória
+    intermediária do pipeline não depende do tamanho do corpus. Sem índice
+    base, o índice é criado assim que houver vetores suficientes para o seu
+    tipo (um único lote, ou a amostra de treino do IVF).
+
+    Antes dos embeddings, chunks quase idênticos a um já indexado são
+    descartados e registrados como ocorrências dele (ver IndiceDuplicatas).
+
+    Returns:
+        FAISS | None: O índice atualizado (ou criado), ou None se o fluxo estava vazio.
+    """
+    cronometro = cronometro or Cronometro()
+    trava = None
+    if indice_vetorial is not None:
+        duplicatas = getattr(indice_vetorial, "indice_duplicatas", None)
+        trava = trava_indice(indice_vetorial)
+    else:
+        duplicatas = IndiceDuplicatas() if LIMIAR_DUPLICATAS > 0 else None
+    if duplicatas is not None:
+        chunks = cronometro.iterar("deduplicacao", _descartar_duplicatas(chunks, duplicatas, cronometro, trava))
+
+    pendentes, total_pendente, total_indexado = [], 0, 0
+    for janela in _em_janelas(chunks, TAMANHO_JANELA_EMBEDDINGS):
+        textos = [chunk.page_content for chunk, _ in janela]
+        with cronometro.medir("embeddings"):
+            vetores = embeddings.embed_documents(textos)
+        cronometro.contar("embeddings", len(textos))
+        lote = (textos, vetores, [chunk.metadata for chunk, _ in janela], [id_chunk for _, id_chunk in janela])
+
+        if indice_vetorial is not None:
+            _adicionar_lote(indice_vetorial, *lote)
+        else:
+            pendentes.append(lote)
+            total_pendente += len(textos)
+            if total_pendente >= vetores_para_criar_indice():
+                indice_vetorial = _criar_indice_de_lotes(pendentes, embeddings, duplicatas)
+                pendentes = []
+
+        total_indexado += len(textos)
+        cronometro.progresso(f"{total_indexado} chunks processados")
+
+    if indice_vetorial is None and pendentes:
+        indice_vetorial = _criar_indice_de_lotes(pendentes, embeddings, duplicatas)
+    return indice_vetorial
+
+
+def _descartar_duplicatas(chunks: Iterable[tuple[Document, str]], duplicatas: IndiceDuplicatas,
+                          cronometro: Cronometro,
+                          trava: Optional[TravaLeituraEscrita] = None) -> Iterator[tuple[Document, str]]:
+    """
+    Repassa apenas os chunks que não são quase idênticos a um representante já registrado.
+
+    Com a trava de um índice em uso, o índice de duplicatas só é alterado sob ela.
+    """
+    for chunk, id_chunk in chunks:
+        assinatura = duplicatas.assinatura(chunk.page_content)
+        with trava.escrita() if trava is not None else nullcontext():
+            id_representante = duplicatas.procurar(assinatura)
+            if id_representante is None:
+                duplicatas.registrar(id_chunk, assinatura)
+            else:
+                duplicatas.adicionar_ocorrencia(id_representante, id_chunk, chunk.metadata)
+        if id_representante is None:
+            yield chunk, id_chunk
+        else:
+            cronometro.contar("duplicatas", 1)
+
+
+def _em_janelas(itens: Iterable, tamanho: int) -> Iterator[list]:
+    """Agrupa um iterável em listas de até `tamanho` itens, sem materializá-lo."""
+    iterador = iter(itens)
+    while janela := list(islice(iterador, tamanho)):
+        yield janela
+
+
+# Arquivos que não fazem parte do índice, mas o acompanham quando ele é regravado
+# (o relatório de construir_indice.py)
+ARQUIVOS_PRESERVADOS = ("construcao.json",)
+
+
+def _persistir_indice(indice_vetorial, diretorio: str, manifesto: dict) -> None:
+    """
+    Salva o índice (vetores + docstore + índices auxiliares) e o manifesto de forma atômica.
+
+    Os chunks do docstore são gravados na ordem das posições do índice, o que
+    permite reconstruir o index_to_docstore_id sem gravá-lo à parte.
+
+    O índice é gravado em um diretório temporário e renomeado ao final, de modo
+    que processos concorrentes nunca enxerguem um índice pela metade. O
+    manifesto é gravado por último e marca o índice como completo. Falhas de
+    gravação são propagadas, sem deixar o diretório temporário para trás.
+    Os arquivos de ARQUIVOS_PRESERVADOS do índice anterior são copiados para
+    o novo.
+    """
+    os.makedirs(os.path.dirname(diretorio) or ".", exist_ok=True)
+    diretorio_temp = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(diretorio) or ".")
+    try:
+        gravar_indice_faiss(indice_vetorial.index, os.path.join(diretorio_temp, "index.faiss"))
+        ids_por_posicao = [id_chunk for _, id_chunk in sorted(indice_vetorial.index_to_docstore_id.items())]
+        indice_vetorial.docstore.salvar(os.path.join(diretorio_temp, "docstore"), ids_por_posicao)
+        with open(os.path.join(diretorio_temp, "lexical.pkl"), "wb") as f:
+            pickle.dump(indice_vetorial.indice_lexical, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if getattr(indice_vetorial, "indice_duplicatas", None) is not None:
+            with open(os.path.join(diretorio_temp, "duplicatas.pkl"), "wb") as f:
+                pickle.dump(indice_vetorial.indice_duplicatas, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if indice_vetorial.vetores_exatos is not None:
+            indice_vetorial.vetores_exatos.salvar(os.path.join(diretorio_temp, "vetores.npy"))
+        for nome in ARQUIVOS_PRESERVADOS:
+            if os.path.exists(os.path.join(diretorio, nome)):
+                shutil.copy2(os.path.join(diretorio, nome), os.path.join(diretorio_temp, nome))
+        with open(os.path.join(diretorio_temp, "manifesto.json"), "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+        _publicar_diretorio(diretorio_temp, diretorio)
+    except BaseException:
+        shutil.rmtree(diretorio_temp, ignore_errors=True)
+        raise
+
+
+def _publicar_diretorio(diretorio_temp: str, diretorio: str) -> None:
+    """
+    Coloca o diretório temporário no lugar do definitivo.
+
+    Um índice anterior com a mesma chave é primeiro renomeado para o lado e
+    só apagado depois que o novo está no lugar; se a troca falhar, ele é
+    restaurado. Assim o índice nunca deixa de existir em disco.
+    """
+    antigo = None
+    if os.path.exists(diretorio):
+        antigo = tempfile.mkdtemp(prefix=".antigo-", dir=os.path.dirname(diretorio) or ".")
+        os.replace(diretorio, os.path.join(antigo, "indice"))
+    try:
+        os.replace(diretorio_temp, diretorio)
+    except OSError:
+        publicado = os.path.exists(os.path.join(diretorio, "manifesto.json"))
+        if antigo is not None and not publicado:
+            os.replace(os.path.join(antigo, "indice"), diretorio)
+            shutil.rmtree(antigo, ignore_errors=True)
+        if not publicado:
+            raise
+        # Outro processo publicou o mesmo índice primeiro; o dele é equivalente
+        shutil.rmtree(diretorio_temp, ignore_errors=True)
+    if antigo is not None:
+        shutil.rmtree(antigo, ignore_errors=True)
+
+
+def _ler_manifestos() -> list[tuple[str, dict]]:
+    """Lista (diretório, manifesto) de todos os índices persistidos compatíveis com a configuração atual."""
+    if not os.path.isdir(DIRETORIO_INDICES):
+        return []
+
+    manifestos = []
+    for nome in os.listdir(DIRETORIO_INDICES):
+        caminho_manifesto = os.path.join(DIRETORIO_INDICES, nome, "manifesto.json")
+        if nome.startswith(".") or not os.path.exists(caminho_manifesto):
+            continue
+        try:
+            with open(caminho_manifesto, encoding="utf-8") as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if manifesto.get("configuracao") == configuracao_indice():
+            manifestos.append((os.path.join(DIRETORIO_INDICES, nome), manifesto))
+    return manifestos
+
+
+def _carregar_indice_mais_proximo(hashes_desejados: set[str], embeddings):
+    """
+    Carrega o índice persistido que compartilha mais documentos com o conjunto desejado.
+
+    Serve de ponto de partida para a atualização incremental: a partir dele só
+    é preciso remover os documentos excedentes e adicionar os que faltam.
+
+    Returns:
+        FAISS | None: O índice base, ou None se nenhum índice compartilhar documentos.
+    """
+    melhor_diretorio, melhor_custo = None, None
+    for diretorio, manifesto in _ler_manifestos():
+        hashes = {doc["hash"] for doc in manifesto.get("documentos", {}).values()}
+        if not hashes & hashes_desejados:
+            continue
+        # Custo = documentos a remover + documentos a adicionar
+        custo = len(hashes - hashes_desejados) + len(hashes_desejados - hashes)
+        if melhor_custo is None or custo < melhor_custo:
+            melhor_diretorio, melhor_custo = diretorio, custo
+
+    if melhor_diretorio is None:
+        return None
+    return _carregar_indice_persistido(melhor_diretorio, embeddings, mmap=False)
+
+
+def _extrair_intervalo_paginas(caminho_pdf: str, inicio: int, fim: int) -> list[str]:
+    """Extrai o texto das páginas [inicio, fim) de um PDF. Executada nos processos de extração."""
+    leitor = PdfReader(caminho_pdf)
+    return [leitor.pages[numero].extract_text() for numero in range(inicio, fim)]
+
+
+def _executar_tarefa_extracao(tarefa: tuple[str, int, int]) -> tuple[list[str], str]:
+    """Executa uma tarefa de extração, devolvendo (textos, erro) em vez de propagar exceções."""
+    try:
+        return _extrair_intervalo_paginas(*tarefa), ""
+    except Exception as e:
+        return [], str(e)
+
+
+def _tarefas_extracao(caminhos_pdf: list[str], falhas: set[str]) -> list[tuple[str, int, int]]:
+    """Divide cada PDF em intervalos de até PAGINAS_POR_TAREFA páginas (caminho, inicio, fim)."""
+    tarefas = []
+    for caminho_pdf in caminhos_pdf:
+        try:
+            total_paginas = len(PdfReader(caminho_pdf).pages)
+        except Exception as e:
+            st.error(f"Erro ao carregar o arquivo {caminho_pdf}: {e}")
+            falhas.add(caminho_pdf)
+            continue
+        for inicio in range(0, total_paginas, PAGINAS_POR_TAREFA):
+            tarefas.append((caminho_pdf, inicio, min(inicio + PAGINAS_POR_TAREFA, total_paginas)))
+    return tarefas
+
+
+def _paginas_da_tarefa(tarefa: tuple[str, int, int], resultado: tuple[list[str], str],
+                       falhas: set[str]) -> Iterator[Document]:
+    """Converte o resultado de uma tarefa de extração em Documents, registrando falhas."""
+    caminho_pdf, inicio, _ = tarefa
+    textos, erro = resultado
+    if erro:
+        if caminho_pdf not in falhas:
+            st.error(f"Erro ao carregar o arquivo {caminho_pdf}: {erro}")
+        falhas.add(caminho_pdf)
+    if caminho_pdf in falhas:
+        return
+    for deslocamento, texto in enumerate(textos):
+        yield Document(page_content=texto, metadata={"source": caminho_pdf, "page": inicio + deslocamento})
+
+
+def iterar_paginas_pdfs(caminhos_pdf: list[str], falhas: Optional[set[str]] = None,
+                        hashes_pdf: Optional[dict[str, str]] = None) -> Iterator[Document]:
+    """
+    Extrai as páginas de vários PDFs em paralelo e as entrega em fluxo, em ordem.
+
+    Com os hashes dos PDFs, o texto de cada documento já extraído antes é
+    lido do CachePaginas, sem abrir o PDF, e os documentos extraídos agora
+    são gravados nele.
+
+    Cada PDF é dividido em intervalos de até PAGINAS_POR_TAREFA páginas, e cada
+    intervalo é uma tarefa independente em um pool de processos, de modo que
+    tanto vários arquivos quanto um único arquivo grande aproveitam todos os
+    núcleos. No máximo 2 tarefas por processo ficam em andamento, e as páginas
+    são entregues na ordem original (arquivo, página) assim que o seu
+    intervalo termina, sem esperar pelos demais arquivos.
+
+    Args:
+        caminhos_pdf (list[str]): Caminhos dos PDFs.
+        falhas (set[str]): Se informado, recebe os caminhos dos PDFs que não
+            puderam ser lidos. Páginas de um PDF que falhou no meio podem já
+            ter sido entregues; cabe a quem consome descartá-las.
+        hashes_pdf (dict): Mapeamento caminho do PDF -> hash do conteúdo, para o cache de páginas.
+
+    Yields:
+        Document: Uma página, no mesmo formato produzido pelo PyPDFLoader.
+    """
+    falhas = set() if falhas is None else falhas
+    cache = criar_cache_paginas() if hashes_pdf else None
+    if cache is None:
+        yield from _extrair_paginas(caminhos_pdf, falhas)
+        return
+
+    # PDFs consecutivos fora do cache são extraídos juntos, no mesmo pool
+    pendentes = []
+    for caminho_pdf in caminhos_pdf:
+        textos = cache.ler(hashes_pdf[caminho_pdf])
+        if textos is None:
+            pendentes.append(caminho_pdf)
+            continue
+        yield from _extrair_e_guardar(pendentes, falhas, cache, hashes_pdf)
+        pendentes = []
+        for numero, texto in enumerate(textos):
+            yield Document(page_content=texto, metadata={"source": caminho_pdf, "page": numero})
+    yield from _extrair_e_guardar(pendentes, falhas, cache, hashes_pdf)
+
+
+def _extrair_e_guardar(caminhos_pdf: list[str], falhas: set[str], cache: CachePaginas,
+                       hashes_pdf: dict[str, str]) -> Iterator[Document]:
+    """Extrai as páginas dos PDFs e grava no cache cada documento extraído por completo."""
+    atual, textos = None, []
+    for pagina in _extrair_paginas(caminhos_pdf, falhas):
+        if pagina.metadata["source"] != atual:
+            if atual is not None and atual not in falhas:
+                cache.salvar(hashes_pdf[atual], textos)
+            atual, textos = pagina.metadata["source"], []
+        textos.append(pagina.page_content)
+        yield pagina
+    if atual is not None and atual not in falhas:
+        cache.salvar(hashes_pdf[atual], textos)
+
+
+def _extrair_paginas(caminhos_pdf: list[str], falhas: set[str]) -> Iterator[Document]:
+    """Extrai as páginas dos PDFs no pool de processos (ver iterar_paginas_pdfs())."""
+    tarefas = _tarefas_extracao(caminhos_pdf, falhas)
+
+    if len(tarefas) <= 1 or PROCESSOS_EXTRACAO <= 1:
+        for tarefa in tarefas:
+            yield from _paginas_da_tarefa(tarefa, _executar_tarefa_extracao(tarefa), falhas)
+        return
+
+    max_em_andamento = 2 * PROCESSOS_EXTRACAO
+    with ProcessPoolExecutor(max_workers=min(PROCESSOS_EXTRACAO, len(tarefas)),
+                             mp_context=CONTEXTO_PROCESSOS) as executor:
+        em_andamento = deque()
+        for tarefa in tarefas:
+            em_andamento.append((tarefa, executor.submit(_executar_tarefa_extracao, tarefa)))
+            if len(em_andamento) >= max_em_andamento:
+                tarefa_pronta, futuro = em_andamento.popleft()
+                yield from _paginas_da_tarefa(tarefa_pronta, futuro.result(), falhas)
+        while em_andamento:
+            tarefa_pronta, futuro = em_andamento.popleft()
+            yield from _paginas_da_tarefa(tarefa_pronta, futuro.result(), falhas)
+
+
+def limpar_paginas(paginas: Iterable[Document]) -> Iterable[Document]:
+    """
+    Remove cabeçalhos, rodapés e numeração repetidos e desfaz a hifenização das páginas.
+
+    Cada documento é limpo a partir dos padrões aprendidos nas suas
+    próprias páginas (ver LimpadorPaginas). Desativada com
+    ETP_LIMPEZA_PAGINAS=0, devolve as páginas como extraídas.
+    """
+    if not LIMPEZA_PAGINAS:
+        return paginas
+    return LimpadorPaginas().limpar(paginas)
+
+
+def iterar_chunks(paginas: Iterable[Document], hashes_pdf: dict[str, str]) -> Iterator[tuple[Document, str]]:
+    """
+    Divide um fluxo de páginas em chunks identificados pelo documento de origem.
+
+    Com a estratégia "estrutural", os chunks seguem a estrutura do texto
+    (ver DivisorJuridico) e podem atravessar páginas; com a "recursiva",
+    cada página é dividida em pedaços de tamanho fixo com sobreposição.
+
+    Args:
+        paginas (Iterable[Document]): Páginas em ordem, com metadado "source".
+        hashes_pdf (dict): Mapeamento caminho do PDF -> hash do conteúdo.
+
+    Yields:
+        tuple: (chunk, id) onde o id tem a forma "<id_documento>:<n>".
+    """
+    if ESTRATEGIA_CHUNKS == "estrutural":
+        chunks = DivisorJuridico(CHUNK_SIZE).dividir(paginas)
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
+        )
+        chunks = (chunk for pagina in paginas for chunk in text_splitter.split_documents([pagina]))
+
+    contadores = {}
+    for chunk in chunks:
+        hash_documento = hashes_pdf[chunk.metadata["source"]]
+        id_documento = calcular_id_documento(hash_documento)
+        chunk.metadata["id_documento"] = id_documento
+        chunk.metadata["hash_documento"] = hash_documento
+        numero = contadores.get(id_documento, 0)
+        contadores[id_documento] = numero + 1
+        yield chunk, f"{id_documento}:{numero}"
+
+
+def listar_documentos(indice_vetorial) -> dict[str, dict]:
+    """
+    Lista os documentos presentes em um índice vetorial.
+
+    Args:
+        indice_vetorial (FAISS): O índice vetorial.
+
+    Returns:
+        dict: Mapeamento id_documento -> {"arquivo", "hash", "total_chunks"}.
+            Chunks descartados como duplicatas contam para o seu documento.
+    """
+    with trava_indice(indice_vetorial).leitura():
+        return _listar_documentos(indice_vetorial)
+
+
+def _listar_documentos(indice_vetorial) -> dict[str, dict]:
+    duplicatas = getattr(indice_vetorial, "indice_duplicatas", None)
+    ocorrencias = [local for locais in duplicatas.ocorrencias.values() for local in locais] if duplicatas else []
+    chunks = [(id_chunk, None) for id_chunk in indice_vetorial.index_to_docstore_id.values()]
+    chunks += [(local["id"], local) for local in ocorrencias]
+
+    documentos = {}
+    for id_chunk, metadados in chunks:
+        id_documento = id_chunk.split(":", 1)[0]
+        if id_documento not in documentos:
+            metadados = metadados or indice_vetorial.docstore.search(id_chunk).metadata
+            documentos[id_documento] = {
+                "arquivo": os.path.basename(metadados.get("source", "")),
+                "hash": metadados.get("hash_documento", ""),
+                "total_chunks": 0,
+            }
+        documentos[id_documento]["total_chunks"] += 1
+    return documentos
+
+
+def adicionar_documento(indice_vetorial, caminho_pdf: str) -> str:
+    """
+    Adiciona os chunks de um PDF a um índice existente, sem tocar nos demais.
+
+    Se o documento (mesmo conteúdo) já estiver no índice, nada é feito.
+
+    Args:
+        indice_vetorial (FAISS): O índice vetorial a ser atualizado.
+        caminho_pdf (str): Caminho do PDF a adicionar.
+
+    Returns:
+        str: O id do documento adicionado.
+    """
+    hash_documento = calcular_hash_arquivo(caminho_pdf)
+    id_documento = calcular_id_documento(hash_documento)
+    if id_documento in listar_documentos(indice_vetorial):
+        return id_documento
+
+    _garantir_gravavel(indice_vetorial)
+    falhas = set()
+    paginas = limpar_paginas(iterar_paginas_pdfs([caminho_pdf], falhas, {caminho_pdf: hash_documento}))
+    chunks = iterar_chunks(paginas, {caminho_pdf: hash_documento})
+    _indexar_em_janelas(chunks, indice_vetorial.embeddings, indice_vetorial)
+    _descartar_indices_em_cache()
+    if falhas:
+        remover_documento(indice_vetorial, id_documento)
+        raise ValueError(f"Não foi possível extrair o texto de {caminho_pdf}")
+    return id_documento
+
+
+def remover_documento(indice_vetorial, id_documento: str) -> int:
+    """
+    Remove todos os chunks de um documento do índice, sem tocar nos demais.
+
+    Args:
+        indice_vetorial (FAISS): O índice vetorial a ser atualizado.
+        id_documento (str): O id do documento a remover.
+
+    Trechos do documento que também aparecem em outros documentos (ver
+    IndiceDuplicatas) continuam no índice, atribuídos a uma das outras
+    ocorrências e reaproveitando o mesmo vetor. Buscas em andamento terminam
+    antes da remoção, e as novas esperam por ela.
+
+    Returns:
+        int: Quantidade de chunks removidos.
+    """
+    with trava_indice(indice_vetorial).escrita():
+        removidos = _remover_documento(indice_vetorial, id_documento)
+    if removidos:
+        _descartar_indices_em_cache()
+    return removidos
+
+
+def _descartar_indices_em_cache() -> None:
+    """
+    Esquece os índices guardados em cache por criar_indice_vetorial.
+
+    O índice alterado pode ser o mesmo objeto que o cache devolve para a sua
+    lista de PDFs; sem isso, a próxima chamada com essa lista receberia o
+    índice alterado em vez do construído a partir dela. As chamadas
+    seguintes carregam de novo o índice persistido de cada lista.
+    """
+    criar_indice_vetorial.clear()
+
+
+def _remover_documento(indice_vetorial, id_documento: str) -> int:
+    prefixo = f"{id_documento}:"
+    posicoes = [posicao for posicao, id_chunk in indice_vetorial.index_to_docstore_id.items()
+                if id_chunk.startswith(prefixo)]
+    duplicatas = getattr(indice_vetorial, "indice_duplicatas", None)
+    ids_ocorrencias = ([id_chunk for id_chunk in duplicatas.ids_ocorrencias() if id_chunk.startswith(prefixo)]
+                       if duplicatas is not None else [])
+    if not posicoes and not ids_ocorrencias:
+        return 0
+
+    _garantir_gravavel(indice_vetorial)
+    ids_removidos = [indice_vetorial.index_to_docstore_id[p] for p in posicoes]
+    vetores_exatos = indice_vetorial.vetores_exatos
+    promocoes = None
+    if duplicatas is not None:
+        orfaos = duplicatas.remover(ids_removidos + ids_ocorrencias)
+        promocoes = _preparar_promocoes(indice_vetorial, orfaos, dict(zip(ids_removidos, posicoes)))
+    _marcar_alterado(indice_vetorial)
+
+    if posicoes:
+        indice_vetorial.index = remover_posicoes(indice_vetorial.index, posicoes,
+                                                 vetores_exatos.matriz if vetores_exatos is not None else None)
+        if vetores_exatos is not None:
+            vetores_exatos.remover(posicoes)
+        indice_vetorial.docstore.delete(ids_removidos)
+        indice_vetorial.indice_lexical.remover(ids_removidos)
+
+        removidas = set(posicoes)
+        restantes = [id_chunk for posicao, id_chunk in sorted(indice_vetorial.index_to_docstore_id.items())
+                     if posicao not in removidas]
+        indice_vetorial.index_to_docstore_id = dict(enumerate(restantes))
+
+    if promocoes is not None:
+        lote, assinaturas, ocorrencias = promocoes
+        _adicionar_lote(indice_vetorial, *lote)
+        for id_chunk, assinatura, locais in zip(lote[3], assinaturas, ocorrencias):
+            duplicatas.registrar(id_chunk, assinatura)
+            if locais:
+                duplicatas.ocorrencias[id_chunk] = locais
+    return len(posicoes) + len(ids_ocorrencias)
+
+
+def _preparar_promocoes(indice_vetorial, orfaos: dict, posicao_por_id: dict[str, int]) -> Optional[tuple]:
+    """
+    Prepara a substituição de representantes removidos por uma de suas ocorrências restantes.
+
+    Deve ser chamada antes da remoção dos vetores: a ocorrência promovida
+    herda o texto e o vetor do representante, com os próprios metadados.
+
+    Returns:
+        tuple | None: (lote para _adicionar_lote, assinaturas, ocorrências
+            restantes de cada promovido), ou None se não houver o que promover.
+    """
+    if not orfaos:
+        return None
+    ids_orfaos = list(orfaos)
+    vetores_exatos = indice_vetorial.vetores_exatos
+    vetores = reconstruir_vetores(indice_vetorial.index, [posicao_por_id[i] for i in ids_orfaos],
+                                  vetores_exatos.matriz if vetores_exatos is not None else None)
+    textos, metadados, ids, assinaturas, ocorrencias = [], [], [], [], []
+    for id_orfao in ids_orfaos:
+        assinatura, locais = orfaos[id_orfao]
+        promovido = dict(locais[0])
+        ids.append(promovido.pop("id"))
+        metadados.append(promovido)
+        textos.append(indice_vetorial.docstore.search(id_orfao).page_content)
+        assinaturas.append(assinatura)
+        ocorrencias.append(locais[1:])
+    return (textos, list(vetores), metadados, ids), assinaturas, ocorrencias
+
+
+def salvar_indice(indice_vetorial) -> str:
+    """
+    Persiste o índice no diretório de cache, sob a chave do seu conjunto de documentos.
+
+    Args:
+        indice_vetorial (FAISS): O índice vetorial.
+
+    Returns:
+        str: A chave sob a qual o índice foi salvo.
+    """
+    _garantir_gravavel(indice_vetorial)
+    # Buscas continuam durante a gravação; alterações esperam por ela
+    with trava_indice(indice_vetorial).leitura():
+        documentos = _listar_documentos(indice_vetorial)
+        configuracao = configuracao_indice()
+        chave = calcular_chave_indice([doc["hash"] for doc in documentos.values()], configuracao)
+        _persistir_indice(indice_vetorial, os.path.join(DIRETORIO_INDICES, chave), {
+            "configuracao": configuracao,
+            "documentos": documentos,
+            "total_chunks": len(indice_vetorial.index_to_docstore_id),
+            "memoria_por_mil_chunks": relatorio_memoria(indice_vetorial),
+        })
+    _remover_indices_antigos(chave)
+    return chave
+
+
+def _remover_indices_antigos(chave_atual: str, mantidos: int = INDICES_MANTIDOS) -> list[str]:
+    """
+    Apaga os índices da configuração atual além dos `mantidos` gravados por último.
+
+    O índice recém-salvo nunca é apagado. Cada índice é renomeado antes de
+    ser apagado, para que nenhum processo o encontre pela metade; processos
+    que já o mapearam em memória continuam lendo os arquivos até fechá-los.
+
+    Returns:
+        list[str]: As chaves dos índices apagados.
+    """
+    if mantidos <= 0:
+        return []
+    diretorio_atual = os.path.join(DIRETORIO_INDICES, chave_atual)
+    antigos = sorted((diretorio for diretorio, _ in _ler_manifestos() if diretorio != diretorio_atual),
+                     key=lambda diretorio: os.path.getmtime(os.path.join(diretorio, "manifesto.json")),
+                     reverse=True)
+    removidos = []
+    for diretorio in antigos[mantidos - 1:]:
+        descarte = tempfile.mkdtemp(prefix=".antigo-", dir=DIRETORIO_INDICES)
+        try:
+            os.replace(diretorio, os.path.join(descarte, "indice"))
+        except OSError:
+            # Já removido por outro processo
+            continue
+        finally:
+            shutil.rmtree(descarte, ignore_errors=True)
+        removidos.append(os.path.basename(diretorio))
+    return removidos
+
+
+def relatorio_memoria(indice_vetorial) -> dict:
+    """
+    Estima a memória ocupada pelos vetores, normalizada por 1.000 chunks.
+
+    "indice_bytes" é o tamanho do índice (os vetores, comprimidos quando há
+    quantização). "indice_privado_bytes" é a parte dele que cada processo
+    de trabalho mantém em memória própria: o índice inteiro nos tipos flat
+    e HNSW, e só os centróides no IVF, cujas listas invertidas são mapeadas
+    do disco e compartilhadas entre processos. "vetores_exatos_bytes" são os
+    vetores originais usados no reranqueamento, também mapeados e
+    compartilhados.
+
+    Returns:
+        dict: Bytes por 1.000 chunks de cada componente.
+    """
+    total_chunks = max(1, len(indice_vetorial.index_to_docstore_id))
+    vetores_exatos = getattr(indice_vetorial, "vetores_exatos", None)
+    tamanho_indice = tamanho_serializado(indice_vetorial.index)
+    return {
+        "indice_bytes": round(tamanho_indice * 1000 / total_chunks),
+        "indice_privado_bytes": round((tamanho_indice - tamanho_mapeavel(indice_vetorial.index)) * 1000
+                                      / total_chunks),
+        "vetores_exatos_bytes": round(vetores_exatos.matriz.nbytes * 1000 / total_chunks) if vetores_exatos else 0,
+    }
+
+
+def carregar_indice(chave: str, embeddings, mmap: bool = True):
+    """Carrega o índice persistido sob a chave, ou retorna None se não existir."""
+    return _carregar_indice_persistido(os.path.join(DIRETORIO_INDICES, chave), embeddings, mmap=mmap)
+
+
+def construir_indice(hashes_pdf: dict[str, str], embeddings, falhas: Optional[set[str]] = None,
+                     cronometro: Optional[Cronometro] = None, incremental: bool = True):
+    """
+    Executa o pipeline de indexação (extração, divisão, embeddings e índice), sem persistir.
+
+    Args:
+        hashes_pdf (dict): Mapeamento caminho do PDF -> hash do conteúdo.
+        embeddings: O provedor de embeddings (ver criar_embeddings()).
+        falhas (set[str]): Se informado, recebe os caminhos dos PDFs que não puderam ser lidos.
+        cronometro (Cronometro): Se informado, recebe os tempos e contagens de cada etapa.
+        incremental (bool): Se deve partir do índice persistido mais próximo
+            em vez de processar todos os PDFs.
+
+    Returns:
+        FAISS | None: O índice construído, ou None se nenhum chunk foi indexado.
+    """
+    falhas = set() if falhas is None else falhas
+    cronometro = cronometro or Cronometro()
+
+    # 1. Partir do índice persistido mais próximo, removendo o que sobra
+    ids_presentes = set()
+    indice_vetorial = None
+    if incremental:
+        with cronometro.medir("reaproveitamento"):
+            ids_desejados = {calcular_id_documento(h) for h in hashes_pdf.values()}
+            indice_vetorial = _carregar_indice_mais_proximo(set(hashes_pdf.values()), embeddings)
+            if indice_vetorial is not None:
+                for id_documento in set(listar_documentos(indice_vetorial)) - ids_desejados:
+                    remover_documento(indice_vetorial, id_documento)
+                ids_presentes = set(listar_documentos(indice_vetorial))
+
+    # 2. Extrair (em paralelo), dividir e indexar em fluxo apenas os PDFs que ainda não estão no índice
+    caminhos_novos = [caminho for caminho, hash_documento in hashes_pdf.items()
+                      if calcular_id_documento(hash_documento) not in ids_presentes]
+    paginas = cronometro.iterar("extracao", iterar_paginas_pdfs(caminhos_novos, falhas, hashes_pdf))
+    paginas = cronometro.iterar("limpeza", limpar_paginas(paginas))
+    chunks = cronometro.iterar("divisao", iterar_chunks(paginas, hashes_pdf))
+    with cronometro.medir("indexacao"):
+        indice_vetorial = _indexar_em_janelas(chunks, embeddings, indice_vetorial, cronometro)
+
+        # 3. Descartar o que já foi indexado de PDFs que falharam no meio da extração
+        if indice_vetorial is not None:
+            for caminho_pdf in falhas:
+                remover_documento(indice_vetorial, calcular_id_documento(hashes_pdf[caminho_pdf]))
+
+    if indice_vetorial is None or not indice_vetorial.index_to_docstore_id:
+        return None
+    return indice_vetorial
+
 
 @st.cache_resource
 def criar_indice_vetorial(caminhos_pdf: list[str]):
@@ -20,7 +1016,16 @@ def criar_indice_vetorial(caminhos_pdf: list[str]):
 
     Esta função carrega múltiplos documentos PDF, os combina, divide o texto
     em chunks, gera embeddings para cada chunk e os armazena em um índice FAISS.
-    O resultado é cacheado para evitar reprocessamento.
+    O índice construído é persistido em disco sob uma chave derivada do
+    conteúdo dos PDFs, dos parâmetros de chunking e do modelo de embeddings,
+    de modo que reinicializações carregam o índice pronto em vez de
+    reprocessar e gerar embeddings novamente.
+
+    Quando não há índice para exatamente esse conjunto de PDFs, parte do
+    índice persistido mais próximo e apenas adiciona/remove os documentos
+    que diferem, em vez de reconstruir tudo. Com
+    ETP_CONSTRUIR_INDICE_SOB_DEMANDA=0, apenas carrega índices construídos
+    previamente por construir_indice.py.
 
     Args:
         caminhos_pdf (list[str]): Uma lista de caminhos para os arquivos PDF.
@@ -28,33 +1033,41 @@ def criar_indice_vetorial(caminhos_pdf: list[str]):
     Returns:
         FAISS: O índice vetorial pronto para busca.
     """
-    todos_documentos = []
+    caminhos_existentes = []
     for caminho_pdf in caminhos_pdf:
         if not os.path.exists(caminho_pdf):
             st.warning(f"Arquivo PDF não encontrado em: {caminho_pdf}. Pulando.")
             continue
-        try:
-            loader = PyPDFLoader(caminho_pdf)
-            documentos = loader.load()
-            todos_documentos.extend(documentos)
-        except Exception as e:
-            st.error(f"Erro ao carregar o arquivo {caminho_pdf}: {e}")
+        caminhos_existentes.append(caminho_pdf)
 
-    if not todos_documentos:
+    if not caminhos_existentes:
         st.error("Nenhum documento PDF pôde ser carregado. Verifique os arquivos.")
         return None
 
+    hashes_pdf = {caminho: calcular_hash_arquivo(caminho) for caminho in caminhos_existentes}
+    chave = calcular_chave_indice(list(hashes_pdf.values()), configuracao_indice())
+
+    embeddings = criar_embeddings()
+    indice_vetorial = carregar_indice(chave, embeddings)
+    if indice_vetorial is not None:
+        st.info("Índice vetorial da base de conhecimento carregado do cache em disco.")
+        return indice_vetorial
+
+    if not CONSTRUIR_INDICE_SOB_DEMANDA:
+        st.error("Índice vetorial pré-construído não encontrado. Execute: python construir_indice.py")
+        return None
+
     try:
-        # 2. Dividir o texto em chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        chunks = text_splitter.split_documents(todos_documentos)
+        indice_vetorial = construir_indice(hashes_pdf, embeddings)
+        if indice_vetorial is None:
+            st.error("Nenhum documento PDF pôde ser carregado. Verifique os arquivos.")
+            return None
 
-        # 3. Gerar embeddings e criar o índice FAISS
-        embeddings = OpenAIEmbeddings()
-        indice_vetorial = FAISS.from_documents(chunks, embeddings)
+        # Persistir o índice para as próximas inicializações; sem isso ele ainda serve a esta execução
+        try:
+            salvar_indice(indice_vetorial)
+        except OSError as e:
+            st.warning(f"Não foi possível salvar o índice vetorial em disco: {e}")
 
         st.success("Índice vetorial da base de conhecimento criado com sucesso!")
         return indice_vetorial
@@ -67,6 +1080,11 @@ def obter_retriever(indice_vetorial):
     """
     Cria um retriever a partir de um índice vetorial.
 
+    Por padrão, o retriever é híbrido: combina a busca lexical (BM25) com a
+    busca vetorial, o que recupera melhor referências exatas a dispositivos
+    legais ("art. 75, II", "Decreto 10.024/2019"). Os resultados passam por
+    um cache de consultas compartilhado por todos os retrievers do índice.
+
     Args:
         indice_vetorial (FAISS): O índice vetorial.
 
@@ -74,9 +1092,16 @@ def obter_retriever(indice_vetorial):
         retriever: Um objeto retriever configurado para busca.
     """
 
-    if indice_vetorial:
-        return indice_vetorial.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5} # Retorna os 5 chunks mais relevantes
-        )
-    return None
\ No newline at end of file
+    if not indice_vetorial:
+        return None
+
+    retriever = RetrieverHibrido(
+        indice_vetorial=indice_vetorial,
+        indice_lexical=indice_vetorial.indice_lexical if BUSCA_HIBRIDA else None,
+        k=CHUNKS_POR_CONSULTA
+    )
+
+    cache = obter_cache_recuperacao(indice_vetorial)
+    if cache is not None:
+        retriever = RetrieverComCache(retriever=retriever, indice_vetorial=indice_vetorial, cache=cache)
+    return retriever
\ No newline at end of file
@@ -0,0 +1,38 @@
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+
+import processador_documentos as processador
+
+
+def chunks_documento(id_documento: str, quantidade: int, hash_documento: str = None) -> list:
+    """Chunks sintéticos (chunk, id) de um documento, no formato de iterar_chunks()."""
+    hash_documento = hash_documento or id_documento * 4
+    return [
+        (Document(page_content=f"Art. {numero}. Texto do documento {id_documento}, dispositivo {numero} "
+                               f"sobre {('licitação', 'dispensa', 'pregão', 'contrato')[numero % 4]} "
+                               f"com valor {numero * 1000 + len(id_documento)}.",
+                  metadata={"source": f"{id_documento}.pdf", "page": numero, "id_documento": id_documento,
+                            "hash_documento": hash_documento}),
+         f"{id_documento}:{numero}")
+        for numero in range(quantidade)
+    ]
+
+
+@pytest.fixture
+def embeddings():
+    return DeterministicFakeEmbedding(size=16)
+
+
+@pytest.fixture
+def diretorio_indices(tmp_path, monkeypatch):
+    diretorio = tmp_path / "indices"
+    monkeypatch.setattr(processador, "DIRETORIO_INDICES", str(diretorio))
+    return diretorio
+
+
+@pytest.fixture
+def indice(embeddings):
+    """Índice com dois documentos, "doca" e "docb", de 30 chunks cada."""
+    return processador._indexar_em_janelas(iter(chunks_documento("doca", 30) + chunks_documento("docb", 30)),
+                                           embeddings)
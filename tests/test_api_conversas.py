@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks
+from pydantic import ValidationError
+
+import api
+from armazem_conversas import ArmazemConversasMemoria
+
+
+class _RagChainFalsa:
+    async def ainvoke_with_sources(self, pergunta, historico, resumo):
+        return {"resposta": f"resposta a {pergunta}", "fontes": []}
+
+    async def aatualizar_resumo(self, historico, resumo):
+        return {"texto": "resumo novo", "mensagens_resumidas": len(historico)}
+
+
+@pytest.fixture
+def armazem(monkeypatch):
+    armazem = ArmazemConversasMemoria()
+    monkeypatch.setattr(api, "rag_chain", _RagChainFalsa())
+    monkeypatch.setattr(api, "armazem_conversas", armazem)
+    monkeypatch.setitem(api.estado_rag, "status", "pronto")
+    return armazem
+
+
+def _perguntar(**dados) -> dict:
+    return asyncio.run(api.perguntar_rag(api.PerguntaRAG(pergunta="limite da dispensa?", **dados), BackgroundTasks()))
+
+
+@pytest.mark.parametrize("mensagens_resumidas", [None, "duas", -1])
+def test_resumo_invalido_e_rejeitado_na_validacao(mensagens_resumidas):
+    with pytest.raises(ValidationError):
+        api.PerguntaRAG(pergunta="p", resumo={"texto": "", "mensagens_resumidas": mensagens_resumidas})
+
+
+def test_pergunta_sem_sessao_nao_guarda_conversa(armazem):
+    resposta = _perguntar()
+    assert resposta["id_sessao"] is None
+    assert armazem._conversas == {}
+
+
+def test_sem_sessao_devolve_o_resumo_atualizado(armazem):
+    historico = [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "olá"}]
+    resposta = _perguntar(historico=historico, resumo={})
+    assert resposta["resumo"] == {"texto": "resumo novo", "mensagens_resumidas": 2}
+
+
+def test_nova_sessao_guarda_a_conversa(armazem):
+    id_sessao = _perguntar(nova_sessao=True)["id_sessao"]
+    assert id_sessao
+    _perguntar(id_sessao=id_sessao)
+    assert len(armazem.carregar(id_sessao)["mensagens"]) == 4
@@ -0,0 +1,44 @@
+import pytest
+
+from armazem_conversas import ArmazemConversasMemoria, ArmazemConversasSQLite
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def armazem(request, tmp_path):
+    if request.param == "memoria":
+        return ArmazemConversasMemoria()
+    return ArmazemConversasSQLite(str(tmp_path / "conversas.sqlite3"))
+
+
+def _turno(i: int) -> list:
+    return [{"role": "user", "content": f"pergunta {i}"}, {"role": "assistant", "content": f"resposta {i}"}]
+
+
+def test_sessao_desconhecida_e_uma_conversa_vazia(armazem):
+    assert armazem.carregar("nova") == {"resumo": {"texto": "", "mensagens_resumidas": 0}, "mensagens": []}
+    assert not armazem.remover("nova")
+
+
+def test_carregar_devolve_so_as_mensagens_nao_resumidas(armazem):
+    for i in range(3):
+        armazem.adicionar_mensagens("s1", _turno(i))
+
+    assert armazem.salvar_resumo("s1", {"texto": "resumo", "mensagens_resumidas": 4}, 0)
+    # Outra atualização baseada no resumo antigo não sobrescreve esta
+    assert not armazem.salvar_resumo("s1", {"texto": "atrasado", "mensagens_resumidas": 2}, 0)
+
+    conversa = armazem.carregar("s1")
+    assert conversa["resumo"] == {"texto": "resumo", "mensagens_resumidas": 4}
+    assert conversa["mensagens"] == _turno(2)
+    assert armazem.carregar("s2")["mensagens"] == []
+
+
+def test_remover_e_remover_inativas(armazem):
+    armazem.adicionar_mensagens("s1", _turno(0))
+    armazem.adicionar_mensagens("s2", _turno(0))
+
+    assert armazem.remover("s1")
+    assert armazem.carregar("s1")["mensagens"] == []
+    assert armazem.remover_inativas(dias=1) == 0
+    assert armazem.remover_inativas(dias=0) == 1
+    assert armazem.carregar("s2")["mensagens"] == []
@@ -0,0 +1,137 @@
+import threading
+from types import SimpleNamespace
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from busca_hibrida import IndiceBM25, RetrieverHibrido, consulta_referencial, fundir_rankings, tokenizar
+from indices_vetoriais import trava_indice
+
+# Trechos no formato produzido pelo DivisorJuridico a partir da Lei 14.133
+ARTIGO_75 = """Seção III
+Da Dispensa de Licitação
+Art. 75. É dispensável a licitação:
+I - para contratação que envolva valores inferiores a R$ 100.000,00 (cem mil reais), no caso de obras e serviços de engenharia;
+II - para contratação que envolva valores inferiores a R$ 50.000,00 (cinquenta mil reais), no caso de outros serviços e compras;
+III - para contratação que mantenha todas as condições definidas em edital de licitação realizada há menos de 1 (um) ano."""
+
+ARTIGO_75_PARAGRAFO = """Art. 75 (continuação)
+§ 1º Para fins de aferição dos valores que atendam aos limites referidos nos incisos I e II do caput deste artigo, deverão ser observados:
+I - o somatório do que for despendido no exercício financeiro pela respectiva unidade gestora;
+II - o somatório da despesa realizada com objetos de mesma natureza."""
+
+CORPUS = {
+    "lei:75": ARTIGO_75,
+    "lei:75b": ARTIGO_75_PARAGRAFO,
+    "lei:19": "Art. 19. Os órgãos da Administração instituirão:\nII - catálogo eletrônico de padronização de compras, "
+              "serviços e obras, admitida a adoção do catálogo do Poder Executivo federal;",
+    "lei:139": "Art. 139. A extinção determinada por ato unilateral da Administração poderá acarretar:\n"
+               "II - ocupação e utilização do local, instalações, equipamentos, material e pessoal empregados.",
+    "lei:191": "Art. 191. Até o decurso do prazo, a Administração poderá optar por licitar ou contratar diretamente "
+               "de acordo com esta Lei, vedada a aplicação combinada.",
+    "manual:1": "Para dispensas de pequeno valor, consulte o limite atualizado por decreto antes de instruir o processo.",
+    "manual:2": "O art. 75 trata das hipóteses de dispensa; a pesquisa de preços continua obrigatória em todas elas.",
+}
+
+
+def _indice(corpus: dict = CORPUS) -> IndiceBM25:
+    indice = IndiceBM25()
+    indice.adicionar(list(corpus), list(corpus.values()))
+    return indice
+
+
+def test_inciso_no_inicio_da_linha_recebe_termo_do_artigo():
+    termos = tokenizar(ARTIGO_75)
+    assert "inciso:ii" in termos
+    assert "art:75/inciso:ii" in termos
+
+
+def test_incisos_de_paragrafo_nao_recebem_termo_do_artigo():
+    termos = tokenizar(ARTIGO_75_PARAGRAFO)
+    assert "inciso:ii" in termos
+    assert "art:75/inciso:ii" not in termos
+
+
+def test_citacoes_geram_termo_do_inciso_no_artigo():
+    for consulta in ("art. 75, inciso II", "inciso II do art. 75", "art. 75, II"):
+        assert "art:75/inciso:ii" in tokenizar(consulta), consulta
+
+
+def test_palavras_com_letras_romanas_nao_viram_inciso():
+    assert not any(t.startswith("inciso:") for t in tokenizar("art. 5 civil"))
+
+
+def test_consulta_por_artigo_e_inciso_encontra_o_dispositivo():
+    # Regressão: o trecho com o texto do art. 75, II ficava atrás de outros
+    # artigos que também têm um inciso II
+    assert consulta_referencial("art. 75, inciso II")
+    assert _indice().buscar("art. 75, inciso II", 3)[0][0] == "lei:75"
+
+
+def test_remover_compacta_posicoes_e_mantem_resultados():
+    indice = _indice()
+    indice.remover(["lei:19", "manual:1"])
+    assert "lei:19" not in indice.ids
+    assert indice.posicoes == {id_chunk: posicao for posicao, id_chunk in enumerate(indice.ids)}
+    assert indice.soma_comprimentos == sum(indice.comprimentos)
+    assert indice.buscar("art. 75, inciso II", 1)[0][0] == "lei:75"
+    assert all(p < len(indice) for ocorrencias in indice.postings.values() for p in ocorrencias)
+
+
+def test_fundir_rankings_soma_rrf():
+    ranking = fundir_rankings([["a", "b"], ["b", "c"]], 3, rrf_k=60)
+    assert [id_chunk for id_chunk, _ in ranking] == ["b", "a", "c"]
+    assert ranking[0][1] == 1 / 62 + 1 / 61
+
+
+def _retriever(monkeypatch, corpus: dict, vetoriais: list[str]):
+    chamadas = []
+    docstore = InMemoryDocstore({i: Document(page_content=t, metadata={"source": i}) for i, t in corpus.items()})
+    indice_vetorial = SimpleNamespace(docstore=docstore)
+
+    def embedding_consulta(self, consulta):
+        # O embedding é calculado sem a trava do índice
+        assert not trava_indice(indice_vetorial)._leitores
+        chamadas.append(consulta)
+        return consulta
+
+    monkeypatch.setattr(RetrieverHibrido, "_embedding_consulta", embedding_consulta)
+    monkeypatch.setattr(RetrieverHibrido, "_buscar_vetorial", lambda self, vetor, k: vetoriais[:k])
+    retriever = RetrieverHibrido(indice_vetorial=indice_vetorial, indice_lexical=_indice(corpus), k=3)
+    return retriever, chamadas
+
+
+def test_atalho_lexical_quando_resultado_contem_as_referencias(monkeypatch):
+    retriever, chamadas = _retriever(monkeypatch, CORPUS, ["manual:1"])
+    documentos = retriever.get_relevant_documents("art. 75, inciso II")
+    assert documentos[0].metadata["source"] == "lei:75"
+    assert chamadas == []
+
+
+def test_sem_resultado_com_as_referencias_funde_com_a_busca_vetorial(monkeypatch):
+    corpus = {i: t for i, t in CORPUS.items() if i != "lei:75"}
+    retriever, chamadas = _retriever(monkeypatch, corpus, ["manual:1"])
+    documentos = retriever.get_relevant_documents("art. 75, inciso II")
+    assert chamadas == ["art. 75, inciso II"]
+    assert "manual:1" in [d.metadata["source"] for d in documentos]
+
+
+def test_alteracao_na_fila_nao_espera_pelo_embedding_da_consulta(monkeypatch):
+    retriever, _ = _retriever(monkeypatch, CORPUS, ["manual:1"])
+    trava = trava_indice(retriever.indice_vetorial)
+    eventos = []
+
+    def escrever():
+        with trava.escrita():
+            eventos.append("escrita")
+
+    def embedding_lento(self, consulta):
+        escritor = threading.Thread(target=escrever, daemon=True)
+        escritor.start()
+        escritor.join(timeout=1)
+        eventos.append("embedding")
+        return consulta
+
+    monkeypatch.setattr(RetrieverHibrido, "_embedding_consulta", embedding_lento)
+    retriever.get_relevant_documents("pesquisa de preços")
+    assert eventos == ["escrita", "embedding"]
@@ -0,0 +1,35 @@
+from deduplicacao import IndiceDuplicatas
+
+TEXTO = ("Art. 75. É dispensável a licitação para contratação que envolva valores inferiores a "
+         "R$ 50.000,00 (cinquenta mil reais), no caso de outros serviços e compras.")
+
+
+def test_trecho_quase_identico_encontra_o_representante():
+    duplicatas = IndiceDuplicatas(limiar=0.7)
+    duplicatas.registrar("lei:1", duplicatas.assinatura(TEXTO))
+
+    # Quebras de linha e uma palavra diferente no fim não impedem a detecção
+    quase_igual = TEXTO.replace(", no caso", ",\nno caso").replace("compras.", "aquisições.")
+    assert duplicatas.procurar(duplicatas.assinatura(quase_igual)) == "lei:1"
+    assert duplicatas.procurar(duplicatas.assinatura("Art. 19. Os órgãos da Administração instituirão "
+                                                     "catálogo eletrônico de padronização.")) is None
+    assert duplicatas.procurar(duplicatas.assinatura("")) is None
+
+
+def test_remover_representante_devolve_as_ocorrencias_restantes():
+    duplicatas = IndiceDuplicatas(limiar=0.7)
+    assinatura = duplicatas.assinatura(TEXTO)
+    duplicatas.registrar("lei:1", assinatura)
+    duplicatas.adicionar_ocorrencia("lei:1", "manual:7", {"source": "manual.pdf", "page": 3})
+    duplicatas.adicionar_ocorrencia("lei:1", "guia:2", {"source": "guia.pdf", "page": 9})
+    assert duplicatas.localizacoes("lei:1") == [{"source": "manual.pdf", "page": 3},
+                                                {"source": "guia.pdf", "page": 9}]
+
+    orfaos = duplicatas.remover(["lei:1", "guia:2"])
+
+    assert list(orfaos) == ["lei:1"]
+    assert (orfaos["lei:1"][0] == assinatura).all()
+    assert orfaos["lei:1"][1] == [{"id": "manual:7", "source": "manual.pdf", "page": 3}]
+    assert len(duplicatas) == 0
+    assert duplicatas.procurar(assinatura) is None
+    assert duplicatas._baldes == {}
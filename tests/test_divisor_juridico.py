@@ -0,0 +1,45 @@
+from langchain_core.documents import Document
+
+from divisor_juridico import DivisorJuridico
+
+PAGINA_10 = """CAPÍTULO III
+DA CONTRATAÇÃO DIRETA
+Seção III
+Da Dispensa de Licitação
+Art. 74. É inexigível a licitação quando inviável a competição.
+Art. 75. É dispensável a licitação:
+I - para contratação que envolva valores inferiores a R$ 100.000,00;"""
+
+PAGINA_11 = """II - para contratação que envolva valores inferiores a R$ 50.000,00;
+III - para contratação que mantenha todas as condições.
+Art. 76. A alienação de bens da Administração Pública."""
+
+
+def _dividir(tamanho_maximo: int) -> list[Document]:
+    paginas = [Document(page_content=PAGINA_10, metadata={"source": "lei.pdf", "page": 10}),
+               Document(page_content=PAGINA_11, metadata={"source": "lei.pdf", "page": 11})]
+    return list(DivisorJuridico(tamanho_maximo).dividir(paginas))
+
+
+def test_artigos_pequenos_sao_agrupados_atravessando_paginas():
+    chunks = _dividir(1000)
+    assert chunks[0].metadata == {"source": "lei.pdf", "page": 10, "pagina_final": 10, "secao": "CAPÍTULO III"}
+    assert chunks[1].metadata == {"source": "lei.pdf", "page": 10, "pagina_final": 11, "artigo": "74-76",
+                                  "secao": "Seção III"}
+
+
+def test_artigo_grande_e_dividido_nos_dispositivos_repetindo_o_numero():
+    chunks = _dividir(150)
+    do_artigo_75 = [c for c in chunks if c.metadata.get("artigo") == "75"]
+    assert [c.page_content.splitlines()[0] for c in do_artigo_75] == ["Art. 75 (continuação)"] * 2
+    assert do_artigo_75[-1].page_content.splitlines()[1].startswith("II - ")
+    assert do_artigo_75[-1].metadata["page"] == 11
+    assert chunks[-1].page_content == "Art. 76. A alienação de bens da Administração Pública."
+    assert all(len(c.page_content) <= 150 for c in chunks)
+
+
+def test_nenhum_texto_e_perdido_nem_repetido():
+    originais = " ".join((PAGINA_10 + "\n" + PAGINA_11).split())
+    for tamanho_maximo in (1000, 150, 80):
+        textos = [c.page_content.replace("Art. 75 (continuação)\n", "") for c in _dividir(tamanho_maximo)]
+        assert " ".join(" ".join(textos).split()) == originais, tamanho_maximo
@@ -0,0 +1,41 @@
+import pytest
+from langchain_core.documents import Document
+
+from docstore_compacto import DocstoreCompacto
+
+DOCUMENTOS = {
+    "a:0": Document(page_content="Art. 75. É dispensável a licitação:",
+                    metadata={"source": "lei.pdf", "page": 40, "pagina_final": 41, "artigo": "75",
+                              "secao": "Seção III", "id_documento": "a", "hash_documento": "aaaa"}),
+    "a:1": Document(page_content="Ação — cotação em R$ 50.000,00",
+                    metadata={"source": "lei.pdf", "page": 41, "id_documento": "a", "hash_documento": "aaaa"}),
+    "b:0": Document(page_content="Manual de compras", metadata={"source": "manual.pdf", "page": "ii", "tipo": "capa"}),
+}
+
+
+@pytest.fixture(params=[True, False], ids=["mmap", "memoria"])
+def gravado(request, tmp_path):
+    docstore = DocstoreCompacto()
+    docstore.add(DOCUMENTOS)
+    docstore.salvar(str(tmp_path), ["b:0", "a:1", "a:0"])
+    return DocstoreCompacto.carregar(str(tmp_path), mmap=request.param)
+
+
+def test_salvar_e_carregar_preserva_textos_e_metadados(gravado):
+    assert len(gravado) == 3
+    assert gravado.ids() == ["b:0", "a:1", "a:0"]
+    for id_chunk, documento in DOCUMENTOS.items():
+        assert gravado.search(id_chunk) == documento
+
+
+def test_alteracoes_depois_de_carregar(gravado):
+    gravado.delete(["a:1"])
+    gravado.add({"c:0": Document(page_content="novo", metadata={"source": "c.pdf"})})
+
+    assert gravado.search("a:1") == "ID a:1 not found."
+    assert gravado.search("c:0").page_content == "novo"
+    assert gravado.ids() == ["b:0", "a:0", "c:0"]
+    with pytest.raises(ValueError):
+        gravado.add({"a:0": Document(page_content="repetido")})
+    with pytest.raises(ValueError):
+        gravado.delete(["inexistente"])
@@ -0,0 +1,36 @@
+from langchain_core.documents import Document
+
+from empacotador_contexto import TOKENS_CABECALHO_TRECHO, EmpacotadorContexto, contar_tokens
+
+PARAGRAFO = "A pesquisa de preços deve considerar contratações similares de outros órgãos. "
+
+
+def test_documentos_mais_relevantes_entram_primeiro_e_o_excedente_e_cortado():
+    documentos = [Document(page_content=PARAGRAFO * 10, metadata={"id": i, "pontuacao": i}) for i in range(5)]
+    orcamento = 2 * (contar_tokens(PARAGRAFO * 10) + TOKENS_CABECALHO_TRECHO) + 100
+
+    escolhidos = EmpacotadorContexto(orcamento_contexto=orcamento).selecionar_documentos(documentos)
+
+    assert [d.metadata["id"] for d in escolhidos] == [4, 3, 2]
+    assert escolhidos[2].page_content.endswith("...")
+    assert sum(contar_tokens(d.page_content) + TOKENS_CABECALHO_TRECHO for d in escolhidos) <= orcamento
+
+
+def test_historico_mantem_as_mensagens_mais_recentes_dentro_do_orcamento():
+    mensagens = [f"Usuário: pergunta {i}. " + PARAGRAFO * 3 for i in range(20)]
+
+    escolhidas = EmpacotadorContexto(orcamento_historico=300).selecionar_historico(mensagens)
+
+    assert 0 < len(escolhidas) < len(mensagens)
+    assert escolhidas[-1] == mensagens[-1]
+    assert escolhidas == mensagens[-len(escolhidas):]
+    assert sum(contar_tokens(m) for m in escolhidas) <= 300
+
+
+def test_mensagem_longa_nao_ocupa_o_historico_inteiro():
+    mensagens = ["Usuário: qual o limite da dispensa?", "Assistente: " + PARAGRAFO * 100]
+
+    escolhidas = EmpacotadorContexto(orcamento_historico=300).selecionar_historico(mensagens)
+
+    assert escolhidas[0] == mensagens[0]
+    assert contar_tokens(escolhidas[1]) <= 100
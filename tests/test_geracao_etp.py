@@ -0,0 +1,34 @@
+import asyncio
+
+import integrador
+from integrador import GRUPOS_SECOES_ETP, EtpLlmGenerator
+
+
+class _CadeiaLenta:
+    def __init__(self):
+        self.em_andamento = 0
+        self.pico = 0
+
+    async def ainvoke(self, entrada):
+        self.em_andamento += 1
+        self.pico = max(self.pico, self.em_andamento)
+        await asyncio.sleep(0.01)
+        self.em_andamento -= 1
+        return entrada["prompt"]
+
+
+def test_grupos_simultaneos_respeitam_o_limite_entre_geracoes(monkeypatch):
+    monkeypatch.setattr(integrador, "GRUPOS_SIMULTANEOS_ETP", 2)
+    gerador = EtpLlmGenerator.__new__(EtpLlmGenerator)
+    gerador.chain = _CadeiaLenta()
+    monkeypatch.setattr(gerador, "_construct_prompt_grupo", lambda dados, grupo: f"seções {grupo[0]}-{grupo[-1]}")
+    monkeypatch.setattr(gerador, "_finalizar_etp", lambda grupos: grupos)
+
+    async def duas_geracoes():
+        return await asyncio.gather(gerador.agenerate_etp_modular({}), gerador.agenerate_etp_modular({}))
+
+    documentos = asyncio.run(duas_geracoes())
+
+    assert gerador.chain.pico == 2
+    # Os grupos saem na ordem das seções, mesmo gerados em paralelo
+    assert documentos[0] == [f"seções {grupo[0]}-{grupo[-1]}" for grupo in GRUPOS_SECOES_ETP]
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from indices_vetoriais import TravaLeituraEscrita, trava_indice
+
+
+class _Indice:
+    pass
+
+
+def test_trava_indice_e_unica_por_indice():
+    indice = _Indice()
+    assert trava_indice(indice) is trava_indice(indice)
+    assert trava_indice(indice) is not trava_indice(_Indice())
+
+
+def test_leitura_espera_a_escrita_terminar():
+    trava = TravaLeituraEscrita()
+    eventos = []
+
+    def ler():
+        with trava.leitura():
+            eventos.append("leitura")
+
+    with trava.escrita():
+        leitor = threading.Thread(target=ler)
+        leitor.start()
+        time.sleep(0.05)
+        eventos.append("fim da escrita")
+    leitor.join(timeout=1)
+    assert eventos == ["fim da escrita", "leitura"]
+
+
+def test_escrita_espera_as_leituras_em_andamento():
+    trava = TravaLeituraEscrita()
+    eventos = []
+
+    def escrever():
+        with trava.escrita():
+            eventos.append("escrita")
+
+    with trava.leitura(), trava.leitura():
+        escritor = threading.Thread(target=escrever)
+        escritor.start()
+        time.sleep(0.05)
+        eventos.append("fim das leituras")
+    escritor.join(timeout=1)
+    assert eventos == ["fim das leituras", "escrita"]
+
+
+def test_escrita_reentrante_e_leitura_pela_mesma_thread():
+    trava = TravaLeituraEscrita()
+    with trava.escrita():
+        with trava.escrita(), trava.leitura():
+            pass
+    # Liberada por completo: outra thread consegue escrever
+    escritor = threading.Thread(target=lambda: trava.escrita().__enter__())
+    escritor.start()
+    escritor.join(timeout=1)
+    assert not escritor.is_alive()
+
+
+def test_leitura_reentrante_nao_espera_escritor_na_fila():
+    trava = TravaLeituraEscrita()
+    eventos = []
+
+    def escrever():
+        with trava.escrita():
+            eventos.append("escrita")
+
+    def ler_duas_vezes():
+        with trava.leitura():
+            threading.Thread(target=escrever, daemon=True).start()
+            while not trava._escritores_esperando:
+                time.sleep(0.001)
+            with trava.leitura():
+                eventos.append("leitura interna")
+
+    leitor = threading.Thread(target=ler_duas_vezes, daemon=True)
+    leitor.start()
+    leitor.join(timeout=1)
+    assert not leitor.is_alive()
+    time.sleep(0.05)
+    assert eventos == ["leitura interna", "escrita"]
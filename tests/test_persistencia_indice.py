@@ -0,0 +1,116 @@
+import errno
+import os
+import threading
+import time
+
+import pytest
+
+import processador_documentos as processador
+from tests.conftest import chunks_documento
+
+
+def _conteudo(indice_vetorial) -> dict:
+    mapeamento = indice_vetorial.index_to_docstore_id
+    return {posicao: indice_vetorial.docstore.search(id_chunk).page_content
+            for posicao, id_chunk in mapeamento.items()}
+
+
+def test_salvar_e_carregar_preserva_posicoes_e_textos(indice, embeddings, diretorio_indices):
+    chave = processador.salvar_indice(indice)
+    carregado = processador.carregar_indice(chave, embeddings, mmap=False)
+
+    assert carregado is not None
+    assert carregado.index.ntotal == indice.index.ntotal
+    assert _conteudo(carregado) == _conteudo(indice)
+    assert carregado.indice_lexical.ids == indice.indice_lexical.ids
+    assert processador.listar_documentos(carregado) == processador.listar_documentos(indice)
+
+
+def test_salvar_de_novo_substitui_o_indice_sem_sobras(indice, embeddings, diretorio_indices):
+    chave = processador.salvar_indice(indice)
+    assert processador.salvar_indice(indice) == chave
+    assert os.listdir(diretorio_indices) == [chave]
+    assert processador.carregar_indice(chave, embeddings, mmap=False) is not None
+
+
+def test_falha_de_gravacao_e_propagada_e_mantem_o_indice_anterior(indice, embeddings, diretorio_indices,
+                                                                  monkeypatch):
+    chave = processador.salvar_indice(indice)
+
+    def sem_espaco(*args):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(processador, "gravar_indice_faiss", sem_espaco)
+    with pytest.raises(OSError):
+        processador.salvar_indice(indice)
+
+    assert os.listdir(diretorio_indices) == [chave]
+    assert processador.carregar_indice(chave, embeddings, mmap=False) is not None
+
+
+def test_falha_ao_publicar_restaura_o_indice_anterior(indice, embeddings, diretorio_indices, monkeypatch):
+    chave = processador.salvar_indice(indice)
+    replace = os.replace
+
+    def falhar_ao_publicar(origem, destino):
+        if os.path.basename(origem).startswith(".tmp-"):
+            raise OSError(errno.EACCES, "Permission denied")
+        replace(origem, destino)
+
+    monkeypatch.setattr(processador.os, "replace", falhar_ao_publicar)
+    with pytest.raises(OSError):
+        processador.salvar_indice(indice)
+    monkeypatch.setattr(processador.os, "replace", replace)
+
+    assert os.listdir(diretorio_indices) == [chave]
+    assert processador.carregar_indice(chave, embeddings, mmap=False) is not None
+
+
+def test_salvar_de_novo_mantem_o_relatorio_de_construcao(indice, diretorio_indices):
+    chave = processador.salvar_indice(indice)
+    relatorio = diretorio_indices / chave / "construcao.json"
+    relatorio.write_text('{"total_chunks": 60}', encoding="utf-8")
+
+    assert processador.salvar_indice(indice) == chave
+
+    assert relatorio.read_text(encoding="utf-8") == '{"total_chunks": 60}'
+
+
+def test_salvar_com_alteracao_na_fila_nao_trava(indice, diretorio_indices, monkeypatch):
+    trava = processador.trava_indice(indice)
+    persistir = processador._persistir_indice
+
+    def persistir_com_escritor_na_fila(*args):
+        while not trava._escritores_esperando:
+            time.sleep(0.001)
+        # Leituras feitas durante a gravação não podem esperar pelo escritor
+        processador.listar_documentos(indice)
+        persistir(*args)
+
+    monkeypatch.setattr(processador, "_persistir_indice", persistir_com_escritor_na_fila)
+    gravacao = threading.Thread(target=processador.salvar_indice, args=(indice,), daemon=True)
+    gravacao.start()
+    while not trava._leitores:
+        time.sleep(0.001)
+    remocao = threading.Thread(target=processador.remover_documento, args=(indice, "doca"), daemon=True)
+    remocao.start()
+
+    gravacao.join(timeout=5)
+    remocao.join(timeout=5)
+    assert not gravacao.is_alive() and not remocao.is_alive()
+    assert set(processador.listar_documentos(indice)) == {"docb"}
+    assert len(os.listdir(diretorio_indices)) == 1
+
+
+def test_indices_antigos_alem_do_limite_sao_apagados(indice, embeddings, diretorio_indices):
+    chaves = [processador.salvar_indice(indice)]
+    processador.remover_documento(indice, "doca")
+    chaves.append(processador.salvar_indice(indice))
+    processador._indexar_em_janelas(iter(chunks_documento("docc", 5)), embeddings, indice)
+    chaves.append(processador.salvar_indice(indice))
+    processador.remover_documento(indice, "docb")
+    chaves.append(processador.salvar_indice(indice))
+
+    assert len(set(chaves)) == 4
+    assert sorted(os.listdir(diretorio_indices)) == sorted(chaves[-processador.INDICES_MANTIDOS:])
+    assert processador.carregar_indice(chaves[-1], embeddings, mmap=False) is not None
@@ -0,0 +1,70 @@
+import pytest
+
+import indices_vetoriais
+import processador_documentos as processador
+from tests.conftest import chunks_documento
+
+
+def _consistente(indice_vetorial) -> None:
+    """As posições do índice, o docstore, o índice lexical e os vetores continuam alinhados."""
+    mapeamento = indice_vetorial.index_to_docstore_id
+    assert sorted(mapeamento) == list(range(indice_vetorial.index.ntotal))
+    assert indice_vetorial.indice_lexical.ids == [mapeamento[p] for p in range(len(mapeamento))]
+    for posicao, id_chunk in mapeamento.items():
+        texto = indice_vetorial.docstore.search(id_chunk).page_content
+        vetor = indice_vetorial.embeddings.embed_query(texto)
+        assert indice_vetorial.similarity_search_by_vector(vetor, k=1)[0].page_content == texto
+
+
+@pytest.mark.parametrize("tipo", ["flat", "ivf"])
+def test_remover_documento_renumera_as_posicoes(tipo, embeddings, monkeypatch):
+    monkeypatch.setattr(indices_vetoriais, "TIPO_INDICE", tipo)
+    monkeypatch.setattr(indices_vetoriais, "IVF_VETORES_TREINO", 40)
+    # Remove um documento do meio, para que os chunks seguintes mudem de posição
+    indice = processador._indexar_em_janelas(
+        iter(chunks_documento("doca", 20) + chunks_documento("docb", 20) + chunks_documento("docc", 20)),
+        embeddings)
+    assert (indices_vetoriais.faiss.try_extract_index_ivf(indice.index) is not None) == (tipo == "ivf")
+
+    assert processador.remover_documento(indice, "docb") == 20
+
+    assert set(processador.listar_documentos(indice)) == {"doca", "docc"}
+    assert indice.index.ntotal == 40
+    _consistente(indice)
+
+
+def test_remover_documento_inexistente_nao_altera_o_indice(indice):
+    geracao = indice.geracao
+    assert processador.remover_documento(indice, "outro") == 0
+    assert indice.geracao == geracao
+    assert indice.index.ntotal == 60
+
+
+def test_trecho_repetido_e_promovido_ao_remover_o_documento_original(embeddings):
+    # "docb" repete os 10 primeiros chunks de "doca" (mesmo texto, outra fonte)
+    repetidos = [(chunk.copy(update={"metadata": {**chunk.metadata, "source": "docb.pdf", "id_documento": "docb",
+                                                  "hash_documento": "docbdocbdocbdocb"}}),
+                  id_chunk.replace("doca", "docb"))
+                 for chunk, id_chunk in chunks_documento("doca", 10)]
+    indice = processador._indexar_em_janelas(iter(chunks_documento("doca", 10) + repetidos), embeddings)
+    assert indice.index.ntotal == 10
+    assert processador.listar_documentos(indice)["docb"]["total_chunks"] == 10
+
+    assert processador.remover_documento(indice, "doca") == 10
+
+    assert processador.listar_documentos(indice) == {
+        "docb": {"arquivo": "docb.pdf", "hash": "docbdocbdocbdocb", "total_chunks": 10}}
+    assert sorted(indice.index_to_docstore_id.values()) == sorted(id_chunk for _, id_chunk in repetidos)
+    assert indice.indice_duplicatas.ocorrencias == {}
+    assert indice.docstore.search("docb:3").metadata["source"] == "docb.pdf"
+    _consistente(indice)
+
+
+def test_alterar_o_indice_descarta_os_indices_em_cache(indice, monkeypatch):
+    limpezas = []
+    monkeypatch.setattr(processador.criar_indice_vetorial, "clear", lambda: limpezas.append(True))
+
+    processador.remover_documento(indice, "outro")
+    assert limpezas == []
+    processador.remover_documento(indice, "doca")
+    assert limpezas == [True]
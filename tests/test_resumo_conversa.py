@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks
+from langchain_community.llms.fake import FakeListLLM
+from langchain_core.runnables import RunnableLambda
+
+import api
+from integrador import JANELA_HISTORICO, RagChain
+
+
+@pytest.fixture
+def rag_chain(monkeypatch):
+    llm = FakeListLLM(responses=["Resumo 1", "Resumo 2"])
+    monkeypatch.setattr(RagChain, "_get_llm", lambda self: llm)
+    return RagChain(RunnableLambda(lambda pergunta: []))
+
+
+def _conversa(total: int) -> list:
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"mensagem {i}"} for i in range(total)]
+
+
+def test_dentro_da_janela_nada_e_resumido(rag_chain):
+    historico = _conversa(JANELA_HISTORICO)
+    assert rag_chain.atualizar_resumo(historico, None) == {"texto": "", "mensagens_resumidas": 0}
+
+
+def test_resumo_avanca_so_sobre_as_mensagens_que_sairam_da_janela(rag_chain):
+    historico = _conversa(JANELA_HISTORICO + 2)
+    resumo = rag_chain.atualizar_resumo(historico, None)
+    assert resumo == {"texto": "Resumo 1", "mensagens_resumidas": 2}
+    # Sem mensagens novas fora da janela, o LLM não é chamado
+    assert rag_chain.atualizar_resumo(historico, resumo) == resumo
+
+    historico += _conversa(2)
+    resumo = asyncio.run(rag_chain.aatualizar_resumo(historico, resumo))
+    assert resumo == {"texto": "Resumo 2", "mensagens_resumidas": 4}
+
+
+def test_historico_formatado_usa_o_resumo_no_lugar_das_mensagens_antigas(rag_chain):
+    historico = _conversa(JANELA_HISTORICO + 2)
+    formatado = rag_chain._format_chat_history(historico, {"texto": "Resumo 1", "mensagens_resumidas": 2})
+    assert formatado.startswith("Resumo da conversa até aqui: Resumo 1")
+    assert "mensagem 1" not in formatado
+    assert f"mensagem {JANELA_HISTORICO + 1}" in formatado
+
+
+def test_resumo_que_nao_corresponde_ao_historico_e_ignorado(rag_chain):
+    historico = _conversa(2)
+    assert rag_chain._validar_resumo(historico, {"texto": "antigo", "mensagens_resumidas": 5}) == {
+        "texto": "", "mensagens_resumidas": 0}
+
+
+def test_api_sem_sessao_resume_mesmo_sem_resumo_anterior(rag_chain, monkeypatch):
+    async def responder(pergunta, historico, resumo):
+        return {"resposta": "ok", "fontes": []}
+
+    monkeypatch.setattr(rag_chain, "ainvoke_with_sources", responder, raising=False)
+    monkeypatch.setattr(api, "rag_chain", rag_chain)
+    monkeypatch.setitem(api.estado_rag, "status", "pronto")
+
+    # Cliente que segue o contrato antigo: reenvia o histórico, mas nunca o resumo
+    pergunta = api.PerguntaRAG(pergunta="e o limite?", historico=_conversa(JANELA_HISTORICO + 2))
+    resposta = asyncio.run(api.perguntar_rag(pergunta, BackgroundTasks()))
+    assert resposta["resumo"] == {"texto": "Resumo 1", "mensagens_resumidas": 2}